@@ -0,0 +1,66 @@
+"""Speed of the path search cores, on warehouse-like layouts of different sizes.
+
+Layouts are generated the same way as in `Universe.setup_shelves` (pairs of rack columns,
+with aisles in-between, and an open area at the bottom), without creating a universe. Every
+query goes from a random pixel of the open area to a random rack, as robots do.
+
+    python benchmarks/bench_pathfinding.py --size 500
+"""
+
+import argparse
+import logging
+import random
+import time
+
+import numpy as np
+
+from robowh import astar, jps
+from robowh.utils import grid_codes
+
+CORES = {"astar": astar.find_path, "jps": jps.find_path}
+
+
+def rack_layout(side:int, rack_spacing:int=7) -> np.ndarray:
+    """An empty warehouse floor of this size, with racks as in `Universe.setup_shelves`."""
+    layout = np.full((side, side), grid_codes['empty'], dtype=int)
+    gap = rack_spacing // 2
+    bottom_gap = max(rack_spacing + gap, side // 5)
+    for j in range(gap, side - gap, rack_spacing):
+        layout[bottom_gap:side-gap, j:j+2] = grid_codes['shelf']
+    return layout
+
+
+def bench_find_path(side:int, n_queries:int=20, core:str="astar", seed:int=0) -> dict:
+    """Time n_queries searches between the open area and the racks."""
+    layout = rack_layout(side)
+    rng = random.Random(seed)
+    open_rows = int(np.argmax(layout.any(axis=1)))  # Rows above the first rack
+    racks = [tuple(int(c) for c in p) for p in np.argwhere(layout != grid_codes['empty'])]
+    queries = [
+        ((rng.randrange(open_rows), rng.randrange(side)), rng.choice(racks))
+        for _ in range(n_queries)
+        ]
+    find_path = CORES[core]
+
+    lengths = []
+    start_time = time.perf_counter()
+    for start, goal in queries:
+        lengths.append(len(find_path(layout, start, goal, until_touch=True)))
+    elapsed_time = time.perf_counter() - start_time
+
+    return {
+        "ms_per_query": 1000 * elapsed_time / n_queries,
+        "mean_path_length": float(np.mean(lengths)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=200, help="Side of the layout, in pixels")
+    parser.add_argument("--queries", type=int, default=20, help="Number of searches")
+    parser.add_argument("--core", choices=sorted(CORES), default="astar", help="Search core")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    for key, value in bench_find_path(args.size, args.queries, args.core).items():
+        print(f"{key}: {value:,.3f}")
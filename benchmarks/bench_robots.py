@@ -0,0 +1,68 @@
+"""Memory and throughput of robots, at scale.
+
+Creates a lot of robots in an empty universe, gives every one of them a plan, and measures
+how much memory a robot takes, and how fast they can act.
+
+    python benchmarks/bench_robots.py --robots 100000
+"""
+
+import argparse
+import logging
+import time
+import tracemalloc
+
+from robowh.universe import Universe
+from robowh.robot import Robot
+from robowh.strategies import RandomMovementStrategy
+
+
+def bench_robots(n_robots:int, n_ticks:int, plan_length:int=20) -> dict:
+    """Spawn n_robots, then run n_ticks of moves for all of them."""
+    universe = Universe(
+        seed=0,
+        n_robots=0,  # We spawn them ourselves
+        grid_size=int((n_robots * 4) ** 0.5) + 1,  # A quarter of the floor is robots
+        )
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start_time = time.time()
+    robots = [
+        Robot(universe, name=f"R{i+1:06d}", strategy=RandomMovementStrategy)
+        for i in range(n_robots)
+        ]
+    spawn_time = time.time() - start_time
+    per_robot = (tracemalloc.get_traced_memory()[0] - before) / n_robots
+    for robot in robots:
+        robot._assign_action("go", (0, 0))
+        robot.current_action = robot._next_action()
+        robot._set_plan(RandomMovementStrategy.calculate_path(
+            universe, None, None, n_steps=plan_length
+            ))
+    with_plans = (tracemalloc.get_traced_memory()[0] - before) / n_robots
+    tracemalloc.stop()
+
+    start_time = time.time()
+    for _ in range(n_ticks):
+        for robot in robots:
+            robot.move()
+    elapsed_time = time.time() - start_time
+
+    return {
+        "n_robots": n_robots,
+        "spawn_sec": spawn_time,
+        "bytes_per_robot": per_robot,
+        "bytes_per_robot_with_plan": with_plans,
+        "moves_per_sec": n_robots * n_ticks / elapsed_time,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--robots", type=int, default=100_000, help="Number of robots")
+    parser.add_argument("--ticks", type=int, default=10, help="Number of ticks to run")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    for key, value in bench_robots(args.robots, args.ticks).items():
+        print(f"{key}: {value:,.1f}" if isinstance(value, float) else f"{key}: {value:,}")
@@ -0,0 +1,91 @@
+"""Speed of shelf operations with many items, and of `Universe.scan`.
+
+Shelves are created on an otherwise empty floor, large enough to fit them all, and half of
+them are filled. Then we time single operations, like the orchestrator and robots do them.
+
+    python benchmarks/bench_shelves.py --items 100000
+"""
+
+import argparse
+import logging
+import time
+from typing import Callable
+
+from robowh.universe import Universe
+from robowh.shelves import Shelves
+
+
+def _per_call(function:Callable, n:int) -> float:
+    """Microseconds per call, for n calls."""
+    start_time = time.perf_counter()
+    for _ in range(n):
+        function()
+    return 1e6 * (time.perf_counter() - start_time) / n
+
+
+def bench_shelves(n_items:int, n_ops:int=10_000) -> dict:
+    """Create shelves for 2*n_items, fill n_items of them, and time operations on them."""
+    n_shelves = 2 * n_items
+    side = int(n_shelves ** 0.5) + 2
+    # Racks start further than the end of the floor, so the universe creates none of its own
+    universe = Universe(seed=0, n_robots=0, grid_size=side, rack_spacing=side)
+    shelves = Shelves(universe, "bench")
+    rng = universe.rng
+
+    start_time = time.perf_counter()
+    for k in range(n_shelves):
+        shelves.add_shelf((1 + k // side, k % side), empty=True)
+    add_time = time.perf_counter() - start_time
+
+    products = iter(universe.products.new_many(n_shelves + 2 * n_ops))
+    slots = rng.sample(range(n_shelves), n_items)
+    start_time = time.perf_counter()
+    for index in slots:
+        shelves.place_at(index, next(products))
+    place_time = time.perf_counter() - start_time
+
+    pick = _per_call(shelves.pick_random_product_for_delivery, n_ops)
+    request = _per_call(shelves.request_optimal_placement, n_ops)
+
+    def store():  # What the orchestrator does to store an item
+        shelves.place_at(shelves.request_optimal_placement(), next(products))
+    def retrieve():  # And to take one out
+        product = shelves.pick_random_product_for_delivery()
+        shelves.remove(shelves.index_of(product), product)
+    n_cycles = min(n_ops, n_items // 2)
+    stored = _per_call(store, n_cycles)
+    retrieved = _per_call(retrieve, n_cycles)
+
+    return {
+        "us_add_shelf": 1e6 * add_time / n_shelves,
+        "us_place_at": 1e6 * place_time / n_items,
+        "us_pick_random": pick,
+        "us_request_placement": request,
+        "us_store_cycle": stored,
+        "us_retrieve_cycle": retrieved,
+    }
+
+
+def bench_scan(n_scans:int=100_000, grid_size:int=50) -> dict:
+    """Time `Universe.scan` at random pixels of a default universe."""
+    universe = Universe(seed=0, grid_size=grid_size)
+    rng = universe.rng
+    points = [(rng.randrange(grid_size), rng.randrange(grid_size)) for _ in range(n_scans)]
+    start_time = time.perf_counter()
+    found = sum(bool(universe.scan(x, y)) for x, y in points)
+    elapsed_time = time.perf_counter() - start_time
+    return {
+        "us_per_scan": 1e6 * elapsed_time / n_scans,
+        "share_found": found / n_scans,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=100_000, help="Number of stored items")
+    parser.add_argument("--ops", type=int, default=10_000, help="Operations of every kind")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    for key, value in {**bench_shelves(args.items, args.ops), **bench_scan()}.items():
+        print(f"{key}: {value:,.3f}")
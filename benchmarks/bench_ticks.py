@@ -0,0 +1,55 @@
+"""End-to-end speed of the simulation: ticks per second, for fleets of different sizes.
+
+The floor grows with the fleet, as `Universe.setup_shelves` keeps an open area of
+`n_robots // 5` rows at the bottom, and the racks need some room beyond that.
+
+    python benchmarks/bench_ticks.py --robots 1000 --fleet
+"""
+
+import argparse
+import logging
+import time
+
+from robowh.universe import Universe
+
+
+def bench_ticks(n_robots:int, n_ticks:int=50, fleet:bool=False, robots_per_tick:int=None,
+                warmup:int=5) -> dict:
+    """Run a seeded universe for warmup + n_ticks, and time the last n_ticks.
+
+    With `robots_per_tick`, only that many robots act on every tick (as in headless runs).
+    """
+    grid_size = max(50, n_robots // 5 + 50)
+    start_time = time.perf_counter()
+    universe = Universe(seed=0, n_robots=n_robots, grid_size=grid_size, fleet=fleet,
+                        robots_per_tick=robots_per_tick)
+    setup_time = time.perf_counter() - start_time
+    universe.step(warmup)  # Robots get their first tasks, and plan their first paths
+
+    start_time = time.perf_counter()
+    universe.step(n_ticks)
+    elapsed_time = time.perf_counter() - start_time
+    summary = universe.observer.profiler.summary(last=n_ticks)
+
+    return {
+        "setup_sec": setup_time,
+        "ticks_per_sec": n_ticks / elapsed_time,
+        "robot_turns_per_sec": (robots_per_tick or n_robots) * n_ticks / elapsed_time,
+        "planning_share": summary["planning_ms"] / max(summary["tick_ms"], 1e-9),
+        "n_tasks": universe.observer.n_tasks,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--robots", type=int, default=50, help="Number of robots")
+    parser.add_argument("--ticks", type=int, default=50, help="Number of timed ticks")
+    parser.add_argument("--fleet", action="store_true", help="Keep robots in numpy arrays")
+    parser.add_argument("--robots-per-tick", type=int, default=None,
+                        help="How many robots may act per tick (default: all of them)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    summary = bench_ticks(args.robots, args.ticks, args.fleet, args.robots_per_tick)
+    for key, value in summary.items():
+        print(f"{key}: {value:,.3f}")
@@ -0,0 +1,153 @@
+"""Run the whole benchmark suite, and save the results as JSON, to compare runs over time.
+
+    python benchmarks/run_benchmarks.py --out before.json
+    git pull
+    python benchmarks/run_benchmarks.py --out after.json --compare before.json
+
+`--quick` runs only the small sizes (under a minute), the default suite takes about ten minutes.
+Timings are only comparable between runs on the same machine.
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import platform
+import subprocess
+import time
+from typing import Dict, List
+
+from bench_pathfinding import bench_find_path
+from bench_robots import bench_robots
+from bench_shelves import bench_scan, bench_shelves
+from bench_ticks import bench_ticks
+
+# (benchmark, function, params) for every run. Sizes are the same in both suites where they
+# overlap, so that quick runs can be compared to full ones.
+SUITES = {
+    "quick": (
+        [("find_path", bench_find_path, dict(side=s, n_queries=20, core=c))
+         for s in (50, 200) for c in ("astar", "jps")]
+        + [("shelves", bench_shelves, dict(n_items=n)) for n in (1_000, 10_000)]
+        + [("scan", bench_scan, dict())]
+        + [("ticks", bench_ticks, dict(n_robots=n, n_ticks=50, fleet=f))
+           for n in (50, 200) for f in (False, True)]
+        + [("robots", bench_robots, dict(n_robots=10_000, n_ticks=10))]
+    ),
+    "full": (
+        [("find_path", bench_find_path, dict(side=s, n_queries=20 if s <= 200 else 5, core=c))
+         for s in (50, 200, 500, 1000) for c in ("astar", "jps")]
+        + [("shelves", bench_shelves, dict(n_items=n))
+           for n in (1_000, 10_000, 100_000, 1_000_000)]
+        + [("scan", bench_scan, dict())]
+        + [("ticks", bench_ticks, dict(n_robots=n, n_ticks=50, fleet=f))
+           for n in (50, 200, 1000) for f in (False, True)]
+        # 10k robots need a 2050-pixel floor, where a single A* search takes seconds (planning
+        # is >99% of the tick), so only a few of them act per tick, and only for a few ticks.
+        + [("ticks", bench_ticks,
+            dict(n_robots=10_000, n_ticks=2, fleet=True, robots_per_tick=200, warmup=1))]
+        + [("robots", bench_robots, dict(n_robots=n, n_ticks=10)) for n in (10_000, 100_000)]
+    ),
+}
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+            ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _key(result:Dict) -> str:
+    return result["benchmark"] + json.dumps(result["params"], sort_keys=True)
+
+
+def _direction(metric:str) -> int:
+    """1 if higher is better (`*per_sec`), -1 for timings (`us_*`, `ms_*`, `*_sec`), else 0.
+
+    Metrics with 0 are only there for context, and are not compared.
+    """
+    if "per_sec" in metric:
+        return 1
+    if metric.startswith(("us_", "ms_")) or metric.endswith("_sec"):
+        return -1
+    return 0
+
+
+def run_suite(suite:str, repeat:int=3) -> Dict:
+    """Run every benchmark of the suite, and return results with some info about the run.
+
+    Every benchmark runs `repeat` times, and we keep the best value of every metric, as
+    timings are only ever made worse by noise (other processes, the garbage collector).
+    """
+    results = []
+    for name, function, params in SUITES[suite]:
+        start_time = time.perf_counter()
+        runs = [function(**params) for _ in range(repeat)]
+        metrics = {
+            metric: (max if _direction(metric) > 0 else min)(run[metric] for run in runs)
+            if _direction(metric) else runs[0][metric]
+            for metric in runs[0]
+            }
+        logging.info(f"{name} {params}: {time.perf_counter() - start_time:.1f} s")
+        results.append({"benchmark": name, "params": params, "metrics": metrics})
+    return {
+        "meta": {
+            "suite": suite,
+            "repeat": repeat,
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": _commit(),
+            "python": platform.python_version(),
+            "machine": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+def compare(new:Dict, old:Dict, threshold:float=0.1) -> List[str]:
+    """Lines describing how every metric changed (in speed), with regressions marked."""
+    previous = {_key(result): result["metrics"] for result in old["results"]}
+    lines = []
+    for result in new["results"]:
+        before = previous.get(_key(result))
+        if before is None:
+            continue
+        for metric, value in result["metrics"].items():
+            if metric not in before or not before[metric]:
+                continue
+            direction = _direction(metric)
+            if direction == 0 or not value:
+                continue
+            change = (value / before[metric]) ** direction - 1
+            flag = "  << SLOWER" if change < -threshold else ""
+            lines.append(
+                f"{result['benchmark']} {result['params']} {metric}: "
+                f"{before[metric]:,.3f} -> {value:,.3f} ({100*change:+.0f}% speed){flag}"
+                )
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="Only the small sizes")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of every benchmark")
+    parser.add_argument("--out", default="benchmarks.json", help="Where to save the results")
+    parser.add_argument("--compare", default=None, help="Results of an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Slowdowns beyond this share are marked as regressions")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    for name in ("robowh", "flask"):  # The simulation itself is chatty
+        logging.getLogger(name).setLevel(logging.ERROR)
+    report = run_suite("quick" if args.quick else "full", args.repeat)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=1)
+    logging.info(f"Results saved to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            lines = compare(report, json.load(f), args.threshold)
+        print("\n".join(lines))
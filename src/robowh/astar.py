@@ -1,4 +1,9 @@
-"""A-star algorithm implementation."""
+"""A-star algorithm implementation.
+
+The search state lives in flat arrays indexed by `y*W + x` of a grid padded with a border
+of obstacles, so that neighbors never need a bounds check, and the heap holds plain tuples
+rather than per-node Python objects.
+"""
 
 import logging
 logger = logging.getLogger(__name__)
@@ -6,76 +11,89 @@ logger = logging.getLogger(__name__)
 import heapq
 import numpy as np
 
-class Node:
-    def __init__(self, position, parent=None, g=0, h=0):
-        self.position = position
-        self.parent = parent
-        self.g = g
-        self.h = h
-        self.f = g + h
+_UNSEEN = np.iinfo(np.int32).max  # g-cost of cells that were not reached yet
+
+
+class _Tie:
+    """Heap tie-breaker that is never smaller than another one, so that entries with equal f-s
+    are ordered by the heap alone, as `Node`-s that compared on f only used to be. Every entry
+    needs its own instance: tuples compare identical objects as equal, and would go on to
+    compare indices."""
+    __slots__ = ()
 
     def __lt__(self, other):
-        return self.f < other.f
+        return False
 
 
 def find_path(grid, start, goal, until_touch=True):
     """Core A* implementation returning list of positions (empty if no path)."""
-    open_heap = []
-    closed_set = set()
-    g_costs = {start: 0}
-    heapq.heappush(open_heap, Node(start, g=0, h=_heuristic(start, goal)))
+    blocked = padded_mask(grid)
+    stride = blocked.shape[1]
+    n_cells = blocked.size
+
+    # Numpy arrays hold the state, and memoryviews give us fast scalar access to them
+    # (indexing numpy arrays one element at a time from Python is surprisingly slow).
+    g_costs = np.full(n_cells, _UNSEEN, dtype=np.int32)
+    parents = np.full(n_cells, -1, dtype=np.int32)
+    closed = np.zeros(n_cells, dtype=np.bool_)
+    heuristic = _manhattan_field(blocked.shape, (goal[0]+1, goal[1]+1))
+    is_blocked, g, parent, is_closed, h = (
+        memoryview(a) for a in (blocked.ravel(), g_costs, parents, closed, heuristic.ravel())
+        )
+
+    goal_index = (goal[0]+1)*stride + goal[1] + 1  # Padded coordinates
+    start_index = (start[0]+1)*stride + start[1] + 1
+    steps = (-stride, stride, -1, 1)  # Same order as (-1,0), (1,0), (0,-1), (0,1)
+
+    # Heap entries are (f, tie-breaker, index), and ties never decide anything (see `_Tie`),
+    # which is what makes us pick the same paths as the original Node-based implementation.
+    g[start_index] = 0
+    open_heap = [(h[start_index], _Tie(), start_index)]
 
     while open_heap:
-        current_node = heapq.heappop(open_heap)
+        _, _, current = heapq.heappop(open_heap)
+        if is_closed[current]:  # A stale duplicate of a node that was improved later
+            continue
 
-        if current_node.position == goal:
-            return _reconstruct_path(current_node)
+        if current == goal_index:
+            return _reconstruct_path(parent, current, stride)
 
-        closed_set.add(current_node.position)
+        is_closed[current] = True
+        tentative_g = g[current] + 1
 
-        for dy, dx in [(-1,0), (1,0), (0,-1), (0,1)]:
-            y = current_node.position[0] + dy
-            x = current_node.position[1] + dx
-            neighbor_pos = (y, x)
+        for step in steps:
+            neighbor = current + step
 
             # If going to a rack, we want to stop one pixels before it
-            if until_touch and (neighbor_pos == goal):
-                return _reconstruct_path(current_node)
+            if until_touch and (neighbor == goal_index):
+                return _reconstruct_path(parent, current, stride)
 
-            # We cannot walk through occupied pixels though
-            if not _valid_pos(grid, neighbor_pos):
+            # We cannot walk through occupied pixels though (the padding is occupied too)
+            if is_blocked[neighbor] or tentative_g >= g[neighbor]:
                 continue
 
-            tentative_g = current_node.g + 1
-            if neighbor_pos in g_costs and tentative_g >= g_costs[neighbor_pos]:
-                continue
-
-            g_costs[neighbor_pos] = tentative_g
-            neighbor_node = Node(
-                neighbor_pos,
-                parent=current_node,
-                g=tentative_g,
-                h=_heuristic(neighbor_pos, goal)
-            )
-
-            if neighbor_pos not in closed_set:
-                heapq.heappush(open_heap, neighbor_node)
+            g[neighbor] = tentative_g
+            parent[neighbor] = current
+            heapq.heappush(open_heap, (tentative_g + h[neighbor], _Tie(), neighbor))
 
     return []
 
-def _heuristic(pos, target):
-    return abs(pos[0] - target[0]) + abs(pos[1] - target[1])
+def padded_mask(grid):
+    """Boolean mask of impassable cells, with a one-cell border of obstacles around it."""
+    blocked = np.ones((grid.shape[0]+2, grid.shape[1]+2), dtype=np.bool_)
+    np.not_equal(grid, 0, out=blocked[1:-1, 1:-1])
+    return blocked
 
-def _valid_pos(grid, pos):
-    """This position is free to move through."""
-    y, x = pos
-    return (0 <= y < grid.shape[0] and
-            0 <= x < grid.shape[1] and
-            grid[y, x] == 0)
+def _manhattan_field(shape, target):
+    """Manhattan distances from every cell of a grid of this shape to the target."""
+    rows = np.abs(np.arange(shape[0], dtype=np.int32) - target[0])
+    cols = np.abs(np.arange(shape[1], dtype=np.int32) - target[1])
+    return rows[:, None] + cols[None, :]
 
-def _reconstruct_path(node):
+def _reconstruct_path(parent, index, stride):
     path = []
-    while node:
-        path.append(node.position)
-        node = node.parent
-    return path[::-1]
\ No newline at end of file
+    while index != -1:
+        y, x = divmod(index, stride)
+        path.append((y-1, x-1))  # Back to unpadded coordinates
+        index = parent[index]
+    return path[::-1]
@@ -0,0 +1,144 @@
+"""Pushing frames and KPIs to all connected viewers, encoding everything only once per tick.
+
+Every connected client (a browser tab) gets its own queue of ready-to-send messages, in the
+Server-Sent Events format. A single broadcaster thread waits for new snapshots, encodes the
+changes since the previous tick (and the KPIs) once, and puts the same messages into every
+queue. Clients that just connected, or fell so far behind that their queue overflowed, get a
+full frame (a keyframe) instead, and continue with deltas from there.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import base64
+import json
+import queue
+import threading
+from typing import Callable, Dict, List, Optional, cast
+
+from robowh.snapshots import Snapshot, SnapshotBuffer
+
+
+def sse_message(event:str, data:Dict) -> str:
+    """One Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class Client:
+    """A connected viewer: a queue of messages to send, and whether it needs a full frame."""
+    __slots__ = ("queue", "needs_keyframe")
+
+    def __init__(self, max_queue:int):
+        self.queue:queue.Queue = queue.Queue(maxsize=max_queue)
+        self.needs_keyframe:bool = True
+
+
+class Broadcaster:
+    """Encodes every tick once, and hands the messages to all clients."""
+
+    def __init__(self, snapshots:SnapshotBuffer, kpis:Callable[[], Dict], max_queue:int=64):
+        self.snapshots = snapshots
+        self.kpis = kpis  # Called once per tick
+        self.max_queue:int = max_queue
+        self.tick:Optional[int] = None  # Last tick that was sent out
+        self.n_encoded:int = 0  # Frames encoded so far (keyframes and deltas)
+        self._clients:List[Client] = []
+        self._clients_lock = threading.Lock()
+        self._thread:Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start broadcasting in a background thread, on every new snapshot."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def subscribe(self) -> Client:
+        client = Client(self.max_queue)
+        with self._clients_lock:
+            self._clients.append(client)
+        logger.info(f"A viewer subscribed to the stream ({len(self._clients)} total)")
+        return client
+
+    def unsubscribe(self, client:Client) -> None:
+        with self._clients_lock:
+            if client in self._clients:
+                self._clients.remove(client)
+        logger.info(f"A viewer left the stream ({len(self._clients)} left)")
+
+    def _run(self) -> None:
+        version = -1
+        while True:
+            snapshot = self.snapshots.wait_newer(version, timeout=1.0)
+            if snapshot is not None:
+                version = snapshot.version
+                self.broadcast()
+
+    def broadcast(self) -> None:
+        """Send the latest frame, and KPIs, to every client."""
+        with self._clients_lock:
+            clients = list(self._clients)
+        if not clients:
+            self.tick = None  # Whoever comes next starts with a keyframe anyway
+            return
+
+        # The delta has to end exactly at the snapshot that keyframes are made from.
+        # If a new snapshot is published in-between, we simply try again.
+        snapshot = self.snapshots.latest()
+        if snapshot is None:  # Nothing was published yet
+            return
+        for _ in range(3):
+            changes = None if self.tick is None else self.snapshots.changes_since(self.tick)
+            if changes is None or changes[2] == snapshot.tick:
+                break
+            snapshot = cast(Snapshot, self.snapshots.latest())  # Once published, never None
+        else:
+            changes = None  # Couldn't catch up: everyone gets a keyframe
+
+        if changes is None:
+            for client in clients:
+                client.needs_keyframe = True
+        delta = None
+        if changes is not None and any(not c.needs_keyframe for c in clients):
+            indices, codes, _ = changes
+            payload = indices.astype('<u4').tobytes() + codes.tobytes()
+            delta = self._frame_message("delta", snapshot, payload)
+        keyframe = None
+        if any(c.needs_keyframe for c in clients):
+            keyframe = self._keyframe_message(snapshot)
+        kpis = sse_message("kpis", self.kpis())
+        self.tick = snapshot.tick
+
+        for client in clients:
+            frame = keyframe if client.needs_keyframe else delta
+            try:
+                if frame is not None:
+                    client.queue.put_nowait(frame)
+                    client.needs_keyframe = False
+                client.queue.put_nowait(kpis)
+            except queue.Full:  # A slow client: drop what it hasn't read, and resync it later
+                self._drain(client)
+                client.needs_keyframe = True
+
+    def _frame_message(self, kind:str, snapshot:Snapshot, payload:bytes) -> str:
+        self.n_encoded += 1
+        return sse_message("frame", {
+            "kind": kind,
+            "since": self.tick if kind == "delta" else None,
+            "tick": snapshot.tick,
+            "shape": list(snapshot.grid.shape),
+            "cells": base64.b64encode(payload).decode('ascii'),
+            })
+
+    def _keyframe_message(self, snapshot:Snapshot) -> Optional[str]:
+        payload = snapshot.grid.tobytes()
+        if not snapshot.is_valid():  # Overwritten while we were copying: try on the next tick
+            return None
+        return self._frame_message("full", snapshot, payload)
+
+    @staticmethod
+    def _drain(client:Client) -> None:
+        try:
+            while True:
+                client.queue.get_nowait()
+        except queue.Empty:
+            pass
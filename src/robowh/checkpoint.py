@@ -0,0 +1,188 @@
+"""Checkpoints: save a universe into a compressed numpy archive, and restore it quickly.
+
+Building a large warehouse takes a while (shelves and products are registered, and robots are
+spawned at random), and a restored universe skips all of that: grids, shelves and robots are
+loaded as arrays. A restored universe continues exactly as the saved one would have, so the
+archive has everything that the future depends on, including the state of the random
+generator, and the orders in which free pixels, free slots, and products are listed, as random
+draws go by these orders.
+
+The cache of routes is saved too: robots replan along suffixes of cached routes, and these
+may differ from fresh searches, so the cache changes results. Flow fields are not saved (they
+only depend on the layout, and are rebuilt as needed), and neither are the tick profiler,
+profiling captures, or traces.
+
+Use it through `Universe.save(path)` and `Universe.load(path)`.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import json
+import numpy as np
+from typing import Dict, List, Optional, Tuple, cast
+
+from robowh.custom_types import Coords, RobotAction
+from robowh.fleet import ACTIONS, STATES
+
+SETTINGS = ('GRID_SIZE', 'N_ROBOTS', 'RACK_SPACING', 'BAY_SPACING', 'STRATEGY', 'SEED',
+            'ROBOTS_PER_TICK', 'FLEET', 'PLANNING_WORKERS', 'MAX_UPDATE_TIME')
+TASKS = ("idle", "reposition", "transfer")
+# Attributes of the universe that have their own checkpoint() and restore()
+PARTS = ("shelves", "bays", "products", "path_cache")
+
+
+def _coords(point:Optional[Coords]) -> Coords:
+    return (-1, -1) if point is None else point
+
+
+def _point(row) -> Optional[Coords]:
+    return None if row[0] < 0 else (int(row[0]), int(row[1]))
+
+
+def _archive(path:str) -> str:
+    """Checkpoints are `.npz` files, and the suffix is added if it's not there."""
+    return path if path.endswith(".npz") else path + ".npz"
+
+
+def save(universe, path:str) -> None:
+    """Write the state of the universe to `path` (`.npz` is added if it's not there)."""
+    path = _archive(path)
+    robots = universe.robots
+    ids = {robot.name: i for i, robot in enumerate(robots)}
+    strategy_names = {strategy: name for name, strategy in vars(universe.strategy_library).items()}
+    version, rng_state, gauss = universe.rng.getstate()
+    meta = {
+        "settings": {name: getattr(universe, name) for name in SETTINGS},
+        "n_ticks": universe.n_ticks,
+        "layout_version": universe.layout_version,
+        "diagnostic_number": universe.diagnostic_number,
+        "rng": [version, gauss],
+        "mode": universe.orchestrator.mode,
+        "target_inventory": universe.orchestrator.target_inventory,
+        "n_tasks": universe.observer.n_tasks,
+        "n_blocked": universe.observer.n_blocked,
+        }
+    arrays = {
+        "rng_state": np.array(rng_state, dtype=np.uint32),
+        "layout": universe.layout,
+        "occupancy": universe.occupancy,
+        "grid": universe.grid,
+        "free_cells": universe.free_cells.to_array(),
+        "idle_robots": np.array([ids[robot.name] for robot in universe.orchestrator.idle_robots],
+                                dtype=np.int64),
+        }
+    for name in PARTS:
+        for key, value in getattr(universe, name).checkpoint().items():
+            arrays[f"{name}_{key}"] = value
+
+    # Robots, one row each; their plans and actions (the current one is number 0, if there is
+    # one, then those in the queue) are listed in tables, with the robot of every row.
+    arrays["robot_names"] = np.array([robot.name for robot in robots], dtype=str)
+    arrays["robot_strategies"] = np.array(
+        [strategy_names[robot.strategy] for robot in robots], dtype=str
+        )
+    arrays["robot_positions"] = np.array([(robot.x, robot.y) for robot in robots],
+                                         dtype=np.int32).reshape(-1, 2)
+    arrays["robot_states"] = np.array([STATES.index(robot.state) for robot in robots],
+                                      dtype=np.int8)
+    arrays["robot_tasks"] = np.array([TASKS.index(robot.task) for robot in robots], dtype=np.int8)
+    arrays["robot_origins"] = np.array([_coords(robot.origin) for robot in robots],
+                                       dtype=np.int32).reshape(-1, 2)
+    arrays["robot_destinations"] = np.array([_coords(robot.destination) for robot in robots],
+                                            dtype=np.int32).reshape(-1, 2)
+    plans = [robot.next_moves for robot in robots]
+    arrays["plan_lengths"] = np.array([len(plan) for plan in plans], dtype=np.int32)
+    arrays["plan_moves"] = np.array([move for plan in plans for move in plan],
+                                    dtype=np.int8).reshape(-1, 2)
+    actions = []  # (robot, number, action)
+    for i, robot in enumerate(robots):
+        queue = robot.pending_actions
+        if robot.current_action is not None:
+            actions.append((i, 0, robot.current_action))
+        actions.extend((i, number, action) for number, action in enumerate(queue, start=1))
+    arrays["action_robots"] = np.array([i for i, _, _ in actions], dtype=np.int64)
+    arrays["action_numbers"] = np.array([number for _, number, _ in actions], dtype=np.int64)
+    arrays["action_kinds"] = np.array([ACTIONS.index(a[0]) for _, _, a in actions], dtype=np.int8)
+    arrays["action_targets"] = np.array([_coords(a[1]) for _, _, a in actions],
+                                        dtype=np.int32).reshape(-1, 2)
+    arrays["action_products"] = np.array([-1 if a[2] is None else a[2] for _, _, a in actions],
+                                         dtype=np.int64)
+
+    reservations = list(universe.reservations)
+    arrays["reserved_slots"] = np.array([slot for slot, _ in reservations],
+                                        dtype=np.int64).reshape(-1, 3)
+    arrays["reserved_by"] = np.array([agent for _, agent in reservations], dtype=str)
+
+    np.savez_compressed(path, meta=np.array(json.dumps(meta)), **arrays)
+    logger.info(f"Universe saved to {path} at tick {universe.n_ticks}")
+
+
+def load(cls, path:str):
+    """Create a universe of class `cls` (a `Universe`) from a file written by `save`."""
+    from robowh.robot import Robot  # Deferred import to avoid circular dependency
+
+    path = _archive(path)
+    with np.load(path) as archive:
+        state:Dict[str, np.ndarray] = dict(archive)
+    meta = json.loads(str(state["meta"]))
+
+    universe = cls.__new__(cls)
+    for name, value in meta["settings"].items():
+        setattr(universe, name, value)
+    universe._init(build=False)
+    universe.n_ticks = meta["n_ticks"]
+    universe.layout_version = meta["layout_version"]
+    universe.diagnostic_number = meta["diagnostic_number"]
+    version, gauss = meta["rng"]
+    universe.rng.setstate((version, tuple(state["rng_state"].tolist()), gauss))
+    universe.orchestrator.mode = meta["mode"]
+    universe.orchestrator.target_inventory = meta["target_inventory"]
+    universe.observer.n_tasks = meta["n_tasks"]
+    universe.observer.n_blocked = meta["n_blocked"]
+
+    for name in PARTS:
+        prefix = f"{name}_"
+        getattr(universe, name).restore(
+            {key[len(prefix):]: value for key, value in state.items() if key.startswith(prefix)}
+            )
+
+    # Robots are placed where they were (painting the grid, which is overwritten below anyway)
+    plan_ends = np.cumsum(state["plan_lengths"]).tolist()
+    moves = [tuple(move) for move in state["plan_moves"].tolist()]
+    robot_actions:Dict[int, List[Tuple[int, RobotAction]]] = {}  # Robot -> [(number, action)]
+    for i, number, kind, target, product in zip(
+            state["action_robots"].tolist(), state["action_numbers"].tolist(),
+            state["action_kinds"].tolist(), state["action_targets"],
+            state["action_products"].tolist(),
+            ):
+        action = cast(RobotAction,
+                      (ACTIONS[kind], _point(target), None if product < 0 else product))
+        robot_actions.setdefault(i, []).append((number, action))
+    for i, name in enumerate(state["robot_names"].tolist()):
+        strategy = getattr(universe.strategy_library, str(state["robot_strategies"][i]))
+        position = _point(state["robot_positions"][i])
+        if universe.fleet is not None:
+            robot = universe.fleet.spawn(name, strategy, position=position)
+        else:
+            robot = Robot(universe, name=name, strategy=strategy, position=position)
+        robot.state = STATES[state["robot_states"][i]]
+        robot.task = TASKS[state["robot_tasks"][i]]
+        robot.origin = _point(state["robot_origins"][i])
+        robot.destination = _point(state["robot_destinations"][i])
+        actions = robot_actions.get(i, [])
+        if actions and actions[0][0] == 0:
+            robot.current_action = actions.pop(0)[1]
+        robot.pending_actions = [action for _, action in actions]
+        robot._set_plan(moves[plan_ends[i] - state["plan_lengths"][i]:plan_ends[i]])
+        universe.robots.append(robot)
+    universe.orchestrator.idle_robots = [universe.robots[i] for i in state["idle_robots"]]
+
+    for (x, y, tick), agent in zip(state["reserved_slots"].tolist(),
+                                   state["reserved_by"].tolist()):
+        universe.reservations.reserve(agent, [((x, y), tick)])
+    for name in ("layout", "occupancy", "grid"):
+        np.copyto(getattr(universe, name), state[name])
+    universe.free_cells.rebuild(universe.grid, order=state["free_cells"])
+    logger.info(f"Universe loaded from {path} at tick {universe.n_ticks}")
+    return universe
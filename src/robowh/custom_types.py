@@ -2,7 +2,7 @@
 
 from typing import List, Tuple, Literal, Any, TypeAlias, Optional
 
-Product: TypeAlias = str
+Product: TypeAlias = int  # Ids from `robowh.products.ProductRegistry`
 
 Coords: TypeAlias = Tuple[int, int]
 
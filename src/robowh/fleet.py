@@ -0,0 +1,273 @@
+"""Struct-of-arrays fleet: robots stored in numpy arrays, and moved in one vectorized pass.
+
+Every `Robot` is a Python object, and every tick calls `act()` on each of them, which is fine
+for hundreds of robots, but not for tens of thousands. In a `Fleet`, positions, states,
+current actions and planned moves of all robots live in numpy arrays instead. Robots that
+only need to take the next step of their plan (most of them, most of the time) are moved
+all together, while robots that need to think (plan a path, pick, drop, ask for a task) still
+do it one by one, as `FleetRobot`s, which are thin views into the fleet arrays.
+
+It is switched on by `Universe(fleet=True)`.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import time
+import numpy as np
+from typing import List, Optional, Sequence, Tuple
+
+from robowh.custom_types import Coords, RobotAction
+from robowh.robot import Robot, RobotState
+from robowh.strategies import MoveStrategy
+from robowh.utils import grid_codes
+
+STATES:Tuple[RobotState, ...] = ("idling", "moving", "blocked")  # Stored as indices in this tuple
+ACTIONS = (None, "go", "pick", "drop")  # Same for the kinds of actions
+
+_MOVING, _BLOCKED = STATES.index("moving"), STATES.index("blocked")
+_GO = ACTIONS.index("go")
+_PENDING, _MOVED, _STUCK = 0, 1, 2  # Outcomes of move resolution
+
+
+def resolve_moves(free:np.ndarray, origins:np.ndarray, targets:np.ndarray) -> np.ndarray:
+    """Which moves succeed, if robots made them one by one, in this order.
+
+    `free` is a flat boolean mask of free pixels, `origins` are flat indices of the pixels
+    where the robots stand, and `targets` of the pixels where they want to go (-1 if it's off
+    the grid). A robot moves if its target is free when its turn comes, just like with
+    `Universe.grid_is_free`. Instead of a loop over robots, we do a few vectorized rounds:
+    robots aiming at free pixels move (the first one in the sequence wins if several aim at
+    the same pixel), and robots aiming at a pixel of an earlier robot that hasn't moved yet
+    wait for the next round. Every round settles at least the first robot still waiting.
+    """
+    n = len(origins)
+    free = free.copy()
+    status = np.full(n, _PENDING, dtype=np.int8)
+    status[targets < 0] = _STUCK
+    rank_at = np.full(free.size, -1, dtype=np.int64)  # Which robot stands on every pixel
+    rank_at[origins] = np.arange(n)
+
+    pending = np.flatnonzero(status == _PENDING)
+    while len(pending):
+        can_move = free[targets[pending]]
+        candidates = pending[can_move]
+        if len(candidates):
+            _, first = np.unique(targets[candidates], return_index=True)
+            winners = candidates[first]  # Candidates are sorted, so these are the earliest
+            status[candidates] = _STUCK
+            status[winners] = _MOVED
+            free[origins[winners]] = True
+            free[targets[winners]] = False
+
+        # The rest bumped into something. If it's an earlier robot that may still move (or just
+        # did), they can try again. Otherwise, they are stuck.
+        waiting = pending[~can_move]
+        occupant = rank_at[targets[waiting]]
+        occupant_status = status[occupant]
+        may_retry = (occupant >= 0) & (occupant < waiting) & (
+            (occupant_status == _PENDING)
+            | ((occupant_status == _MOVED) & free[targets[waiting]])  # Moved in this round
+            )
+        status[waiting[~may_retry]] = _STUCK
+        pending = np.flatnonzero(status == _PENDING)
+
+    return status == _MOVED
+
+
+class Fleet:
+    """State of all robots as numpy arrays, and the vectorized part of the tick."""
+
+    def __init__(self, universe, n_robots:int, plan_capacity:int=32):
+        logger.info(f"Creating a fleet of {n_robots} robots")
+        self.universe = universe
+        self.robots:List[FleetRobot] = []
+        self.x = np.full(n_robots, -1, dtype=np.int32)
+        self.y = np.full(n_robots, -1, dtype=np.int32)
+        self.state = np.zeros(n_robots, dtype=np.int8)
+        self.action_kind = np.zeros(n_robots, dtype=np.int8)
+        self.action_target = np.full((n_robots, 2), -1, dtype=np.int32)
+        self.actions:List[Optional[RobotAction]] = [None] * n_robots  # With products and all
+        # Planned moves: a fixed-size buffer per robot, and how far we've read into it.
+        # Longer plans are truncated, and robots simply plan again when they run out.
+        self.plans = np.zeros((n_robots, plan_capacity, 2), dtype=np.int8)
+        self.plan_len = np.zeros(n_robots, dtype=np.int32)
+        self.plan_pos = np.zeros(n_robots, dtype=np.int32)
+        self.replan_on_block = np.zeros(n_robots, dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self.robots)
+
+    def spawn(self, name:str, strategy:MoveStrategy, position:Optional[Coords]=None
+              ) -> "FleetRobot":
+        """Create a new robot in the next free row of the arrays (see `Robot` for `position`)."""
+        if len(self.robots) >= len(self.x):
+            raise ValueError(f"The fleet is full ({len(self.x)} robots)")
+        robot = FleetRobot(self, len(self.robots), name=name, strategy=strategy,
+                           position=position)
+        self.robots.append(robot)
+        return robot
+
+    def tick(self, sequence:Sequence[int], deadline:Optional[float]=None) -> np.ndarray:
+        """Let robots act in this order, and return the indices of those that did.
+
+        Robots that are just following their plan are moved together, after the ones that
+        need to think. The deadline only applies to the thinking ones, as moving the rest
+        is cheap.
+        """
+        order = np.asarray(sequence, dtype=np.int64)
+        target = self.action_target[order]
+        distance = np.abs(self.x[order] - target[:, 0]) + np.abs(self.y[order] - target[:, 1])
+        routine = (
+            (self.action_kind[order] == _GO)
+            & (self.plan_pos[order] < self.plan_len[order])
+            & (distance > 1)  # Otherwise the robot is about to arrive
+            )
+        lock = self.universe.lock
+        thinking = order[~routine]
+        n_acted = 0
+        for i in thinking:
+            if deadline is not None and time.time() >= deadline:
+                break
+            with lock:
+                self.robots[i].act()
+            n_acted += 1
+        with lock:
+            self.step(order[routine])
+        return np.concatenate([thinking[:n_acted], order[routine]])
+
+    def step(self, movers:np.ndarray) -> None:
+        """Take the next planned step for these robots (in this order), all at once."""
+        if len(movers) == 0:
+            return
+        universe = self.universe
+        deltas = self.plans[movers, self.plan_pos[movers]].astype(np.int32)
+        self.plan_pos[movers] += 1
+        waits = (deltas == 0).all(axis=1)  # Some strategies plan to wait for others to pass
+        walkers, deltas = movers[~waits], deltas[~waits]
+
+        height, width = universe.grid.shape
+        x, y = self.x[walkers], self.y[walkers]
+        new_x, new_y = x + deltas[:, 0], y + deltas[:, 1]
+        inside = (new_x >= 0) & (new_x < height) & (new_y >= 0) & (new_y < width)
+        origins = x*width + y
+        targets = np.where(inside, new_x*width + new_y, -1)
+        free = universe.grid.ravel() == grid_codes['empty']
+        moved = resolve_moves(free, origins, targets)
+
+        vacated, entered = origins[moved], targets[moved]
+        for layer in (universe.occupancy, universe.grid):
+            np.put(layer, vacated, grid_codes['empty'])
+            np.put(layer, entered, grid_codes['robot'])
+        # Robots that follow each other only free the pixel at the end of the queue
+        taken = entered[free[entered]]
+        released = vacated[universe.grid.ravel()[vacated] == grid_codes['empty']]
+        universe.free_cells.swap(taken, released)
+        self.x[walkers[moved]] = new_x[moved]
+        self.y[walkers[moved]] = new_y[moved]
+
+        stuck = walkers[~moved]
+        self._set_states(np.concatenate([movers[waits], walkers[moved]]), _MOVING)
+        self._set_states(stuck, _BLOCKED)
+        # Depending on the strategy, it could be a reasonable point to replan from scratch.
+        replan = stuck[self.replan_on_block[stuck]]
+        self.plan_len[replan] = self.plan_pos[replan]
+
+    def _set_states(self, robots:np.ndarray, state:int) -> None:
+        """Vectorized `Robot.set_state`: repaint the robots, and report to the Observer."""
+        universe = self.universe
+        was_blocked = self.state[robots] == _BLOCKED
+        code = grid_codes['confused'] if state == _BLOCKED else grid_codes['robot']
+        cells = self.x[robots]*universe.grid.shape[1] + self.y[robots]
+        np.put(universe.occupancy, cells, code)
+        np.put(universe.grid, cells, code)
+        if state == _BLOCKED:
+            universe.observer.n_blocked += int((~was_blocked).sum())
+        else:
+            universe.observer.n_blocked -= int(was_blocked.sum())
+        self.state[robots] = state
+        if universe.recorder is not None:
+            universe.recorder.fleet_event(robots)
+
+
+class FleetRobot(Robot):
+    """A robot that keeps its state in the fleet arrays, and otherwise behaves as a `Robot`."""
+    __slots__ = ("_fleet", "_index", "_strategy")
+
+    def __init__(self, fleet:Fleet, index:int, name:str, strategy:MoveStrategy,
+                 position:Optional[Coords]=None):
+        self._fleet = fleet
+        self._index = index
+        super().__init__(fleet.universe, name=name, strategy=strategy, position=position)
+
+    @property
+    def x(self) -> int:
+        return int(self._fleet.x[self._index])
+
+    @x.setter
+    def x(self, value:int) -> None:
+        self._fleet.x[self._index] = value
+
+    @property
+    def y(self) -> int:
+        return int(self._fleet.y[self._index])
+
+    @y.setter
+    def y(self, value:int) -> None:
+        self._fleet.y[self._index] = value
+
+    @property
+    def state(self) -> RobotState:
+        return STATES[self._fleet.state[self._index]]
+
+    @state.setter
+    def state(self, value:RobotState) -> None:
+        self._fleet.state[self._index] = STATES.index(value)
+
+    @property
+    def strategy(self) -> MoveStrategy:
+        return self._strategy
+
+    @strategy.setter
+    def strategy(self, value:MoveStrategy) -> None:
+        self._strategy = value
+        self._fleet.replan_on_block[self._index] = value.replan_on_block
+
+    @property
+    def current_action(self) -> Optional[RobotAction]:
+        return self._fleet.actions[self._index]
+
+    @current_action.setter
+    def current_action(self, value:Optional[RobotAction]) -> None:
+        self._fleet.actions[self._index] = value
+        self._fleet.action_kind[self._index] = ACTIONS.index(None if value is None else value[0])
+        target = None if value is None else value[1]
+        self._fleet.action_target[self._index] = (-1, -1) if target is None else target
+
+    @property
+    def next_moves(self) -> List[Tuple[int, int]]:
+        """A copy of the moves that are left in the plan."""
+        fleet, i = self._fleet, self._index
+        moves = fleet.plans[i, fleet.plan_pos[i]:fleet.plan_len[i]]
+        return [(int(dx), int(dy)) for dx, dy in moves]
+
+    @next_moves.setter
+    def next_moves(self, moves:List[Tuple[int, int]]) -> None:
+        self._set_plan(moves)
+
+    def _has_plan(self) -> bool:
+        return self._fleet.plan_pos[self._index] < self._fleet.plan_len[self._index]
+
+    def _next_move(self) -> Tuple[int, int]:
+        fleet, i = self._fleet, self._index
+        move = fleet.plans[i, fleet.plan_pos[i]]
+        fleet.plan_pos[i] += 1
+        return (int(move[0]), int(move[1]))
+
+    def _set_plan(self, moves:List[Tuple[int, int]]) -> None:
+        fleet, i = self._fleet, self._index
+        moves = list(moves)[:fleet.plans.shape[1]]
+        if moves:
+            fleet.plans[i, :len(moves)] = moves
+        fleet.plan_len[i] = len(moves)
+        fleet.plan_pos[i] = 0
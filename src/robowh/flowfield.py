@@ -0,0 +1,75 @@
+"""Flow fields: distances to a target from every pixel of the WH, shared by all robots."""
+
+import logging
+logger = logging.getLogger(__name__)
+
+from collections import OrderedDict
+from typing import Optional
+import numpy as np
+
+from robowh.astar import padded_mask
+from robowh.custom_types import Coords
+
+UNREACHABLE = -1
+
+
+def distance_field(grid, target:Coords) -> np.ndarray:
+    """BFS distances (in moves) from the target to every free pixel of the grid.
+
+    The target itself may be an obstacle (a rack or a bay), in which case pixels next to it
+    are at distance 1. Pixels that can't reach the target are marked UNREACHABLE.
+    The wavefront is expanded with array operations, one layer of pixels at a time.
+    """
+    blocked = padded_mask(grid)
+    shape = blocked.shape
+    stride = shape[1]
+    blocked = blocked.ravel()
+
+    dist = np.full(blocked.size, UNREACHABLE, dtype=np.int32)
+    start = (target[0]+1)*stride + target[1] + 1
+    dist[start] = 0
+    steps = np.array([-stride, stride, -1, 1])
+    frontier = np.array([start])
+    distance = 0
+    while frontier.size:
+        distance += 1
+        neighbors = (frontier[:, None] + steps).ravel()  # Padding guarantees we stay in bounds
+        neighbors = neighbors[(dist[neighbors] == UNREACHABLE) & ~blocked[neighbors]]
+        frontier = np.unique(neighbors)
+        dist[frontier] = distance
+    return dist.reshape(shape)[1:-1, 1:-1]
+
+
+class FieldCache:
+    """LRU cache of distance fields, keyed on target, and valid for one version of the layout."""
+
+    def __init__(self, maxsize:int=256):
+        self.maxsize:int = maxsize  # A field is 4 bytes per pixel, so we can't keep too many
+        self.layout_version:Optional[int] = None
+        self.hits:int = 0
+        self.misses:int = 0
+        self._fields:OrderedDict[Coords, np.ndarray] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._fields)
+
+    def get(self, grid, target:Coords, layout_version:int) -> np.ndarray:
+        """Return the field for this target, calculating it on the grid if it's not cached."""
+        if layout_version != self.layout_version:
+            self._fields.clear()
+            self.layout_version = layout_version
+
+        field = self._fields.get(target)
+        if field is not None:
+            self._fields.move_to_end(target)
+            self.hits += 1
+            return field
+
+        self.misses += 1
+        logger.debug(f"Calculating a flow field towards {target}")
+        field = distance_field(grid, target)
+        field.flags.writeable = False  # Shared by all robots, so nobody should change it
+        self._fields[target] = field
+        while len(self._fields) > self.maxsize:
+            self._fields.popitem(last=False)
+        return field
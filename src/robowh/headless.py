@@ -0,0 +1,64 @@
+"""Headless runs: time ticks back-to-back, with no web stack, and no wall-clock time."""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import argparse
+import time
+from typing import Optional
+
+from robowh.universe import Universe
+
+
+def run_headless(n_ticks:int, trace:Optional[str]=None, **settings) -> dict:
+    """Create a universe, run it for n_ticks, and return a summary of KPIs.
+
+    `settings` are passed to the `Universe` (like `seed`, `n_robots`, or `strategy`). With
+    `trace`, the run is recorded into this directory (see `robowh.trace`).
+    """
+    universe = Universe(**settings)
+    if trace is not None:
+        universe.record(trace)
+    try:
+        start_time = time.time()
+        universe.step(n_ticks)
+        elapsed_time = time.time() - start_time
+    finally:
+        universe.close()
+
+    return {
+        "n_ticks": universe.n_ticks,
+        "n_tasks": universe.observer.n_tasks,
+        "n_shelves": universe.shelves.n_items,
+        "n_bay": universe.bays.n_items,
+        "sh_blocked": 100 * universe.observer.n_blocked / max(universe.N_ROBOTS, 1),
+        "ticks_per_sec": n_ticks / elapsed_time if elapsed_time > 0 else float('inf'),
+        "tasks_per_sec": universe.observer.n_tasks / elapsed_time if elapsed_time > 0 else 0.0,
+        **universe.observer.profiler.summary(last=n_ticks),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the warehouse without a viewer.")
+    parser.add_argument("--ticks", type=int, default=1000, help="Number of ticks to run")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible runs")
+    parser.add_argument("--grid-size", type=int, default=None, help="Size of the warehouse")
+    parser.add_argument("--robots", type=int, default=None, help="Number of robots")
+    parser.add_argument("--strategy", default=None, help="Path planning strategy (like 'jps')")
+    parser.add_argument("--robots-per-tick", type=int, default=None,
+                        help="How many robots may act per tick (default: all of them)")
+    parser.add_argument("--fleet", action="store_true",
+                        help="Store robots in numpy arrays, and move them in bulk")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Plan paths ahead, in a pool of this many processes")
+    parser.add_argument("--trace", default=None, help="Record a trace of the run to this path")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    summary = run_headless(
+        args.ticks, seed=args.seed, grid_size=args.grid_size, n_robots=args.robots,
+        strategy=args.strategy, robots_per_tick=args.robots_per_tick, fleet=args.fleet or None,
+        planning_workers=args.workers, trace=args.trace,
+        )
+    for key, value in summary.items():
+        print(f"{key}: {value}")
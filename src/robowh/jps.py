@@ -0,0 +1,178 @@
+"""Jump Point Search for 4-connected grids.
+
+Open areas of a uniform-cost grid are full of symmetric paths: there are many ways to combine
+the same number of vertical and horizontal moves. A* looks at all of them, while JPS only
+considers one canonical path: vertical moves go first, and a path turns from horizontal to
+vertical only next to an obstacle corner (a "forced" neighbor). Straight runs are scanned
+without putting anything on the heap, and only the points where a path may turn (jump points)
+become A* nodes.
+
+We use the same padded flat grid as our A* core, and return the same kind of paths (a list of
+every pixel on the way, from start to end).
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import heapq
+import itertools
+import numpy as np
+
+from robowh.astar import padded_mask
+
+
+def find_path(grid, start, goal, until_touch=True, stats=None):
+    """JPS returning a list of positions (empty if no path).
+
+    With `until_touch` the path ends next to the goal (the goal itself can be an obstacle).
+    If `stats` is a dict, the number of expanded nodes is written into it.
+    """
+    blocked_mask = padded_mask(grid)
+    stride = blocked_mask.shape[1]
+    blocked = memoryview(blocked_mask.ravel())
+
+    start_index = (start[0]+1)*stride + start[1] + 1
+    goal_index = (goal[0]+1)*stride + goal[1] + 1
+    gy, gx = divmod(goal_index, stride)
+    neighbors = {goal_index + s for s in (-stride, stride, -1, 1)}
+    if until_touch:
+        goals = {g for g in neighbors if not blocked[g]}
+    else:
+        goals = {goal_index} if not blocked[goal_index] else set()
+    # The start counts even if it's blocked (a robot stands on it), as it does in A*
+    if start_index == goal_index or (until_touch and start_index in neighbors):
+        goals.add(start_index)
+    slack = 1 if until_touch else 0
+
+    def heuristic(index):
+        y, x = divmod(index, stride)
+        return max(abs(y-gy) + abs(x-gx) - slack, 0)
+
+    # Vertical jumps scan every row they cross, so row scans have to be cheap. For every pixel
+    # we find (with numpy, once per search) where a scan along its row would stop anyway:
+    # at a wall, or at a pixel with a forced neighbor. Then a scan only has to check the goals.
+    stop_right = _next_stops(blocked_mask, stride, step=1)
+    stop_left = _next_stops(blocked_mask, stride, step=-1)
+    goal_rows = {}
+    for g in goals:
+        goal_rows.setdefault(g // stride, []).append(g)
+
+    def jump_horizontal(origin, step):
+        """Run along a row until we hit a wall, the goal, or a forced neighbor."""
+        stop = stop_right[origin+1] if step > 0 else stop_left[origin-1]
+        nearest = None
+        for g in goal_rows.get(origin // stride, ()):
+            if min(origin, stop) < g <= max(origin, stop) and g != origin:
+                if nearest is None or abs(g - origin) < abs(nearest - origin):
+                    nearest = g
+        if nearest is not None:
+            return nearest
+        return None if blocked[stop] else stop
+
+    def jump_vertical(index, step):
+        """Run along a column until we hit a wall, the goal, or a row that leads somewhere."""
+        while True:
+            index += step
+            if blocked[index]:
+                return None
+            if index in goals:
+                return index
+            if jump_horizontal(index, 1) is not None or jump_horizontal(index, -1) is not None:
+                return index
+
+    # Directions: vertical steps are +-stride, horizontal are +-1, 0 is "no direction" (start)
+    def successors(direction):
+        if direction == 0:
+            return (-stride, stride, -1, 1)
+        if abs(direction) == stride:  # After a vertical move we can go on, or turn anywhere
+            return (direction, -1, 1)
+        return (direction,)  # After a horizontal move, turns are only allowed when forced
+
+    counter = itertools.count()
+    g_costs = {(start_index, 0): 0}
+    parents = {(start_index, 0): None}
+    open_heap = [(heuristic(start_index), next(counter), start_index, 0)]
+    closed = set()
+    n_expanded = 0
+
+    while open_heap:
+        _, _, current, direction = heapq.heappop(open_heap)
+        state = (current, direction)
+        if state in closed:
+            continue
+        if current in goals:
+            if stats is not None:
+                stats['expanded'] = n_expanded
+            return _reconstruct_path(parents, state, stride)
+        closed.add(state)
+        n_expanded += 1
+        g = g_costs[state]
+
+        candidates = list(successors(direction))
+        if abs(direction) == 1:  # Forced vertical turns after a horizontal move
+            candidates += [
+                side for side in (-stride, stride)
+                if not blocked[current+side] and blocked[current+side-direction]
+                ]
+        for step in candidates:
+            if abs(step) == 1:
+                jump_point = jump_horizontal(current, step)
+                distance = 0 if jump_point is None else abs(jump_point - current)
+            else:
+                jump_point = jump_vertical(current, step)
+                distance = 0 if jump_point is None else abs(jump_point - current) // stride
+            if jump_point is None:
+                continue
+            next_state = (jump_point, step)
+            tentative_g = g + distance
+            if tentative_g >= g_costs.get(next_state, tentative_g+1):
+                continue
+            g_costs[next_state] = tentative_g
+            parents[next_state] = state
+            heapq.heappush(
+                open_heap,
+                (tentative_g + heuristic(jump_point), next(counter), jump_point, step)
+                )
+
+    if stats is not None:
+        stats['expanded'] = n_expanded
+    return []
+
+def _next_stops(blocked_mask, stride, step):
+    """For every pixel, the closest pixel at or after it (along `step`) where row scans stop.
+
+    Scans stop at walls, and at free pixels where a vertical turn is forced: the pixel above
+    (or below) is free, but the one diagonally behind it is blocked. Padding guarantees that
+    every row ends with a wall.
+    """
+    blocked = blocked_mask.ravel().astype(bool)
+    behind = np.roll(blocked, step)  # blocked[i-step]
+    forced = (
+        (~np.roll(blocked, stride) & np.roll(behind, stride))  # Above is free, behind it isn't
+        | (~np.roll(blocked, -stride) & np.roll(behind, -stride))
+        )
+    stops = blocked | forced
+    positions = np.arange(blocked.size)
+    if step > 0:
+        nearest = np.where(stops, positions, blocked.size)
+        nearest = np.minimum.accumulate(nearest[::-1])[::-1]
+    else:
+        nearest = np.where(stops, positions, -1)
+        nearest = np.maximum.accumulate(nearest)
+    return memoryview(nearest)
+
+def _reconstruct_path(parents, state, stride):
+    """Expand the chain of jump points into every pixel in between."""
+    points = []
+    while state is not None:
+        points.append(state[0])
+        state = parents[state]
+    points.reverse()
+
+    path = [points[0]]
+    for point in points[1:]:
+        step = 1 if abs(point - path[-1]) < stride else stride
+        step = step if point > path[-1] else -step
+        while path[-1] != point:
+            path.append(path[-1] + step)
+    return [((i // stride) - 1, (i % stride) - 1) for i in path]
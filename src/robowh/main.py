@@ -17,16 +17,26 @@ logger.addHandler(ch)
 
 
 
-from robowh.viewer import Viewer
+import argparse
+
 from robowh.universe import Universe
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Robotic Warehouse Simulator")
+    parser.add_argument("--replay", default=None,
+                        help="Scrub through a recorded trace, instead of running a simulation")
+    args = parser.parse_args()
     logger.info("Welcome to the Robotic Warehouse Simulator!")
+    from robowh.viewer import Viewer  # The web stack is only imported when it's needed
 
-    universe = Universe.get_universe()
-    # Scheduler, Orchestrator, Strategies are all created by the Universe
+    if args.replay:
+        from robowh.trace import TraceReplay
+        viewer = Viewer(replay=TraceReplay(args.replay))
+    else:
+        universe = Universe()
+        # Scheduler, Orchestrator, Strategies are all created by the Universe
 
-    viewer = Viewer(universe)
+        viewer = Viewer(universe)
 
     try:
         viewer.run()
@@ -1,10 +1,11 @@
-
 import logging
 logger = logging.getLogger(__name__)
 
-from typing import TYPE_CHECKING
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterator, Optional, Sequence
 import numpy as np
 import random
+import time
 
 from robowh.robot import Robot
 from robowh.universe import Universe
@@ -16,6 +17,88 @@ class Observer():
     def __init__(self):
         self.n_tasks:int = 0
         self.n_blocked:int = 0
+        self.profiler = TickProfiler()
 
     def count_task(self):
-        self.n_tasks += 1
\ No newline at end of file
+        self.n_tasks += 1
+
+
+class TickProfiler():
+    """Where the time of every tick goes.
+
+    For every tick we record its wall time, how many robots got to act (the rest were skipped,
+    because the tick ran out of time, or because of `ROBOTS_PER_TICK`), and how much time was
+    spent in path planning, orchestration, and shelf operations. Records are kept in a ring
+    buffer, so only the last `capacity` ticks are remembered. We also count for how many ticks
+    in a row every robot was skipped (starved).
+    """
+    PHASES = ('planning', 'orchestration', 'shelves')
+    RECORD = np.dtype(
+        [('tick', np.int64), ('wall', np.float64), ('n_acted', np.int32), ('n_skipped', np.int32)]
+        + [(phase, np.float64) for phase in PHASES]
+        )
+
+    def __init__(self, capacity:int=1024):
+        self.records:np.ndarray = np.zeros(capacity, dtype=self.RECORD)
+        self.n_recorded:int = 0
+        self.starvation:np.ndarray = np.zeros(0, dtype=np.int32)  # Per robot, in ticks
+        self._phase_time:Dict[str, float] = dict.fromkeys(self.PHASES, 0.0)
+        self._tick:int = 0
+        self._tick_start:float = time.perf_counter()
+
+    def start_tick(self, tick:int) -> None:
+        self._tick = tick
+        self._tick_start = time.perf_counter()
+        for phase in self.PHASES:
+            self._phase_time[phase] = 0.0
+
+    @contextmanager
+    def timed(self, phase:str) -> Iterator[None]:
+        """Add the time spent in this block to a phase of the current tick."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._phase_time[phase] += time.perf_counter() - start
+
+    def end_tick(self, acted:Sequence[int], n_robots:int) -> None:
+        """Close the record for this tick. `acted` are indices of robots that got to act."""
+        wall = time.perf_counter() - self._tick_start
+        if len(self.starvation) < n_robots:  # New robots
+            self.starvation = np.concatenate(
+                [self.starvation, np.zeros(n_robots - len(self.starvation), dtype=np.int32)]
+                )
+        self.starvation += 1
+        self.starvation[np.asarray(acted, dtype=np.int64)] = 0
+
+        record = self.records[self.n_recorded % len(self.records)]
+        record['tick'] = self._tick
+        record['wall'] = wall
+        record['n_acted'] = len(acted)
+        record['n_skipped'] = n_robots - len(acted)
+        for phase in self.PHASES:
+            record[phase] = self._phase_time[phase]
+        self.n_recorded += 1
+
+    def history(self, last:Optional[int]=None) -> np.ndarray:
+        """Records for the last ticks, oldest first."""
+        n = min(self.n_recorded, len(self.records))
+        if last is not None:
+            n = min(n, last)
+        indices = np.arange(self.n_recorded - n, self.n_recorded) % len(self.records)
+        return self.records[indices]
+
+    def summary(self, last:int=100) -> Dict[str, float]:
+        """Averages over the last ticks, in milliseconds and shares."""
+        records = self.history(last)
+        if len(records) == 0:
+            return {}
+        n_robots = records['n_acted'] + records['n_skipped']
+        summary = {
+            "tick_ms": 1000 * float(records['wall'].mean()),
+            "share_acted": float(records['n_acted'].sum() / max(n_robots.sum(), 1)),
+            "max_starvation": int(self.starvation.max()) if len(self.starvation) else 0,
+            }
+        for phase in self.PHASES:
+            summary[f"{phase}_ms"] = 1000 * float(records[phase].mean())
+        return summary
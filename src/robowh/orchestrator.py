@@ -3,12 +3,13 @@
 import logging
 logger = logging.getLogger(__name__)
 
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, cast
 import numpy as np
-import random
 
+from robowh.products import product_name
 from robowh.robot import Robot
 from robowh.universe import Universe
+from robowh.shelves import ShelvesFullError
 
 
 class Orchestrator:
@@ -62,11 +63,17 @@ class Orchestrator:
             if product is None: # We failed to create an order
                 return False  # Try to set the robot to idle
 
-            bay_id = self.universe.bays.records[product]
+            try:
+                shelf_id = self.universe.shelves.request_optimal_placement()
+            except ShelvesFullError:
+                logger.info(f"No space left on {self.universe.shelves.name} to store " +
+                            f"{product_name(product)}")
+                return False  # Try to set the robot to idle
+
+            bay_id = cast(int, self.universe.bays.index_of(product))  # It was picked there
             bx,by = self.universe.bays.coords[bay_id]
             self.universe.bays.lock(bay_id, product)  # Lock the product
 
-            shelf_id = self.universe.shelves.request_optimal_placement()
             sx,sy = self.universe.shelves.coords[shelf_id]
             self.universe.shelves.lock(shelf_id, None)  # Lock the space
 
@@ -79,11 +86,11 @@ class Orchestrator:
             if product is None: # We failed to create an order
                 return False  # Try to set the robot to idle
 
-            shelf_id = self.universe.shelves.records[product]
+            shelf_id = cast(int, self.universe.shelves.index_of(product))  # Same here
             x,y = self.universe.shelves.coords[shelf_id]
             self.universe.shelves.lock(shelf_id, product)  # Lock the product
 
-            bay_id = np.random.randint(len(self.universe.bays.inventory))
+            bay_id = self.universe.rng.randrange(len(self.universe.bays.inventory))
             bx,by = self.universe.bays.coords[bay_id]
             # No need to lock a bay - they are assumed to have infinite capacity
 
@@ -107,4 +114,4 @@ class Orchestrator:
     def find_idle_robot(self):
         """Find one idle robot from the stack."""
         # TODO: Make it adaptive to the coordinates of where the robot is needed.
-        return random.choice(self.idle_robots) if self.idle_robots else None
\ No newline at end of file
+        return self.universe.rng.choice(self.idle_robots) if self.idle_robots else None
\ No newline at end of file
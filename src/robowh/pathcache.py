@@ -0,0 +1,147 @@
+"""A cache of routes on the static layout of the WH (racks and bays, but no robots)."""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+from robowh.custom_types import Coords
+
+Path = Tuple[Coords, ...]
+Key = Tuple[Coords, Coords, Hashable]  # (start, or any cell of a route; goal; tag)
+
+
+class PathCache:
+    """LRU cache of routes, keyed on (start, goal).
+
+    Robots travel between the same bays and racks over and over, and they replan every few
+    steps, from wherever they are on the route. So we index every cell of every cached route:
+    a suffix of a shortest path is also a shortest path, and replanning from the middle of
+    a known route is a cache hit as well.
+
+    A suffix is as short as a fresh search would be, but it's not always the same route (among
+    routes of the same length), so what is cached does change which way robots go.
+
+    Routes are only valid for a given version of the layout. The universe bumps its
+    `layout_version` every time a shelf is created, and the cache drops everything once
+    it notices that the version changed.
+    """
+
+    def __init__(self, maxsize:int=1024):
+        self.maxsize:int = maxsize
+        self.layout_version:Optional[int] = None
+        self.hits:int = 0
+        self.misses:int = 0
+        self.repairs:int = 0  # Updated by the strategies, when a cached route hit a robot
+        self._paths:OrderedDict[Key, Path] = OrderedDict()  # Full routes, in LRU order
+        self._index:Dict[Key, Tuple[Key, int]] = {}  # Cell -> (route key, offset)
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def clear(self) -> None:
+        self._paths.clear()
+        self._index.clear()
+
+    def _check_version(self, layout_version:int) -> None:
+        if layout_version != self.layout_version:
+            if self._paths:
+                logger.debug(f"Layout changed, dropping {len(self._paths)} cached paths")
+            self.clear()
+            self.layout_version = layout_version
+
+    def get(self, start:Coords, goal:Coords, layout_version:int, tag:Hashable=None
+            ) -> Optional[Path]:
+        """Return a cached route from start to goal, or None.
+
+        `tag` separates routes that were calculated with different settings (like `until_touch`).
+        """
+        self._check_version(layout_version)
+        entry = self._index.get((start, goal, tag))
+        if entry is None:
+            self.misses += 1
+            return None
+        key, offset = entry
+        self._paths.move_to_end(key)
+        self.hits += 1
+        return self._paths[key][offset:]
+
+    def has(self, start:Coords, goal:Coords, layout_version:int, tag:Hashable=None) -> bool:
+        """Whether `get` would be a hit, without counting it, or touching the LRU order."""
+        self._check_version(layout_version)
+        return (start, goal, tag) in self._index
+
+    def put(self, start:Coords, goal:Coords, path:Path, layout_version:int, tag:Hashable=None
+            ) -> None:
+        """Remember a route, evicting the least recently used ones if needed."""
+        self._check_version(layout_version)
+        key = (start, goal, tag)
+        if key in self._paths:
+            self._forget(key)
+        self._paths[key] = path
+        for offset, cell in enumerate(path):
+            self._index[(cell, goal, tag)] = (key, offset)
+        # An empty route (no path) is cached as well, but only from its start
+        self._index.setdefault((start, goal, tag), (key, 0))
+
+        while len(self._paths) > self.maxsize:
+            self._forget(next(iter(self._paths)))
+
+    def _forget(self, key:Key) -> None:
+        """Drop a route, and all index entries pointing to it."""
+        path = self._paths.pop(key)
+        _, goal, tag = key
+        for cell in path or (key[0],):
+            cell_key = (cell, goal, tag)
+            if self._index.get(cell_key, (None,))[0] == key:
+                del self._index[cell_key]
+
+    def checkpoint(self) -> Dict[str, np.ndarray]:
+        """Routes (in LRU order) and the index of their cells, as arrays (see `robowh.checkpoint`).
+
+        Cached routes are suffixes of older searches, and may differ from fresh searches (among
+        routes of the same length), so a restored universe needs the same cache to continue
+        exactly. Keys are (start, goal, tag), with boolean tags, as the strategies use them.
+        """
+        keys = list(self._paths)
+        numbers = {key: i for i, key in enumerate(keys)}
+        index = [(cell, goal, tag, numbers[key], offset)
+                 for (cell, goal, tag), (key, offset) in self._index.items()]
+        return {
+            "layout_version": np.array(-1 if self.layout_version is None
+                                       else self.layout_version),
+            "route_starts": np.array([key[0] for key in keys], dtype=np.int32).reshape(-1, 2),
+            "route_goals": np.array([key[1] for key in keys], dtype=np.int32).reshape(-1, 2),
+            "route_tags": np.array([key[2] for key in keys], dtype=bool),
+            "route_lengths": np.array([len(self._paths[key]) for key in keys], dtype=np.int32),
+            "route_cells": np.array([cell for key in keys for cell in self._paths[key]],
+                                    dtype=np.int32).reshape(-1, 2),
+            "index_cells": np.array([e[0] for e in index], dtype=np.int32).reshape(-1, 2),
+            "index_goals": np.array([e[1] for e in index], dtype=np.int32).reshape(-1, 2),
+            "index_tags": np.array([e[2] for e in index], dtype=bool),
+            "index_routes": np.array([e[3] for e in index], dtype=np.int64),
+            "index_offsets": np.array([e[4] for e in index], dtype=np.int64),
+            }
+
+    def restore(self, state:Dict[str, np.ndarray]) -> None:
+        """Take the state from `checkpoint()`."""
+        self.clear()
+        version = int(state["layout_version"])
+        self.layout_version = None if version < 0 else version
+
+        def points(name):
+            return list(map(tuple, state[name].tolist()))
+
+        cells, lengths = points("route_cells"), state["route_lengths"].tolist()
+        ends = np.cumsum(lengths).tolist()
+        tags = state["route_tags"].tolist()
+        keys = list(zip(points("route_starts"), points("route_goals"), tags))
+        for key, length, end in zip(keys, lengths, ends):
+            self._paths[key] = tuple(cells[end - length:end])
+        routes = [keys[route] for route in state["index_routes"].tolist()]
+        self._index.update(zip(
+            zip(points("index_cells"), points("index_goals"), state["index_tags"].tolist()),
+            zip(routes, state["index_offsets"].tolist()),
+            ))
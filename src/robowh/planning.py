@@ -0,0 +1,99 @@
+"""Planning paths for many robots at once, in a pool of worker processes.
+
+Normally every robot plans its path when its turn comes, inside `Robot.move()`, one robot at
+a time. With `Universe(planning_workers=n)`, the tick first gathers all robots that are going
+to plan on this tick, and plans them in a batch, before anyone moves. The searches themselves
+(A* on a copy of the grid) are pure functions, so they are farmed out to worker processes
+(threads wouldn't help, as the searches are pure Python, and hold the GIL). Everything that
+touches the shared state of the universe (the path cache, repairs around robots) is then done
+here, in the main process, in the order in which robots act.
+
+So the results don't depend on the number of workers, or on which of them finished first: they
+are the same as if robots planned one by one, in their order, at the start of the tick. (This is
+a bit different from planning at their turn, after earlier robots had moved, but the robots
+don't mind, and plans only need to be good for the next few steps anyway.)
+
+Only strategies with `batch_planning` are planned ahead. The rest plan at their turn, as usual.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import itertools
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from robowh.custom_types import Coords
+
+Job = Tuple[Coords, Coords, bool]  # start, goal, until_touch
+
+
+def _find_paths(find_path:Callable, grid:np.ndarray, jobs:Sequence[Job]) -> List[List[Coords]]:
+    """Runs in a worker: a chunk of searches on the same grid."""
+    return [list(find_path(grid, start, goal, until_touch)) for start, goal, until_touch in jobs]
+
+
+class PlannerPool:
+    """A pool of workers for path searches, and the batch planning step of the tick."""
+    min_batch:int = 8  # Smaller batches aren't worth shipping the grid to the workers
+
+    def __init__(self, n_workers:int, processes:bool=True):
+        self.n_workers:int = n_workers
+        self.processes:bool = processes
+        self.n_batches:int = 0
+        self.n_planned:int = 0  # Robots planned ahead, in total
+        self._executor:Optional[Executor] = None  # Started on first use
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            logger.info(f"Starting a planning pool of {self.n_workers} workers")
+            pool = ProcessPoolExecutor if self.processes else ThreadPoolExecutor
+            self._executor = pool(max_workers=self.n_workers)
+        return self._executor
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def find_paths(self, find_path:Callable, grid:np.ndarray, jobs:Sequence[Job]
+                   ) -> List[List[Coords]]:
+        """Run searches (all on the same grid), and return paths in the order of jobs.
+
+        `find_path` has the signature of `astar.find_path`, and has to be picklable (a module
+        level function). The grid is copied, so workers never see it change under their feet.
+        """
+        if len(jobs) < self.min_batch or self.n_workers <= 1:
+            return _find_paths(find_path, grid, jobs)
+        grid = np.array(grid)  # A writeable copy; views of the live grid can't go to workers
+        size = -(-len(jobs) // self.n_workers)
+        chunks = [jobs[i:i+size] for i in range(0, len(jobs), size)]
+        results = self.executor.map(_find_paths, *zip(*[(find_path, grid, c) for c in chunks]))
+        return [path for chunk in results for path in chunk]
+
+    def plan_ahead(self, universe, robots:Sequence) -> None:
+        """Plan paths for all these robots that will need one on their turn (in this order)."""
+        requests = []
+        for robot in robots:
+            if robot.strategy.batch_planning:
+                target = robot._pending_target()
+                if target is not None:
+                    requests.append((robot, target))
+        if not requests:
+            return
+        self.n_batches += 1
+        self.n_planned += len(requests)
+
+        # Strategies may share state (like the path cache), so we keep the order across
+        # strategies as well, and only batch consecutive robots with the same one.
+        for strategy, run in itertools.groupby(requests, key=lambda r: r[0].strategy):
+            group = list(run)
+            plans = strategy.calculate_paths(
+                universe, [((robot.x, robot.y), target, robot.name) for robot, target in group],
+                pool=self
+                )
+            for (robot, _), plan in zip(group, plans):
+                robot._set_plan(plan)
@@ -0,0 +1,104 @@
+"""Products: compact integer ids, handed out by a registry, and display names for people.
+
+Inside the simulation, products are plain ints, so shelves can keep them in int arrays indexed
+by product, with no string hashing. Products that leave the warehouse are retired, and their
+ids are handed out again, so ids stay below the largest number of products that were ever in
+the warehouse at once, and memory stays bounded however long the run is.
+
+Display names (8 hex digits, like the old product codes) are only made at the edges: in logs,
+and wherever people look at products.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import numpy as np
+from typing import Dict, List
+
+from robowh.custom_types import Product
+
+
+def product_name(product:Product) -> str:
+    """How a product is shown to people."""
+    return f"{product:08x}"
+
+
+class ProductRegistry:
+    """Hands out product ids, and takes them back once products leave the warehouse.
+
+    Fresh ids are consecutive, and retired ones are reused first (the last retired goes first),
+    so the order of ids only depends on the order of calls, and seeded runs stay reproducible.
+    """
+
+    def __init__(self):
+        self._next:int = 0  # Ids below this one were handed out at some point
+        self._retired:List[Product] = []  # Free to be handed out again
+        self._alive:np.ndarray = np.zeros(1024, dtype=bool)
+        self.n_alive:int = 0
+
+    def __len__(self) -> int:
+        return self.n_alive
+
+    def __contains__(self, product:Product) -> bool:
+        return 0 <= product < self._next and bool(self._alive[product])
+
+    @property
+    def capacity(self) -> int:
+        """All ids are below this number (arrays indexed by product need this many slots)."""
+        return self._next
+
+    def new(self) -> Product:
+        """Create a new product."""
+        if self._retired:
+            product = self._retired.pop()
+        else:
+            product = self._next
+            self._next += 1
+            self._grow()
+        self._alive[product] = True
+        self.n_alive += 1
+        return product
+
+    def new_many(self, n:int) -> List[Product]:
+        """Create `n` new products at once (the same ids as `n` calls of `new` would give)."""
+        n_reused = min(n, len(self._retired))
+        products = self._retired[len(self._retired) - n_reused:][::-1]
+        del self._retired[len(self._retired) - n_reused:]
+        products.extend(range(self._next, self._next + n - n_reused))
+        self._next += n - n_reused
+        self._grow()
+        self._alive[products] = True
+        self.n_alive += n
+        return products
+
+    def retire(self, product:Product) -> None:
+        """A product left the warehouse (it must not be on any shelf), and its id can be reused."""
+        if product not in self:
+            raise ValueError(f"Product {product_name(product)} is not in the warehouse")
+        logger.debug(f"Product {product_name(product)} is retired")
+        self._alive[product] = False
+        self._retired.append(product)
+        self.n_alive -= 1
+
+    def _grow(self) -> None:
+        """Make room in the array of live ids (doubling it, as for lists)."""
+        if self._next > len(self._alive):
+            alive = np.zeros(max(self._next, 2*len(self._alive)), dtype=bool)
+            alive[:len(self._alive)] = self._alive
+            self._alive = alive
+
+    def checkpoint(self) -> Dict[str, np.ndarray]:
+        """The state of the registry as arrays (see `robowh.checkpoint`)."""
+        return {
+            "next": np.array(self._next, dtype=np.int64),
+            "retired": np.array(self._retired, dtype=np.int64),
+            }
+
+    def restore(self, state:Dict[str, np.ndarray]) -> None:
+        """Take the state from `checkpoint()`."""
+        self._next = int(state["next"])
+        self._retired = state["retired"].tolist()
+        self._alive = np.zeros(max(self._next, 1024), dtype=bool)
+        self._alive[:self._next] = True
+        self._alive[self._retired] = False
+        self.n_alive = self._next - len(self._retired)
@@ -0,0 +1,239 @@
+"""Profiling a running simulation on demand, for a number of ticks or seconds.
+
+Two kinds of captures are supported:
+- "sample": a background thread looks at the stack of the simulation thread every few
+  milliseconds. It's cheap, and gives collapsed stacks (one line per distinct stack, with the
+  number of samples), the format of flame graph tools.
+- "cprofile": the standard deterministic profiler, switched on in the simulation thread. It
+  slows the simulation down a lot, but counts every call. The result is a pstats file.
+
+Both start and stop at tick boundaries, so we know which thread runs the simulation, and how
+many ticks were captured. Both also break the time down by module (`astar`, `robot`, `shelves`,
+`orchestrator`...). When nothing is being captured, the universe only checks whether
+`universe.capture` is None, once per tick.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import cProfile
+import collections
+import io
+import marshal
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from typing import Any, Callable, Counter, Dict, Optional, Tuple, cast
+
+MODES = ("sample", "cprofile")
+
+_BUILTIN = re.compile(r"<built-in method _?(\w+)\.")  # Like `<built-in method _heapq.heappop>`
+
+
+class CaptureBusyError(RuntimeError):
+    """Only one capture can run at a time."""
+
+
+def module_of(filename:str, function:str="") -> str:
+    """A short name of the module that a code object (or a cProfile entry) belongs to.
+
+    Our own modules go without the package name (`astar`), packages by their top-level name
+    (`numpy`), and C functions by the module that they come from (`heapq` for `_heapq.heappop`).
+    """
+    if filename == "~":  # cProfile's name for C functions
+        match = _BUILTIN.match(function)
+        return match.group(1) if match else "builtins"
+    parts = filename.replace("\\", "/").split("/")
+    for anchor in ("site-packages", "dist-packages"):
+        if anchor in parts and parts.index(anchor) + 1 < len(parts):
+            return parts[parts.index(anchor) + 1].removesuffix(".py")
+    name = os.path.splitext(parts[-1])[0]
+    return parts[-2] if name == "__init__" and len(parts) > 1 else name
+
+
+class ProfileCapture:
+    """One capture: it waits for the next tick, runs for `ticks` ticks or `seconds` seconds.
+
+    Created by `Universe.profile()`, which also hooks it into the tick. Use `wait()` to wait for
+    the end, and then `summary()`, `collapsed()` (for "sample") or `pstats_dump()` (for
+    "cprofile") to get the results. `cancel()` ends it early.
+    """
+
+    def __init__(self, ticks:Optional[int]=None, seconds:Optional[float]=None, mode:str="sample",
+                 interval:float=0.005):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode: {mode}. Supported: {MODES}")
+        if (ticks is None) == (seconds is None):
+            raise ValueError("Profile either for a number of ticks, or for a number of seconds")
+        if (ticks is not None and ticks <= 0) or (seconds is not None and seconds <= 0):
+            raise ValueError("Nothing to profile in zero ticks or seconds")
+        self.ticks:Optional[int] = ticks
+        self.seconds:Optional[float] = seconds
+        self.mode:str = mode
+        self.interval:float = interval
+        self.n_ticks:int = 0  # Ticks captured so far
+        self.wall:float = 0.0  # Seconds captured
+        self.stacks:Counter[Tuple[str, ...]] = collections.Counter()  # Samples per stack
+        self.n_idle:int = 0  # Samples taken in-between ticks
+        self.done = threading.Event()
+        # Called in the simulation thread, when the capture is over
+        self.on_done:Optional[Callable[["ProfileCapture"], None]] = None
+        self._profile:Optional[cProfile.Profile] = None
+        self._stats:Optional[pstats.Stats] = None
+        self._sampler:Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._thread_id:Optional[int] = None
+        self._in_tick:bool = False
+        self._start:Optional[float] = None
+        self._cancelled:bool = False
+        self._lock = threading.Lock()  # Hooks run in the simulation thread, `cancel` anywhere
+
+    # Hooks, called by the universe at the start and at the end of every tick
+    def tick_started(self) -> None:
+        with self._lock:
+            if self.done.is_set():
+                return
+            if self._cancelled:  # From another thread, while cProfile was on in this one
+                self._end()
+                return
+            if self._start is None:
+                self._begin()
+            self._in_tick = True
+
+    def tick_finished(self) -> None:
+        with self._lock:
+            if self.done.is_set():
+                return
+            self._in_tick = False
+            self.n_ticks += 1
+            if self._cancelled:
+                finished = True
+            elif self.ticks is not None:
+                finished = self.n_ticks >= self.ticks
+            else:
+                elapsed = time.perf_counter() - cast(float, self._start)  # Started by now
+                finished = elapsed >= cast(float, self.seconds)
+            if finished:
+                self._end()
+
+    def cancel(self) -> None:
+        """End the capture now, with what was captured so far.
+
+        cProfile can only be switched off in the thread that it profiles, so a cProfile capture
+        that is running, cancelled from another thread, ends at the next tick boundary instead.
+        Either way, `done` is set (and `universe.capture` cleared) once it's over.
+        """
+        with self._lock:
+            if self.done.is_set():
+                return
+            self._cancelled = True
+            if self._profile is None or threading.get_ident() == self._thread_id:
+                self._end()
+
+    def _begin(self) -> None:
+        logger.info(f"Profiling ({self.mode}) for "
+                    + (f"{self.ticks} ticks" if self.ticks else f"{self.seconds} s"))
+        self._thread_id = threading.get_ident()
+        self._start = time.perf_counter()
+        if self.mode == "cprofile":
+            self._profile = cProfile.Profile()
+            self._profile.enable()  # Only profiles this thread
+        else:
+            self._sampler = threading.Thread(target=self._sample, daemon=True)
+            self._sampler.start()
+
+    def _end(self) -> None:
+        if self._start is not None:
+            self.wall = time.perf_counter() - self._start
+        if self._profile is not None:
+            self._profile.disable()
+            self._stats = pstats.Stats(self._profile)
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+        logger.info(f"Profiling {'cancelled' if self._cancelled else 'done'}: "
+                    f"{self.n_ticks} ticks in {self.wall:.2f} s")
+        if self.on_done is not None:
+            self.on_done(self)
+        self.done.set()
+
+    def _sample(self) -> None:
+        """Runs in its own thread: record the stack of the simulation thread, every interval."""
+        thread_id = cast(int, self._thread_id)  # Set before the sampler is started
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                continue
+            if not self._in_tick:  # Waiting for the next tick
+                self.n_idle += 1
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{module_of(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            self.stacks[tuple(reversed(stack))] += 1
+
+    def wait(self, timeout:Optional[float]=None) -> bool:
+        """Wait until the capture is over. Returns False on timeout."""
+        return self.done.wait(timeout)
+
+    def by_module(self) -> Dict[str, float]:
+        """Seconds spent in every module (not counting the functions it called), longest first.
+
+        For samples, the time of a C function goes to the Python function that called it, and
+        time in-between ticks is counted as "idle".
+        """
+        if self._stats is not None:
+            seconds:Dict[str, float] = collections.defaultdict(float)
+            for (filename, _, function), entry in self._entries().items():
+                seconds[module_of(filename, function)] += entry[2]  # Total time, without calls
+        else:
+            n_samples = sum(self.stacks.values()) + self.n_idle
+            per_sample = self.wall / n_samples if n_samples else 0.0
+            seconds = collections.defaultdict(float)
+            for stack, count in self.stacks.items():
+                seconds[stack[-1].split(":")[0]] += count * per_sample
+            if self.n_idle:  # Real-time runs sleep in-between ticks
+                seconds["idle"] = self.n_idle * per_sample
+        return dict(sorted(seconds.items(), key=lambda item: -item[1]))
+
+    def summary(self) -> Dict:
+        result = {
+            "mode": self.mode,
+            "n_ticks": self.n_ticks,
+            "seconds": self.wall,
+            "by_module": self.by_module(),
+            }
+        if self.mode == "sample":
+            result["n_samples"] = sum(self.stacks.values())
+            result["n_idle_samples"] = self.n_idle
+        return result
+
+    def collapsed(self) -> str:
+        """Stacks in the collapsed format: `module:function;module:function <samples>` lines."""
+        return "".join(
+            f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common()
+            )
+
+    def pstats_dump(self) -> bytes:
+        """cProfile results, in the format of `pstats.Stats.dump_stats` (for snakeviz & co)."""
+        if self._stats is None:
+            raise ValueError("pstats are only available for 'cprofile' captures")
+        return marshal.dumps(self._entries())
+
+    def pstats_text(self, limit:int=30) -> str:
+        """The usual text report, by cumulative time."""
+        if self._stats is None:
+            raise ValueError("pstats are only available for 'cprofile' captures")
+        stream = io.StringIO()
+        stats = pstats.Stats(cast(cProfile.Profile, self._profile), stream=stream)
+        stats.sort_stats("cumulative").print_stats(limit)
+        return stream.getvalue()
+
+    def _entries(self) -> Dict[Tuple[str, int, str], Tuple]:
+        """Raw cProfile entries, by (file, line, function) (pstats doesn't declare them)."""
+        return cast(Any, self._stats).stats
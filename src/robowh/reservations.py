@@ -0,0 +1,71 @@
+"""Reservation table: who is going to be where, and when, for cooperative pathfinding."""
+
+import logging
+logger = logging.getLogger(__name__)
+
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+from robowh.custom_types import Coords
+
+Slot = Tuple[int, int, int]  # (x, y, tick)
+
+
+class ReservationTable:
+    """Pixels booked by robots for future ticks.
+
+    A robot that planned a path reserves every pixel of it, for the tick at which it expects
+    to be there, and other robots plan around these reservations. A reservation for tick t
+    means "I will be standing on this pixel at the end of tick t".
+    """
+
+    def __init__(self):
+        self._slots:Dict[Slot, Hashable] = {}  # (x, y, tick) -> agent
+        self._by_agent:Dict[Hashable, List[Slot]] = defaultdict(list)
+        self._by_tick:Dict[int, List[Slot]] = defaultdict(list)
+        self._oldest_tick:Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __iter__(self) -> Iterator[Tuple[Slot, Hashable]]:
+        """All reservations, as ((x, y, tick), agent), in the order they were made."""
+        return iter(list(self._slots.items()))
+
+    def owner(self, point:Coords, tick:int) -> Optional[Hashable]:
+        """Who reserved this pixel for this tick (or None)."""
+        return self._slots.get((point[0], point[1], tick))
+
+    def is_reserved(self, point:Coords, tick:int, agent:Hashable=None) -> bool:
+        """Whether someone other than the agent reserved this pixel for this tick."""
+        owner = self._slots.get((point[0], point[1], tick))
+        return owner is not None and owner != agent
+
+    def reserve(self, agent:Hashable, path:Iterable[Tuple[Coords, int]]) -> None:
+        """Reserve (pixel, tick) pairs for an agent. Existing reservations are not overwritten."""
+        for point, tick in path:
+            slot = (point[0], point[1], tick)
+            if slot in self._slots:
+                continue
+            self._slots[slot] = agent
+            self._by_agent[agent].append(slot)
+            self._by_tick[tick].append(slot)
+            if self._oldest_tick is None or tick < self._oldest_tick:
+                self._oldest_tick = tick
+
+    def release(self, agent:Hashable) -> None:
+        """Cancel all reservations of an agent (before it plans again)."""
+        for slot in self._by_agent.pop(agent, []):
+            if self._slots.get(slot) == agent:
+                del self._slots[slot]
+
+    def expire(self, before_tick:int) -> None:
+        """Forget reservations for ticks that are in the past."""
+        if self._oldest_tick is None:
+            return
+        for tick in range(self._oldest_tick, before_tick):
+            for slot in self._by_tick.pop(tick, []):
+                agent = self._slots.pop(slot, None)
+                if agent is not None:
+                    self._by_agent[agent].remove(slot)
+        self._oldest_tick = max(self._oldest_tick, before_tick)
@@ -6,6 +6,7 @@ logger = logging.getLogger(__name__)
 from typing import List, Tuple, Literal, Optional, cast, TypeAlias
 
 from robowh.custom_types import RobotAction, Product, Coords
+from robowh.products import product_name
 from robowh.universe import Universe
 from robowh.utils import grid_codes
 from robowh.strategies import MoveStrategy
@@ -13,10 +14,20 @@ from robowh.strategies import MoveStrategy
 
 RobotState: TypeAlias = Literal["idling", "moving", "blocked"]
 
+# Plans are stored as bytes, one per move: (dx+1)*3 + (dy+1). It's 1 byte per move instead
+# of a tuple of two ints, and decoding reuses the same tuples.
+_DELTAS = tuple((code // 3 - 1, code % 3 - 1) for code in range(9))
+
 class Robot:
     """A robot in the universe."""
-
-    def __init__(self, name:str, strategy: MoveStrategy):
+    # Slots make robots much smaller, which matters when there are many thousands of them
+    __slots__ = (
+        "name", "strategy", "x", "y", "task", "origin", "destination", "current_action",
+        "action_queue", "_action_pos", "state", "_plan", "_plan_pos", "load", "universe"
+        )
+
+    def __init__(self, universe:Universe, name:str, strategy: MoveStrategy,
+                 position:Optional[Coords]=None):
         logger.debug(f"Spawning a new robot: {name}")
         self.name:str = name
         self.strategy:MoveStrategy = strategy
@@ -27,15 +38,21 @@ class Robot:
         self.destination:Optional[Coords] = None
         # Action is a sequence of action proper + optional coords, product
         self.current_action:Optional[RobotAction] = None # None in-between actions or while idling
-        self.action_queue:List[RobotAction] = []  # A queue of scheduled actions
+        # A queue of scheduled actions, and how far we've read into it. Queues are short, and
+        # are only refilled once drained, so a list with a cursor is enough (and a deque is big).
+        self.action_queue:List[RobotAction] = []
+        self._action_pos:int = 0
         self.state:RobotState = "idling"
-        self.next_moves:List[Tuple[int]] = []  # Placeholder for a sequence of steps in the queue
+        self._plan:bytes = b''  # Planned moves (encoded as in _DELTAS), and how far we've read
+        self._plan_pos:int = 0
         self.load = None  # What the robot is carrying
 
-        self.universe:Universe = Universe.get_universe()
+        self.universe:Universe = universe
 
-        # Teleport to a good position:
-        self._set_position(self.universe.random_empty_position())  # Teleport
+        # Teleport to a good position (unless we are told where to be, like when restoring):
+        if position is None:
+            position = self.universe.random_empty_position()
+        self._set_position(position)  # Teleport
         # We don't want to report for service right upon creation, let's wait for initialization
         # to be over, and for time to start.
 
@@ -45,13 +62,14 @@ class Robot:
         if not isinstance(position, tuple) or len(position) != 2:
             raise ValueError("Position must be a tuple of (x, y) coordinates.")
         self.x, self.y = position
-        self.universe.grid[self.x, self.y] = grid_codes['robot']
+        self._paint(grid_codes['robot'])
         logger.debug(f"{self.name} teleported to ({self.x}, {self.y})")
 
 
     def _report_for_service(self) -> None:
         """Robot finished a task and is ready to pick up a new one, or become idle."""
-        self.universe.orchestrator.process_request_for_service(self)
+        with self.universe.observer.profiler.timed('orchestration'):
+            self.universe.orchestrator.process_request_for_service(self)
 
     def act(self) -> None:
         """Perform an action for this turn, whatever it is."""
@@ -62,7 +80,7 @@ class Robot:
 
         if self.current_action is None:
             if len(self.action_queue) > 0:
-                self.current_action = self.action_queue.pop(0)
+                self.current_action = self._next_action()
             else: # We can only idle
                 self._report_for_service()
                 return
@@ -79,26 +97,34 @@ class Robot:
 
         elif self.current_action[0] == "pick":
             x,y = cast(Coords, self.current_action[1])
-            product = self.current_action[2]
-            scan_result = self.universe.scan(x, y)
-            if not scan_result:
-                raise SystemError(f"No shelf can be reached from {self.x}, {self.y}")
-            # We don't need to check if the product is there, as we'll just crash at picking
-            shelf, index = scan_result
-            logger.info(f"{self.name} picking {product} from {shelf.name} pos {index}")
-            shelf.remove(index, product)
+            product = cast(Product, self.current_action[2])
+            with self.universe.observer.profiler.timed('shelves'):
+                scan_result = self.universe.scan(x, y)
+                if not scan_result:
+                    raise SystemError(f"No shelf can be reached from {self.x}, {self.y}")
+                # We don't need to check if the product is there, as we'll just crash at picking
+                shelf, index = scan_result
+                logger.info(f"{self.name} picking {product_name(product)} " +
+                            f"from {shelf.name} pos {index}")
+                shelf.remove(index, product)
+                if self.universe.recorder is not None:
+                    self.universe.recorder.shelf_event(self, "pick", shelf.coords[index], product)
             self.current_action = None  # Reset action
 
         elif self.current_action[0] == "drop":
             x,y = cast(Coords, self.current_action[1])
-            product = self.current_action[2]
+            product = cast(Product, self.current_action[2])
             # TODO: Here the robot could check if it is in fact carrying product
-            scan_result = self.universe.scan(x, y)  # Scan for the presence of a bay
-            if not scan_result:
-                raise SystemError(f"No shelf can be reached from {self.x}, {self.y}")
-            shelf, index = scan_result
-            logger.info(f"{self.name} storing {product} at {shelf.name} pos {index}")
-            shelf.place_at(index, product)
+            with self.universe.observer.profiler.timed('shelves'):
+                scan_result = self.universe.scan(x, y)  # Scan for the presence of a bay
+                if not scan_result:
+                    raise SystemError(f"No shelf can be reached from {self.x}, {self.y}")
+                shelf, index = scan_result
+                logger.info(f"{self.name} storing {product_name(product)} " +
+                            f"at {shelf.name} pos {index}")
+                shelf.place_at(index, product)
+                if self.universe.recorder is not None:
+                    self.universe.recorder.shelf_event(self, "drop", shelf.coords[index], product)
             self.current_action = None  # Reset action
 
         else:
@@ -108,17 +134,21 @@ class Robot:
     def move(self) -> None:
         """Perform a single one-pixel move (if possible)."""
         # Check if we are out of ideas for next moves, in which case, think
-        if len(self.next_moves) == 0:
+        if not self._has_plan():
             logger.debug(f"{self.name} recalculating path (at {self.x}, {self.y})")
-            self.next_moves = self.strategy.calculate_path(
-                (self.x, self.y), self.current_action[1]
-                )
+            with self.universe.observer.profiler.timed('planning'):
+                self._set_plan(self.strategy.calculate_path(
+                    self.universe, (self.x, self.y), self.current_action[1], agent=self.name
+                    ))
 
-        if len(self.next_moves) ==0: # If it's still zero, then the calculation above failed
+        if not self._has_plan(): # If it's still empty, then the calculation above failed
             self.set_state("blocked")
             return
 
-        movement = self.next_moves.pop(0)  # Next element (reading L to R)
+        movement = self._next_move()  # Next element (reading L to R)
+        if movement == (0, 0):  # Some strategies plan to wait for others to pass
+            self.set_state("moving")
+            return
         new_x = self.x + movement[0]
         new_y = self.y + movement[1]
 
@@ -128,31 +158,84 @@ class Robot:
         # we're just communicating the change to the universe. Maybe we'll refactor it to
         # something slightly more elegant later.
         if self.universe.grid_is_free(new_x, new_y):  # Can move to this pixel
-            self.universe.grid[self.x, self.y] = grid_codes['empty']
+            self._paint(grid_codes['empty'])
             self.x, self.y = new_x, new_y
             self.set_state("moving")
         else:  # Cannot move
             self.set_state("blocked")
             # Depending on the strategy, it could be a reasonable point to replan from scratch.
-            # TODO: introduce some flexibility here. Always replan? Sometimes replan?
+            if self.strategy.replan_on_block:
+                self._set_plan([])
+
+
+    def _pending_target(self) -> Optional[Coords]:
+        """Where we'll plan a path to on our next turn, if we are going to (see `planning.py`)."""
+        action = self.current_action
+        if action is None:  # We'll take the next action from the queue, and start on it
+            if self._action_pos >= len(self.action_queue):
+                return None
+            action = self.action_queue[self._action_pos]
+        if action[0] != "go" or self._has_plan():
+            return None
+        target = cast(Coords, action[1])
+        if abs(self.x-target[0]) + abs(self.y-target[1]) <= 1:  # We'll just arrive
+            return None
+        return target
+
+
+    # The plan (next moves) is only touched through these, so that subclasses could store it
+    # differently (see `fleet.FleetRobot`).
+    @property
+    def next_moves(self) -> List[Tuple[int, int]]:
+        """A copy of the moves that are left in the plan."""
+        return [_DELTAS[code] for code in self._plan[self._plan_pos:]]
+
+    @next_moves.setter
+    def next_moves(self, moves:List[Tuple[int, int]]) -> None:
+        self._set_plan(moves)
+
+    def _has_plan(self) -> bool:
+        return self._plan_pos < len(self._plan)
+
+    def _next_move(self) -> Tuple[int, int]:
+        i = self._plan_pos
+        self._plan_pos = i + 1
+        return _DELTAS[self._plan[i]]
+
+    def _set_plan(self, moves:List[Tuple[int, int]]) -> None:
+        self._plan = bytes([(dx+1)*3 + dy+1 for dx, dy in moves])
+        self._plan_pos = 0
+
+
+    def _paint(self, code:int) -> None:
+        """Mark the robot's current pixel on the occupancy layer, and on the combined grid."""
+        self.universe.occupancy[self.x, self.y] = code
+        self.universe.grid[self.x, self.y] = code
+        if code == grid_codes['empty']:
+            self.universe.free_cells.release(self.x, self.y)
+        else:
+            self.universe.free_cells.occupy(self.x, self.y)
 
 
     def set_state(self, new_state:RobotState):
         """Set state, but also report this change to the Observer."""
         if new_state != "blocked":
             # Nice moving robot
-            self.universe.grid[self.x, self.y] = grid_codes['robot']
+            self._paint(grid_codes['robot'])
             if self.state == "blocked":  # Just got unblocked
                 self.universe.observer.n_blocked -= 1
                 # logger.warning(f"Unblocking {self.name}")
         if new_state == "blocked":
             # Confused robot
             # logger.debug(f"{self.name} stumbled at ({self.x}, {self.y})")
-            self.universe.grid[self.x, self.y] = grid_codes['confused']
+            self._paint(grid_codes['confused'])
             if self.state != "blocked":  # Just got confused
                 self.universe.observer.n_blocked += 1
                 # logger.error(f"Blocking {self.name}")
         self.state = new_state
+        recorder = self.universe.recorder
+        if recorder is not None:
+            recorder.robot_event(self)
 
 
     def assign_task(
@@ -178,7 +261,8 @@ class Robot:
                 raise ValueError("Transfer task must have an origin.")
             if destination is None:
                 raise ValueError("Transfer task must have a destination.")
-            logger.info(f"{self.name} asked to bring {product} from {origin} to {destination}")
+            logger.info(f"{self.name} asked to bring {product_name(product)} " +
+                        f"from {origin} to {destination}")
             pre_origin = (self.x, self.y)
             self._assign_action("go", origin)
             self._assign_action("pick", origin, product)
@@ -197,7 +281,27 @@ class Robot:
         self.destination = destination
 
 
-    def _assign_action(self, action:str, target:Coords, product:str=Product) -> None:
+    @property
+    def pending_actions(self) -> List[RobotAction]:
+        """A copy of the actions in the queue that are still to be taken (in order)."""
+        return self.action_queue[self._action_pos:]
+
+    @pending_actions.setter
+    def pending_actions(self, actions:List[RobotAction]) -> None:
+        self.action_queue = list(actions)
+        self._action_pos = 0
+
+    def _next_action(self) -> RobotAction:
+        """Take the next action from the queue."""
+        action = self.action_queue[self._action_pos]
+        self._action_pos += 1
+        if self._action_pos == len(self.action_queue):  # Drained: start over with a clean list
+            self.action_queue.clear()
+            self._action_pos = 0
+        return action
+
+
+    def _assign_action(self, action:str, target:Coords, product:Optional[Product]=None) -> None:
         """Add an action to the queue of actions."""
         if action not in ["go", "pick", "drop"]:
             raise ValueError(f"Unknown action: {action}. Supported: 'go', 'pick', 'drop'.")
@@ -3,30 +3,45 @@
 import logging
 logger = logging.getLogger(__name__)
 
+import heapq
 import numpy as np
-import random
-from typing import List, Tuple, Optional, Set
+from typing import Dict, List, Tuple, Optional, Sequence, Union
 
 from robowh.universe import Universe
-from robowh.utils import grid_codes
+from robowh.utils import grid_codes, IndexedSet, manhattan_distances
 from robowh.custom_types import Product, Coords, Optional
+from robowh.products import product_name
+
+
+class ShelvesFullError(ValueError):
+    """There's no free (empty and unlocked) slot left on these shelves."""
 
 
 class Shelves():
 
-    def __init__(self, name=None, deep=False) -> None:
+    def __init__(self, universe:Universe, name=None, deep=False) -> None:
         logger.info("Shelves object created")
         self.name:Optional[str] = name
         self.deep:bool = deep  # Deep shelves store more than one item in a cell
 
         self.n_items:int = 0
-        self.records:dict[Product,int] = {}  # To search shelves by product
-        self.coords:List[Optional[Coords]] = []  # Coordinates of every shelf
+        # Per product (indexed by product id, and grown as needed): the shelf it is stored at
+        # (or -1), and whether it was promised for picking
+        self.records:np.ndarray = np.full(1024, -1, dtype=np.int32)
+        self.locked_products:np.ndarray = np.zeros(1024, dtype=bool)
+        self.coords:List[Coords] = []  # Coordinates of every shelf
         self.inventory:List[List[Product]] = []  # What is stored in every shelf
         self.locked_indices:list[bool] = []  # Cells are booked for r/w to avoid conflicts
-        self.locked_products:Set[Product] = set({})  # Products that were promised for picking
+        self.available_products:IndexedSet[Product] = IndexedSet()  # Stored, and not locked
+        # Free slots (empty and unlocked), as a heap of (priority, index). The heap is lazy:
+        # slots that got taken are only dropped once they reach the top.
+        self.priorities:List[float] = []  # Lower is better. By default, the creation order
+        self._free_slots:List[Tuple[float,int]] = []
+        self._in_heap:List[bool] = []
 
-        self.universe:Universe = Universe.get_universe()
+        self.universe:Universe = universe
+        # Index of the shelf at every pixel of the grid (or -1), to find shelves by coordinates
+        self.index_map:np.ndarray = np.full(self.universe.grid.shape, -1, dtype=np.int32)
 
     def add_shelf(self, point: Coords, empty=False) -> None:
         """Create a shelf at given coordinates.
@@ -43,17 +58,111 @@ class Shelves():
         self.coords.append(point)
         cell_id = len(self.coords)-1
         # Create  shelf
-        self.universe.grid[x, y] = grid_codes['shelf']
+        self._paint(x, y, grid_codes['shelf'])
+        self.index_map[x, y] = cell_id
+        self.universe.layout_version += 1  # Invalidates cached paths
         self.inventory.append([])
         self.locked_indices.append(False)
-        if not empty and np.random.uniform() > 0.5:
-            item_code = self.universe.new_code()
-            self.place_at(cell_id, item_code)
+        self.priorities.append(cell_id)
+        self._in_heap.append(False)
+        self._offer_slot(cell_id)
+        if not empty and self.universe.rng.random() > 0.5:
+            self.place_at(cell_id, self.universe.products.new())
+
+
+    def add_shelves(self, points:np.ndarray, fill:float=0.0) -> None:
+        """Create many shelves at once, in this order, as `add_shelf` would one by one.
+
+        Shelves are filled with new products at random, with probability `fill`, in one draw
+        (not the same draws as `add_shelf` makes, so seeded layouts differ). Points that are
+        occupied, or repeated, are skipped.
+        """
+        universe = self.universe
+        points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+        cells = points[:, 0]*universe.grid.shape[1] + points[:, 1]
+        _, first = np.unique(cells, return_index=True)
+        valid = np.zeros(len(cells), dtype=bool)
+        valid[first] = True
+        valid &= universe.grid.ravel()[cells] == grid_codes['empty']
+        if not valid.all():
+            logger.error(f"Cannot create {int((~valid).sum())} shelves: points are occupied!")
+            points, cells = points[valid], cells[valid]
+        n, start = len(points), len(self.coords)
+        logger.debug(f"Creating {n} shelves on {self.name}")
+        if n == 0:
+            return
+
+        indices = np.arange(start, start + n)
+        self.coords.extend(map(tuple, points.tolist()))
+        self.index_map.ravel()[cells] = indices
+        for layer in (universe.layout, universe.grid):
+            layer.ravel()[cells] = grid_codes['shelf']
+        universe.free_cells.occupy_many(cells)
+        universe.layout_version += 1  # Invalidates cached paths
+        self.inventory.extend([[] for _ in range(n)])
+        self.locked_indices.extend([False]*n)
+        self.priorities.extend(range(start, start + n))
+
+        filled = np.zeros(n, dtype=bool)
+        if fill > 0:
+            generator = np.random.default_rng(universe.rng.getrandbits(64))
+            filled = generator.random(n) < fill
+            products = universe.products.new_many(int(filled.sum()))
+            owners = indices[filled].tolist()
+            for index, product in zip(owners, products):
+                self.inventory[index].append(product)
+            self.available_products.update(products)
+            self._make_room(max(products, default=0))
+            self.records[products] = owners
+            self.n_items += len(products)
+            for layer in (universe.layout, universe.grid):
+                layer.ravel()[cells[filled]] = grid_codes['item']
+            logger.info(f"{len(products)} products are placed on {self.name}")
+
+        # Empty slots all go on the heap of free slots at once (new slots are prioritized by index)
+        self._in_heap.extend((~filled).tolist())
+        self._free_slots.extend((i, i) for i in indices[~filled].tolist())
+        heapq.heapify(self._free_slots)
+
+
+    def index_of(self, product:Product) -> Optional[int]:
+        """Index of the shelf where this product is stored, or None if it's not here."""
+        if 0 <= product < len(self.records):
+            index = int(self.records[product])
+            if index >= 0:
+                return index
+        return None
+
+    def _make_room(self, product:Product) -> None:
+        """Grow per-product arrays (doubling them, as for lists) to fit this product id."""
+        if product >= len(self.records):
+            size = max(product + 1, 2*len(self.records))
+            records = np.full(size, -1, dtype=np.int32)
+            records[:len(self.records)] = self.records
+            locked = np.zeros(size, dtype=bool)
+            locked[:len(self.locked_products)] = self.locked_products
+            self.records, self.locked_products = records, locked
+
+
+    def index_at(self, x:int, y:int) -> Optional[int]:
+        """Index of the shelf at these coordinates, or None if there's no shelf there."""
+        if 0 <= x < self.index_map.shape[0] and 0 <= y < self.index_map.shape[1]:
+            index = int(self.index_map[x, y])
+            if index >= 0:
+                return index
+        return None
+
+
+    def _paint(self, x:int, y:int, code:int) -> None:
+        """Mark a shelf pixel on the static layout layer, and on the combined grid."""
+        self.universe.layout[x, y] = code
+        self.universe.grid[x, y] = code
+        self.universe.free_cells.occupy(x, y)
 
 
     def place_at(self, index:int, product:Product) -> None:
         """Place item (hash) product at index index."""
-        logger.info(f"Product {product} is placed at index {index} on {self.name}")
+        logger.info(f"Product {product_name(product)} is placed at index {index} on {self.name}")
         # Check if the shelf exists
         if index >= len(self.coords):
             raise ValueError(f"Requested index {index} is out of bounds ({len(self.coords)}) " +
@@ -63,12 +172,13 @@ class Shelves():
         if (not self.deep) and (self.inventory[index]):
             cell_content = self.inventory[index]
             raise ValueError(f"Index {index} at shelves {self.name} is already taken " +
-                             f"by product {cell_content}")
+                             f"by product {product_name(cell_content[0])}")
 
         # Check if product is unique
         # TODO: There are obviously better ways to handle that, but for now let's just fail
-        if product in self.records:
-            raise ValueError(f"Product {product} is already present in shelves {self.name}")
+        if self.index_of(product) is not None:
+            raise ValueError(f"Product {product_name(product)} is already present in shelves " +
+                             f"{self.name}")
 
         # Check if grid is in an illegal state (strictly speaking grid's problem, but let's check)
         x,y = self.coords[index]
@@ -76,22 +186,25 @@ class Shelves():
             raise ValueError(f"Even though pos {index} at shelf {self.name} is empty, " +
                              f"it's marked as occupied on the map.")
 
-        self.inventory[index].append(product)  # We always store lists of strings, not bare strings
+        self.inventory[index].append(product)  # We always store lists of products, even of one
         self.n_items += 1
+        self._make_room(product)
         self.records[product] = index
-        self.universe.grid[x,y] = grid_codes['item']
+        self.available_products.add(product)
+        self._paint(x, y, grid_codes['item'])
         self.unlock(index)
 
 
     def remove(self, index:int, product:Product) -> None:
-        """Place item (hash) product at index index."""
-        logger.info(f"Remove {product} from shelf {self.name} pos {index}")
+        """Remove product from the shelf at index index."""
+        logger.info(f"Remove {product_name(product)} from shelf {self.name} pos {index}")
         if index >= len(self.coords):
             raise ValueError(f"Index {index} out of bounds ({len(self.coords)}) for {self.name}")
         if not self.inventory[index]:  # Empty list
-            raise ValueError(f"Can't clear {product} from {self.name} #{index}: it's empty.")
+            raise ValueError(f"Can't clear {product_name(product)} from {self.name} #{index}: " +
+                             "it's empty.")
         if product not in self.inventory[index]:
-            raise ValueError(f"Can't find {product} in {index} of {self.name}")
+            raise ValueError(f"Can't find {product_name(product)} in {index} of {self.name}")
 
         x,y = self.coords[index]
         if self.universe.grid[x,y] != grid_codes['item']:
@@ -100,54 +213,122 @@ class Shelves():
 
         self.inventory[index].remove(product)
         self.n_items -= 1
-        del self.records[product]
+        self.records[product] = -1
+        self.available_products.discard(product)
         if not self.inventory[index]:  # The shelf is empty now
-            self.universe.grid[x,y] = grid_codes['shelf']
+            self._paint(x, y, grid_codes['shelf'])
         self.unlock(index, product)
 
     def request_optimal_placement(self) -> int:
-        """Find the closest empty number and store there."""
+        """Find the best free (empty and unlocked) slot, without taking it yet."""
         logger.debug(f"Requesting optimal location at shelves {self.name}")
-        try:
-            # Find the first UNLOCKED position with an empty list in it.
-            # As two simple python lists are involved, it's not a very effective operation.
-            # The awkward construction below helps somewhat, but it looks too complex.
-            index = next(
-                (
-                    i
-                    for i, (inv, lck)
-                    in enumerate(zip(self.inventory, self.locked_indices))
-                    if not inv and not lck
-                ),
-                None
-            )
-            # We're assuming here that shelves are created in a correct order, starting from
-            # loading bays and going away from them. Could be a differet logic of course.
-        except ValueError:
-            raise ValueError(f"The shelf {self.name} is full, cannot find an empty slot")
-        return index
-
-    def pick_random_product_for_delivery(self) -> str:
+        while self._free_slots:
+            _, index = self._free_slots[0]
+            if self._is_free(index):
+                return index
+            heapq.heappop(self._free_slots)  # Was taken since it was offered
+            self._in_heap[index] = False
+        raise ShelvesFullError(f"The shelf {self.name} is full, cannot find an empty slot")
+
+    def set_placement_priorities(self, priorities:Union[Sequence[float], np.ndarray]) -> None:
+        """Set preferences for where new items are placed (lower is better), one per slot."""
+        if len(priorities) != len(self.coords):
+            raise ValueError(f"Need {len(self.coords)} priorities for {self.name}, " +
+                             f"got {len(priorities)}")
+        self.priorities = np.asarray(priorities, dtype=float).tolist()
+        self._in_heap = [not items and not locked
+                         for items, locked in zip(self.inventory, self.locked_indices)]
+        self._free_slots = [(self.priorities[i], i) for i, f in enumerate(self._in_heap) if f]
+        heapq.heapify(self._free_slots)
+
+    def prioritize_by_distance(self, targets:Sequence[Coords]) -> None:
+        """Prefer slots that are closer (in Manhattan distance) to any of the targets."""
+        if not self.coords or not len(targets):
+            return
+        field = manhattan_distances(self.index_map.shape, np.array(targets).reshape(-1, 2))
+        cells = np.flatnonzero(self.index_map.ravel() >= 0)
+        distances = np.zeros(len(self.coords))
+        distances[self.index_map.ravel()[cells]] = field.ravel()[cells]
+        self.set_placement_priorities(distances)
+
+    def _is_free(self, index:int) -> bool:
+        return not self.inventory[index] and not self.locked_indices[index]
+
+    def _offer_slot(self, index:int) -> None:
+        """Put a slot on the heap of free slots, if it is free (and isn't there yet)."""
+        if not self._in_heap[index] and self._is_free(index):
+            heapq.heappush(self._free_slots, (self.priorities[index], index))
+            self._in_heap[index] = True
+
+    def pick_random_product_for_delivery(self) -> Optional[Product]:
         """IRL it would not be a good method, but for us it's a substitute for realistic orders."""
-        products = [p for pl in self.inventory for p in pl if p not in self.locked_products]
-        if not products:
+        if not self.available_products:
             logger.info(f"Requesting a random object off empty {self.name}.")
             return None
-        return random.choice(products)
+        return self.available_products.choice(self.universe.rng)
 
     def lock(self, index:int, product:Optional[Product]=None) -> None:
         """Lock a cell (index) and (optionally) a product for task creation."""
         logger.debug(f"Locking cell {self.name} pos {index}")
         self.locked_indices[index] = True
         if product is not None:
-            self.locked_products.add(product)
+            self._make_room(product)
+            self.locked_products[product] = True
+            self.available_products.discard(product)
 
     def unlock(self, index:int, product:Optional[Product]=None) -> None:
         """Unlock a cell (index) for operations."""
         logger.debug(f"Unlocking cell {self.name} pos {index}")
         self.locked_indices[index] = False
+        self._offer_slot(index)
         if product is not None:
-            if product in self.locked_products:
-                self.locked_products.remove(product)
+            if product < len(self.locked_products) and self.locked_products[product]:
+                self.locked_products[product] = False
+                if self.records[product] >= 0:  # Still stored here, so it can be picked again
+                    self.available_products.add(product)
             else:
-                logger.debug("Requested to unlock {product} from {self.name}, but it's not locked.")
\ No newline at end of file
+                logger.debug(f"Requested to unlock {product_name(product)} from {self.name}, " +
+                             "but it's not locked.")
+
+    def checkpoint(self) -> Dict[str, np.ndarray]:
+        """Everything about these shelves as arrays (see `robowh.checkpoint`).
+
+        Orders matter, as random picks and ties between free slots depend on them.
+        """
+        return {
+            "coords": np.array(self.coords, dtype=np.int32).reshape(-1, 2),
+            "counts": np.array([len(items) for items in self.inventory], dtype=np.int32),
+            "items": np.array([p for items in self.inventory for p in items], dtype=np.int64),
+            "locked_indices": np.array(self.locked_indices, dtype=bool),
+            "locked_products": np.flatnonzero(self.locked_products),
+            "available_products": np.array(list(self.available_products), dtype=np.int64),
+            "priorities": np.array(self.priorities, dtype=np.float64),
+            "free_slot_priorities": np.array([p for p, _ in self._free_slots], dtype=np.float64),
+            "free_slot_indices": np.array([i for _, i in self._free_slots], dtype=np.int64),
+            "in_heap": np.array(self._in_heap, dtype=bool),
+            }
+
+    def restore(self, state:Dict[str, np.ndarray]) -> None:
+        """Take the state from `checkpoint()`. The grid is restored by the universe."""
+        self.coords = list(map(tuple, state["coords"].tolist()))
+        items = state["items"].tolist()
+        owners = np.repeat(np.arange(len(self.coords)), state["counts"]).tolist()
+        self.inventory = [[] for _ in self.coords]
+        for item, owner in zip(items, owners):
+            self.inventory[owner].append(item)
+        self.n_items = len(items)
+        self.records = np.full(len(self.records), -1, dtype=np.int32)
+        self.locked_products = np.zeros(len(self.records), dtype=bool)
+        self._make_room(max(items + state["locked_products"].tolist(), default=0))
+        self.records[items] = owners
+        self.locked_products[state["locked_products"]] = True
+        self.locked_indices = state["locked_indices"].tolist()
+        self.available_products = IndexedSet(state["available_products"].tolist())
+        self.priorities = state["priorities"].tolist()
+        self._free_slots = list(zip(
+            state["free_slot_priorities"].tolist(), state["free_slot_indices"].tolist()
+            ))
+        self._in_heap = state["in_heap"].tolist()
+        self.index_map.fill(-1)
+        coords = state["coords"]
+        self.index_map[coords[:, 0], coords[:, 1]] = np.arange(len(coords))
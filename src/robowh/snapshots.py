@@ -0,0 +1,125 @@
+"""Immutable snapshots of the grid, for readers that shouldn't wait for the universe lock.
+
+The grid changes all the time during a tick, so reading it from another thread (the viewer)
+may give a picture with half of the robots moved. Instead, at the end of every tick the
+universe copies the grid into one of two preallocated buffers, and publishes it as the latest
+snapshot. Readers only ever look at published snapshots, and never take the lock. Copies cost
+time on large grids, so universes only publish once asked to (by `publish_snapshots()`, which
+the viewer calls).
+
+With two buffers, a snapshot stays intact until the next-but-one publication. Readers that
+take long (longer than a tick) can check `Snapshot.is_valid()` after they are done, and
+try again if their buffer got reused in the meantime.
+
+We also remember what changed between recent snapshots (flat indices of changed pixels, and
+their new codes), so that clients that already have a recent frame only need the changes.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import numpy as np
+import threading
+from typing import List, NamedTuple, Optional, Tuple
+
+
+class Snapshot:
+    """A read-only picture of the grid, as of the end of a tick."""
+    __slots__ = ("version", "tick", "grid", "_buffer", "_slot")
+
+    def __init__(self, version:int, tick:int, grid:np.ndarray, buffer:"SnapshotBuffer", slot:int):
+        self.version:int = version  # Grows with every publication
+        self.tick:int = tick
+        self.grid:np.ndarray = grid  # uint8 grid codes, not writeable
+        self._buffer = buffer
+        self._slot = slot
+
+    def is_valid(self) -> bool:
+        """Whether the buffer still holds this snapshot (wasn't reused for a newer one)."""
+        return self._buffer._versions[self._slot] == self.version
+
+
+class Delta(NamedTuple):
+    """Changes from one snapshot to the next."""
+    from_tick:int
+    to_tick:int
+    indices:np.ndarray  # Flat indices of changed pixels, uint32
+    codes:np.ndarray  # Their new codes, uint8
+
+
+class SnapshotBuffer:
+    """Two buffers: one holds the latest snapshot, the other one is being written."""
+
+    def __init__(self, shape:Tuple[int, int], history:int=64):
+        self._buffers:List[np.ndarray] = [np.zeros(shape, dtype=np.uint8) for _ in range(2)]
+        self._versions:List[int] = [-1, -1]  # Which snapshot every buffer holds (-1 if none)
+        self._next_slot:int = 0
+        self._latest:Optional[Snapshot] = None
+        self.version:int = 0
+        # Recent deltas, oldest first. It's a tuple that is replaced (never changed) on every
+        # publication, so readers can use it without locks as well.
+        self.history:int = history
+        self._deltas:Tuple[Delta, ...] = ()
+        self._published = threading.Condition()  # For readers that wait for the next snapshot
+
+    def publish(self, grid:np.ndarray, tick:int) -> Snapshot:
+        """Copy the grid into the spare buffer, and make it the latest snapshot."""
+        slot = self._next_slot
+        buffer = self._buffers[slot]
+        if buffer.shape != grid.shape:  # Tests like to swap grids
+            buffer = self._buffers[slot] = np.zeros(grid.shape, dtype=np.uint8)
+        self._versions[slot] = -1  # Readers of the old snapshot in this buffer should retry
+        buffer.flags.writeable = True
+        np.copyto(buffer, grid, casting='unsafe')  # Grid codes are small
+        buffer.flags.writeable = False
+        self.version += 1
+        self._versions[slot] = self.version
+
+        previous = self._latest  # Still intact, in the other buffer
+        if previous is not None and previous.grid.shape == buffer.shape:
+            changed = np.flatnonzero(buffer != previous.grid).astype(np.uint32)
+            delta = Delta(previous.tick, tick, changed, buffer.ravel()[changed])
+            self._deltas = self._deltas[-(self.history-1):] + (delta,)
+        else:
+            self._deltas = ()
+
+        snapshot = Snapshot(self.version, tick, buffer, self, slot)
+        self._latest = snapshot  # Replacing a reference is atomic, so no lock needed
+        self._next_slot = 1 - slot
+        with self._published:
+            self._published.notify_all()
+        return snapshot
+
+    def latest(self) -> Optional[Snapshot]:
+        """The latest published snapshot (None before the first publication)."""
+        return self._latest
+
+    def wait_newer(self, version:int, timeout:Optional[float]=None) -> Optional[Snapshot]:
+        """Wait for a snapshot newer than this version (returns None on timeout)."""
+        def is_newer():
+            return self._latest is not None and self._latest.version > version
+        with self._published:
+            if not self._published.wait_for(is_newer, timeout):
+                return None
+        return self._latest
+
+    def changes_since(self, tick:int) -> Optional[Tuple[np.ndarray, np.ndarray, int]]:
+        """Pixels that changed after this tick: (flat indices, codes, tick of the result).
+
+        Returns None if the tick is too old (or unknown), and a full frame is needed.
+        """
+        deltas = self._deltas
+        latest = self._latest
+        if latest is not None and tick == latest.tick:
+            return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint8), tick
+        start = next((k for k, delta in enumerate(deltas) if delta.from_tick == tick), None)
+        if start is None:
+            return None
+        chain = deltas[start:]
+        if len(chain) == 1:
+            return chain[0].indices, chain[0].codes, chain[0].to_tick
+        # A pixel may have changed several times: only the last code matters
+        indices = np.concatenate([delta.indices for delta in chain])[::-1]
+        codes = np.concatenate([delta.codes for delta in chain])[::-1]
+        indices, last = np.unique(indices, return_index=True)
+        return indices, codes[last], chain[-1].to_tick
@@ -3,19 +3,25 @@
 import logging
 logger = logging.getLogger(__name__)
 
-import random
+import heapq
+import itertools
 from abc import ABC, abstractmethod
-from typing import List, Tuple
+from typing import Hashable, List, Tuple
 
+from robowh.custom_types import Coords
 from robowh.universe import Universe
 from robowh.utils import grid_codes
-from robowh import astar
+from robowh import astar, jps
+from robowh.flowfield import UNREACHABLE
 
 class StrategyLibary():
     """An instance of this class contains each strategy, as a class."""
     def __init__(self):
         _strategies = {
             'astar': AStarStrategy,
+            'flowfield': FlowFieldStrategy,
+            'cooperative': CooperativeAStarStrategy,
+            'jps': JPSStrategy,
             'random': RandomMovementStrategy
         }
         for name, strategy in _strategies.items():
@@ -23,32 +29,63 @@ class StrategyLibary():
 
 
 class MoveStrategy(ABC):
+    # If True, a robot that couldn't make a step drops the rest of its plan, and plans again.
+    # Otherwise it skips this step, and carries on with the next one.
+    replan_on_block:bool = False
+    # If True, robots using this strategy are planned ahead, all at once (see `planning.py`)
+    batch_planning:bool = False
+
     @classmethod
     @abstractmethod
-    def calculate_path(cls,
-        current_pos: Tuple[int, int], target_pos: Tuple[int, int], n_steps: int = 0
+    def calculate_path(cls, universe: Universe,
+        current_pos: Tuple[int, int], target_pos: Tuple[int, int], n_steps: int = 0,
+        agent: Hashable = None
         ) -> List[Tuple[int, int]]:
+        """Plan next moves in this universe.
+
+        `agent` identifies the robot, for strategies that need to know.
+        """
         pass
 
+    @classmethod
+    def calculate_paths(cls, universe:Universe, requests:List[Tuple[Coords, Coords, Hashable]],
+                        pool=None) -> List[List[Tuple[int, int]]]:
+        """Plan for several robots: (current_pos, target_pos, agent) each, in this order.
+
+        The results must be the same as from calling `calculate_path` for every request in
+        turn, with default settings. Strategies that can do better use the `pool`.
+        """
+        return [
+            cls.calculate_path(universe, current, target, agent=agent)
+            for current, target, agent in requests
+            ]
+
     def __init__(self):
         pass
 
 
 class RandomMovementStrategy(MoveStrategy):
     @classmethod
-    def calculate_path(cls, current_pos, target_pos, n_steps=1):
+    def calculate_path(cls, universe, current_pos, target_pos, n_steps=1, agent=None):
         # Random wiggling in place
+        rng = universe.rng
         plan = []
         for i in range(n_steps):
             # We have to use random, as numpy is confused by a list of tuples
-            random_movement = random.choice([(-1,0), (1,0), (0,-1), (0,1)])
+            random_movement = rng.choice([(-1,0), (1,0), (0,-1), (0,1)])
             plan.append(random_movement)
         return plan
 
 
 class AStarStrategy(MoveStrategy):
+    robots_are_obstacles:bool = True  # Plan around other robots, or only around the racks
+    use_cache:bool = True  # Reuse routes on the static layout, and only repair them near robots
+    batch_planning:bool = True
+    _find_path = staticmethod(astar.find_path)  # The search core, same signature as astar's
+
     @classmethod
-    def calculate_path(cls, current_pos, target_pos, n_steps=20, until_touch=True):
+    def calculate_path(cls, universe, current_pos, target_pos, n_steps=20, until_touch=True,
+                       agent=None):
         """Calculate a path from current to target, and return n_steps of it.
 
         Note that the default n_steps is set to 20, as our current implementation is that
@@ -59,28 +96,137 @@ class AStarStrategy(MoveStrategy):
         If `until_touch` is True, it's enough for the path to reach a pixel near the target pixel.
         It's true by default, so that robots could reach shelves and loading bays.
         """
-        universe = Universe.get_universe()
-        grid = universe.grid.copy()  # Get environment from singleton
+        grid = universe.planning_view(robots=cls.robots_are_obstacles)  # Read-only, no copy
 
-        # Input validation
+        if not cls._valid_request(grid, current_pos, target_pos):
+            return []
+
+        # Get path from A* core
+        if cls.use_cache and universe.path_cache is not None:
+            path = cls._cached_path(universe, current_pos, target_pos, n_steps, until_touch)
+        else:
+            path = cls._find_path(grid, current_pos, target_pos, until_touch)
+        return cls._to_moves(path, current_pos, target_pos, n_steps)
+
+    @classmethod
+    def calculate_paths(cls, universe, requests, pool=None, n_steps=20, until_touch=True):
+        """Plan for several robots at once, with the searches running in the pool.
+
+        Without the cache, every search is on the same grid, so they can all run in parallel.
+        With the cache, the expensive part is finding routes on the static layout, so we look
+        for all routes that the cache doesn't have yet in parallel, and then go through the
+        requests in order, as `calculate_path` would: a route from the pool is only added to the
+        cache if, at that point, the cache still doesn't have it. Some of these searches may end
+        up wasted (when an earlier route passes through our start), and routes that were cached
+        at the start may get evicted by earlier requests (then we search for them here, as
+        `calculate_path` would), but results are identical.
+        """
+        if pool is None:
+            return super().calculate_paths(universe, requests)
+        grid = universe.planning_view(robots=cls.robots_are_obstacles)
+        valid = [cls._valid_request(grid, current, target) for current, target, _ in requests]
+        todo = [(current, target) for (current, target, _), ok in zip(requests, valid) if ok]
+
+        if not (cls.use_cache and universe.path_cache is not None):
+            jobs = [(current, target, until_touch) for current, target in todo]
+            found = iter(pool.find_paths(cls._find_path, grid, jobs))
+            return [
+                cls._to_moves(next(found), current, target, n_steps) if ok else []
+                for (current, target, _), ok in zip(requests, valid)
+                ]
+
+        cache, version = universe.path_cache, universe.layout_version
+        missing = list(dict.fromkeys(
+            (current, target) for current, target in todo
+            if not cache.has(current, target, version, tag=until_touch)
+            ))
+        layout = universe.planning_view(robots=False)
+        found = dict(zip(missing, pool.find_paths(
+            cls._find_path, layout, [(current, target, until_touch) for current, target in missing]
+            )))
+        plans = []
+        for (current, target, agent), ok in zip(requests, valid):
+            if not ok:
+                plans.append([])
+                continue
+            if not cache.has(current, target, version, tag=until_touch):
+                if (current, target) in found:
+                    path = tuple(found[(current, target)])
+                else:  # It was cached when we started, but got pushed out of the cache since
+                    path = tuple(cls._find_path(layout, current, target, until_touch))
+                cache.put(current, target, path, version, tag=until_touch)
+            plans.append(cls.calculate_path(universe, current, target, n_steps, until_touch, agent))
+        return plans
+
+    @classmethod
+    def _valid_request(cls, grid, current_pos, target_pos):
         if not cls._valid_pos(grid, current_pos):
             logger.warning(f"Current position {current_pos} is not valid for Astar!!")
-            return []
+            return False
         if not cls._valid_pos(grid, target_pos):
             logger.warning(f"Target position {target_pos} is not valid for Astar!")
-            return []
+            return False
+        return True
 
-        # Get path from A* core
-        path = astar.find_path(grid, current_pos, target_pos, until_touch)
+    @classmethod
+    def _to_moves(cls, path, current_pos, target_pos, n_steps):
+        """Convert a path to movement deltas, and apply the step limit."""
         if len(path)==0: # Astar didn't find a path
             logger.warning(f"A-star could not find a path from {current_pos} to {target_pos}!")
-
-        # Convert to movement deltas
         deltas = cls._path_to_deltas(path)
-
-        # Apply step limit
         return deltas[:n_steps] if n_steps > 0 else deltas
 
+    @classmethod
+    def _cached_path(cls, universe, current_pos, target_pos, n_steps, until_touch):
+        """A route on the static layout (cached if possible), repaired around robots nearby.
+
+        On a miss we calculate the route on the static layout as well, so a cached route is as
+        long as a fresh one, but it may be a different route of that length (see `PathCache`).
+        """
+        cache = universe.path_cache
+        path = cache.get(current_pos, target_pos, universe.layout_version, tag=until_touch)
+        if path is None:
+            layout = universe.planning_view(robots=False)
+            path = tuple(cls._find_path(layout, current_pos, target_pos, until_touch))
+            cache.put(current_pos, target_pos, path, universe.layout_version, tag=until_touch)
+        if not cls.robots_are_obstacles or not path:
+            return list(path)
+
+        # Only the next n_steps matter: robots further away will have moved by then.
+        horizon = len(path) if n_steps <= 0 else min(len(path), n_steps+1)
+        occupancy = universe.occupancy
+        empty = grid_codes['empty']
+        blocked = next((i for i in range(1, horizon) if occupancy[path[i]] != empty), None)
+        if blocked is None:
+            return list(path)
+
+        # Make a detour that rejoins the route at the first free pixel after the robots
+        cache.repairs += 1
+        grid = universe.planning_view(robots=True)
+        rejoin = next(
+            (i for i in range(blocked+1, len(path)) if occupancy[path[i]] == empty), None
+            )
+        if rejoin is not None:
+            detour = cls._local_detour(grid, path[:rejoin+1])
+            if detour:
+                return detour + list(path[rejoin+1:])
+        # Robots block the route all the way to the end, so plan the whole thing around them
+        return cls._find_path(grid, current_pos, target_pos, until_touch)
+
+    @staticmethod
+    def _local_detour(grid, segment, margin=3):
+        """Path between the ends of a segment, searched only in a small box around it."""
+        ys = [p[0] for p in segment]
+        xs = [p[1] for p in segment]
+        y0, x0 = max(min(ys)-margin, 0), max(min(xs)-margin, 0)
+        y1, x1 = min(max(ys)+margin+1, grid.shape[0]), min(max(xs)+margin+1, grid.shape[1])
+        start, end = segment[0], segment[-1]
+        path = astar.find_path(
+            grid[y0:y1, x0:x1], (start[0]-y0, start[1]-x0), (end[0]-y0, end[1]-x0),
+            until_touch=False
+            )
+        return [(y+y0, x+x0) for y, x in path]
+
     @staticmethod
     def _path_to_deltas(path):
         return [
@@ -94,3 +240,189 @@ class AStarStrategy(MoveStrategy):
         # We accept all grid states as targets: even though we cannot travel inside a rack
         # or a robot, we may have to travel to it, and step one pixel early.
         return (0 <= y < grid.shape[0]) and (0 <= x < grid.shape[1])
+
+
+class JPSStrategy(AStarStrategy):
+    """A* with Jump Point Search: same paths (in length), but much fewer expanded nodes in
+    open areas, as symmetric paths are pruned. Caching and repairs work as for A*."""
+    _find_path = staticmethod(jps.find_path)
+
+
+class FlowFieldStrategy(MoveStrategy):
+    _moves = [(-1,0), (1,0), (0,-1), (0,1)]
+
+    @classmethod
+    def calculate_path(cls, universe, current_pos, target_pos, n_steps=3, until_touch=True,
+                       agent=None):
+        """Descend the distance field of the target, and return n_steps of it.
+
+        Fields are calculated once per target (with a BFS on the static layout), and are cached
+        by the universe. So all robots heading to the same bay share one calculation, and every
+        step after that is just a look at four neighbors. Robots are not part of the field, but
+        when choosing between equally good first steps, we prefer the one without a robot on it.
+
+        If `until_touch` is True, it's enough for the path to reach a pixel near the target pixel.
+        """
+        layout = universe.planning_view(robots=False)
+
+        # Input validation
+        if not AStarStrategy._valid_pos(layout, current_pos):
+            logger.warning(f"Current position {current_pos} is not valid for a flow field!")
+            return []
+        if not AStarStrategy._valid_pos(layout, target_pos):
+            logger.warning(f"Target position {target_pos} is not valid for a flow field!")
+            return []
+        if not until_touch and layout[target_pos] != grid_codes['empty']:
+            return []  # We can't step into a rack
+
+        field = universe.field_cache.get(layout, target_pos, universe.layout_version)
+        y, x = current_pos
+        distance = field[y, x]
+        if distance == UNREACHABLE:
+            logger.warning(f"Flow field to {target_pos} does not reach {current_pos}!")
+            return []
+
+        height, width = field.shape
+        stop = 1 if until_touch else 0
+        plan = []
+        while distance > stop and (n_steps <= 0 or len(plan) < n_steps):
+            options = [
+                (dy, dx) for dy, dx in cls._moves
+                if 0 <= y+dy < height and 0 <= x+dx < width and field[y+dy, x+dx] == distance-1
+                ]
+            if not plan:
+                options = cls._first_step(universe, field, (y, x), options)
+            dy, dx = options[0]
+            y, x = y+dy, x+dx
+            distance = field[y, x]
+            plan.append((dy, dx))
+        return plan
+
+    @classmethod
+    def _first_step(cls, universe, field, position, options):
+        """Prefer downhill steps that are free from robots, or else sidestep.
+
+        Unlike A*, the field doesn't know about robots, so two robots meeting head-on in an aisle
+        would wait for each other forever. If every downhill step is taken, we step aside
+        to a random free pixel that doesn't take us further than one extra move.
+        """
+        y, x = position
+        free = [m for m in options if universe.occupancy[y+m[0], x+m[1]] == grid_codes['empty']]
+        if free or not options:
+            return free or options
+        height, width = field.shape
+        distance = field[y, x]
+        sidesteps = [
+            (dy, dx) for dy, dx in cls._moves
+            if 0 <= y+dy < height and 0 <= x+dx < width
+            and distance <= field[y+dy, x+dx] <= distance+1
+            and universe.occupancy[y+dy, x+dx] == grid_codes['empty']
+            ]
+        return [universe.rng.choice(sidesteps)] if sidesteps else options
+
+
+class CooperativeAStarStrategy(MoveStrategy):
+    """Windowed cooperative A*: plan in space and time, around paths reserved by other robots.
+
+    Every robot plans `window` steps ahead in (x, y, t), where waiting in place is a move too,
+    and reserves the pixels of its plan in the universe reservation table. Robots that plan
+    later route around these reservations, so conflicts are avoided before they happen.
+    Beyond the window, the distance to the target is taken from the (static) flow field.
+    """
+    window:int = 8
+    replan_on_block:bool = True  # Our reservations are off once we are blocked
+    _moves = [(-1,0), (1,0), (0,-1), (0,1), (0,0)]
+
+    @classmethod
+    def calculate_path(cls, universe, current_pos, target_pos, n_steps=None, until_touch=True,
+                       agent=None):
+        """Plan (and reserve) the next `n_steps` moves; n_steps defaults to the window.
+
+        If `until_touch` is True, it's enough for the path to reach a pixel near the target pixel.
+        """
+        layout = universe.planning_view(robots=False)
+        window = n_steps or cls.window
+
+        # Input validation
+        if not AStarStrategy._valid_pos(layout, current_pos):
+            logger.warning(f"Current position {current_pos} is not valid for cooperative A*!")
+            return []
+        if not AStarStrategy._valid_pos(layout, target_pos):
+            logger.warning(f"Target position {target_pos} is not valid for cooperative A*!")
+            return []
+        if not until_touch and layout[target_pos] != grid_codes['empty']:
+            return []  # We can't step into a rack
+
+        field = universe.field_cache.get(layout, target_pos, universe.layout_version)
+        if field[current_pos] == UNREACHABLE:
+            logger.warning(f"Cooperative A*: {target_pos} can't be reached from {current_pos}!")
+            return []
+
+        table = universe.reservations
+        table.release(agent)
+        now = universe.n_ticks  # The first move is made during the current tick
+        path = cls._search(
+            universe, field, table, current_pos, 1 if until_touch else 0, window, now, agent
+            )
+
+        # Reserve where we are now, every step of the plan, and then the last pixel until
+        # the end of the window, as that's where we'll be waiting for our next turn.
+        positions = [current_pos]
+        for dy, dx in path:
+            positions.append((positions[-1][0]+dy, positions[-1][1]+dx))
+        positions += [positions[-1]] * (window - len(path))
+        table.reserve(agent, [(p, now-1+k) for k, p in enumerate(positions)])
+        return path
+
+    @classmethod
+    def _search(cls, universe, field, table, start, stop, window, now, agent):
+        """Space-time A* over `window` steps. Returns a list of moves (waits are (0,0))."""
+        height, width = field.shape
+        occupancy = universe.occupancy
+        empty = grid_codes['empty']
+
+        def is_free(point, tick):
+            """Can we be standing on this pixel at the end of this tick?"""
+            if field[point] == UNREACHABLE:  # A rack, or a pixel that can't reach the target
+                return False
+            if point != start and occupancy[point] != empty:
+                # Robots that have a plan will leave, but not before their turn on this tick.
+                # Robots without a plan (idle, or using other strategies) stay where they are.
+                here = table.owner(point, now-1)
+                if tick == now or here is None or here == agent:
+                    return False
+            # Robots act in random order within a tick, so we keep a one-tick margin: nobody else
+            # should be there just before us (they may not have left yet), or just after us
+            # (they may try to come in before we have left).
+            return not any(table.is_reserved(point, t, agent) for t in (tick-1, tick, tick+1))
+
+        counter = itertools.count()
+        h = int(field[start])
+        open_heap = [(h, h, next(counter), start, 0)]
+        parents = {(start, 0): None}
+        best = (start, 0)  # Fallback, if we can't make a single step
+
+        while open_heap:
+            _, h, _, point, k = heapq.heappop(open_heap)
+            if h <= stop or k == window:
+                best = (point, k)
+                break
+            for dy, dx in cls._moves:
+                y, x = point[0]+dy, point[1]+dx
+                if not (0 <= y < height and 0 <= x < width):
+                    continue
+                state = ((y, x), k+1)
+                if state in parents or not is_free((y, x), now+k):
+                    continue
+                parents[state] = (point, k)
+                h_next = int(field[y, x])
+                heapq.heappush(open_heap, (k+1 + h_next, h_next, next(counter), (y, x), k+1))
+
+        # Reconstruct the moves
+        path = []
+        state = best
+        while parents[state] is not None:
+            previous = parents[state]
+            path.append((state[0][0]-previous[0][0], state[0][1]-previous[0][1]))
+            state = previous
+        return path[::-1]
@@ -0,0 +1,98 @@
+"""Parameter sweeps: run many warehouse configurations in parallel, and collect one table of KPIs.
+
+Every configuration is an independent headless run (see `headless.py`), so they are spread over
+a pool of processes, one universe per run. Rows come back in the order of configurations, and
+seeded runs give the same numbers whatever the number of workers.
+
+    python -m robowh.sweep --strategy astar jps flowfield --robots 25 50 100 --seeds 3 \
+        --ticks 500 --csv results.csv
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import argparse
+import csv
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+from robowh.headless import run_headless
+
+# What goes into the table, after the settings of every run
+COLUMNS = ("n_tasks", "tasks_per_1k_ticks", "tasks_per_sec", "sh_blocked", "ticks_per_sec",
+           "tick_ms", "planning_ms")
+
+
+def configurations(**axes:Sequence) -> List[Dict[str, Any]]:
+    """All combinations of settings: `configurations(strategy=['astar', 'jps'], seed=[1, 2])`."""
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*axes.values())]
+
+
+def _run(n_ticks:int, settings:Dict[str, Any]) -> Dict[str, Any]:
+    """One row of the table (runs in a worker)."""
+    summary = run_headless(n_ticks, **settings)
+    summary["tasks_per_1k_ticks"] = 1000 * summary["n_tasks"] / max(summary["n_ticks"], 1)
+    return {**settings, **{column: summary.get(column) for column in COLUMNS}}
+
+
+def sweep(configs:Sequence[Dict[str, Any]], n_ticks:int, workers:Optional[int]=None
+          ) -> List[Dict[str, Any]]:
+    """Run every configuration for n_ticks, and return a row of KPIs for each, in order.
+
+    `workers` is the number of processes (None for one per core, 1 to run here, one by one).
+    """
+    logger.info(f"Sweeping {len(configs)} configurations, {n_ticks} ticks each")
+    if workers == 1:
+        return [_run(n_ticks, settings) for settings in configs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_run, [n_ticks] * len(configs), configs))
+
+
+def format_table(rows:Sequence[Dict[str, Any]]) -> str:
+    """Rows as a plain-text table, with aligned columns."""
+    if not rows:
+        return ""
+    columns = list(rows[0])
+    cells = [columns] + [
+        [f"{row[c]:.2f}" if isinstance(row[c], float) else str(row[c]) for c in columns]
+        for row in rows
+        ]
+    widths = [max(len(line[k]) for line in cells) for k in range(len(columns))]
+    return "\n".join(
+        "  ".join(cell.rjust(width) for cell, width in zip(line, widths)) for line in cells
+        )
+
+
+def write_csv(rows:Sequence[Dict[str, Any]], path:str) -> None:
+    with open(path, "w", newline="") as f:
+        if not rows:  # An empty file, as there are no columns to name either
+            return
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a grid of warehouse configurations.")
+    parser.add_argument("--strategy", nargs="+", default=["astar"], help="Strategies to compare")
+    parser.add_argument("--robots", nargs="+", type=int, default=[50], help="Numbers of robots")
+    parser.add_argument("--grid-size", nargs="+", type=int, default=[50], help="Warehouse sizes")
+    parser.add_argument("--rack-spacing", nargs="+", type=int, default=[7],
+                        help="Distances between racks")
+    parser.add_argument("--seeds", type=int, default=1, help="Runs per configuration (seeds 0..)")
+    parser.add_argument("--ticks", type=int, default=1000, help="Number of ticks per run")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of processes (default: one per core)")
+    parser.add_argument("--csv", default=None, help="Also save the table to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    rows = sweep(configurations(
+        strategy=args.strategy, n_robots=args.robots, grid_size=args.grid_size,
+        rack_spacing=args.rack_spacing, seed=range(args.seeds),
+        ), n_ticks=args.ticks, workers=args.workers)
+    print(format_table(rows))
+    if args.csv:
+        write_csv(rows, args.csv)
@@ -0,0 +1,278 @@
+"""Compact binary traces of a run, and replays that rebuild the grid at any tick.
+
+A trace is a directory with three files:
+- `meta.json`: the shape of the grid, names of robots, and the layouts of the records below.
+- `events.bin`: fixed-width event records (`EVENT_DTYPE`), in the order they happened. A robot
+  that moved or changed its state gets a "move" record with its new position and grid code,
+  picks and drops get records with the pixel of the shelf, its new code, and the product.
+- `keyframes.bin`: every `keyframe_every` ticks, the whole static layout and the positions of
+  all robots (`keyframe_dtype`), so that replays don't need to start from the beginning.
+
+The recorder is switched on by `Universe.record(path)`. Records are collected in a numpy
+buffer, and appended to the file in chunks. Replays memory-map the files, so even traces of
+many hours open instantly, and only the part between a keyframe and the requested tick is read.
+
+    python -m robowh.trace run.trace --tick 5000
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+import argparse
+import json
+import os
+import numpy as np
+from typing import Dict, Optional, Sequence
+
+from robowh.custom_types import Coords, Product
+from robowh.utils import grid_codes
+
+EVENTS = ("move", "pick", "drop")  # Stored as indices in this tuple
+_MOVE, _PICK, _DROP = range(len(EVENTS))
+
+EVENT_DTYPE = np.dtype([
+    ("tick", "<u4"),  # The tick during which it happened (`universe.n_ticks` at the time)
+    ("robot", "<i4"),  # Index of the robot in `universe.robots`
+    ("kind", "u1"),  # Index in EVENTS
+    ("code", "u1"),  # Grid code of the pixel after the event
+    ("x", "<u2"),
+    ("y", "<u2"),
+    ("product", "<i8"),  # Product id, or -1
+    ])
+
+
+def keyframe_dtype(shape:Sequence[int], n_robots:int) -> np.dtype:
+    """Layout of keyframes: the tick, the static layout, and (x, y, code) of every robot."""
+    return np.dtype([
+        ("tick", "<u4"),
+        ("layout", "u1", tuple(shape)),
+        ("robots", "<i4", (n_robots, 3)),
+        ])
+
+
+def product_id(product:Optional[Product]) -> int:
+    """Products are stored as their ids (see `robowh.products`), and no product as -1."""
+    return -1 if product is None else product
+
+
+class TraceRecorder:
+    """Collects events during the run, and writes them (and keyframes) to a trace directory.
+
+    Recording starts with a keyframe at the beginning of the next tick. Events are only
+    written when something changed: robots that wait, or stay blocked, leave no records.
+    """
+
+    def __init__(self, universe, path:str, keyframe_every:int=1000, chunk:int=65536):
+        if keyframe_every <= 0:
+            raise ValueError("Keyframes must be at least one tick apart")
+        self.universe = universe
+        self.path:str = path
+        self.keyframe_every:int = keyframe_every
+        self.started:bool = False
+        self.n_events:int = 0  # Written to the file so far
+        self._ids:Dict[str, int] = {robot.name: i for i, robot in enumerate(universe.robots)}
+        self._last = np.full((len(universe.robots), 3), -1, dtype=np.int32)  # Last (x, y, code)
+        self._buffer = np.zeros(chunk, dtype=EVENT_DTYPE)
+        self._n_buffered:int = 0
+        self._keyframe_dtype = keyframe_dtype(universe.grid.shape, len(universe.robots))
+
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({
+                "shape": list(universe.grid.shape),
+                "robots": list(self._ids),
+                "keyframe_every": keyframe_every,
+                "event_dtype": EVENT_DTYPE.descr,
+                }, f)
+        self._events = open(os.path.join(path, "events.bin"), "wb")
+        self._keyframes = open(os.path.join(path, "keyframes.bin"), "wb")
+
+    # Hooks, called by the universe at the start and at the end of every tick
+    def tick_started(self) -> None:
+        if not self.started:
+            logger.info(f"Recording a trace to {self.path}")
+            self._write_keyframe()
+            self.started = True
+
+    def tick_finished(self) -> None:
+        if self.universe.n_ticks % self.keyframe_every == 0:
+            self._write_keyframe()
+
+    def _write_keyframe(self) -> None:
+        universe = self.universe
+        for i, robot in enumerate(universe.robots):
+            self._last[i] = (robot.x, robot.y, universe.occupancy[robot.x, robot.y])
+        keyframe = np.zeros(1, dtype=self._keyframe_dtype)
+        keyframe["tick"] = universe.n_ticks
+        keyframe["layout"] = universe.layout
+        keyframe["robots"] = self._last
+        self.flush()  # Events before the keyframe go first, so the files are consistent
+        self._keyframes.write(keyframe.tobytes())
+        self._keyframes.flush()
+
+    # Events
+    def robot_event(self, robot) -> None:
+        """A robot moved, or changed its state (and so its code on the grid)."""
+        if not self.started:
+            return
+        i = self._ids[robot.name]
+        x, y = robot.x, robot.y
+        code = int(self.universe.occupancy[x, y])
+        if self._last[i].tolist() == [x, y, code]:
+            return
+        self._last[i] = (x, y, code)
+        self._append((self.universe.n_ticks, i, _MOVE, code, x, y, -1))
+
+    def fleet_event(self, robots:np.ndarray) -> None:
+        """Same as `robot_event`, for many robots of the fleet at once."""
+        if not self.started or len(robots) == 0:
+            return
+        fleet = self.universe.fleet
+        x, y = fleet.x[robots], fleet.y[robots]
+        new = np.stack([x, y, self.universe.occupancy[x, y]], axis=1)
+        changed = (self._last[robots] != new).any(axis=1)
+        robots, new = robots[changed], new[changed]
+        self._last[robots] = new
+        records = np.zeros(len(robots), dtype=EVENT_DTYPE)
+        records["tick"] = self.universe.n_ticks
+        records["robot"] = robots
+        records["kind"] = _MOVE
+        records["x"], records["y"], records["code"] = new[:, 0], new[:, 1], new[:, 2]
+        records["product"] = -1
+        self._extend(records)
+
+    def shelf_event(self, robot, kind:str, point:Coords, product:Product) -> None:
+        """A robot picked ("pick") or dropped ("drop") a product at the shelf at this point."""
+        if not self.started:
+            return
+        x, y = point
+        code = self.universe.layout[x, y]
+        self._append((self.universe.n_ticks, self._ids[robot.name], EVENTS.index(kind), code,
+                      x, y, product_id(product)))
+
+    def _append(self, record:tuple) -> None:
+        self._buffer[self._n_buffered] = record
+        self._n_buffered += 1
+        if self._n_buffered == len(self._buffer):
+            self.flush()
+
+    def _extend(self, records:np.ndarray) -> None:
+        if self._n_buffered + len(records) > len(self._buffer):
+            self.flush()
+        if len(records) > len(self._buffer):  # Too many for the buffer anyway
+            self._events.write(records.tobytes())
+            self.n_events += len(records)
+            return
+        self._buffer[self._n_buffered:self._n_buffered+len(records)] = records
+        self._n_buffered += len(records)
+
+    def flush(self) -> None:
+        """Write buffered events to the file."""
+        if self._n_buffered:
+            self._events.write(self._buffer[:self._n_buffered].tobytes())
+            self.n_events += self._n_buffered
+            self._n_buffered = 0
+        self._events.flush()
+
+    def close(self) -> None:
+        self.flush()
+        self._events.close()
+        self._keyframes.close()
+        logger.info(f"Trace saved to {self.path}: {self.n_events} events")
+
+
+def _memmap(filename:str, dtype:np.dtype) -> np.ndarray:
+    """Map a file of records (read-only). Incomplete records at the end are ignored."""
+    n = os.path.getsize(filename) // dtype.itemsize
+    if n == 0:  # Can't map empty files
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(filename, dtype=dtype, mode="r", shape=(n,))
+
+
+class TraceReplay:
+    """A recorded trace, to look at the warehouse at any recorded tick, without simulating it."""
+
+    def __init__(self, path:str):
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta:Dict = json.load(f)
+        self.shape = tuple(self.meta["shape"])
+        self.robot_names = self.meta["robots"]
+        self.events = _memmap(os.path.join(path, "events.bin"), EVENT_DTYPE)
+        self.keyframes = _memmap(os.path.join(path, "keyframes.bin"),
+                                 keyframe_dtype(self.shape, len(self.robot_names)))
+        if len(self.keyframes) == 0:
+            raise ValueError(f"Trace {path} is empty (recording never started)")
+        self._keyframe_ticks = np.asarray(self.keyframes["tick"])
+
+    @property
+    def first_tick(self) -> int:
+        return int(self._keyframe_ticks[0])
+
+    @property
+    def last_tick(self) -> int:
+        """The last tick that can be replayed (the trace may have been cut short in the middle
+        of the run, and then it ends with the last recorded event)."""
+        last = int(self._keyframe_ticks[-1])
+        if len(self.events):
+            last = max(last, int(self.events[-1]["tick"]) + 1)
+        return last
+
+    def _state_at(self, tick:int):
+        """Layout, and (x, y, code) of robots, as they were at the start of this tick."""
+        if not self.first_tick <= tick <= self.last_tick:
+            raise ValueError(f"Tick {tick} is not in the trace "
+                             f"({self.first_tick}-{self.last_tick})")
+        k = int(np.searchsorted(self._keyframe_ticks, tick, side="right")) - 1
+        keyframe = self.keyframes[k]
+        layout = np.array(keyframe["layout"])
+        robots = np.array(keyframe["robots"])
+        ticks = self.events["tick"]
+        start = int(np.searchsorted(ticks, keyframe["tick"], side="left"))
+        stop = int(np.searchsorted(ticks, tick, side="left"))
+        events = np.array(self.events[start:stop])
+
+        # Only the last event of every robot (and of every shelf pixel) matters
+        moves = events[events["kind"] == _MOVE][::-1]
+        _, last = np.unique(moves["robot"], return_index=True)
+        moves = moves[last]
+        robots[moves["robot"]] = np.stack([moves["x"], moves["y"], moves["code"]], axis=1)
+        shelves = events[events["kind"] != _MOVE][::-1]
+        cells = shelves["x"].astype(np.int64)*self.shape[1] + shelves["y"]
+        cells, last = np.unique(cells, return_index=True)
+        layout.ravel()[cells] = shelves["code"][last]
+        return layout, robots
+
+    def grid_at(self, tick:int) -> np.ndarray:
+        """The grid (uint8 grid codes), as it was at the start of this tick."""
+        grid, robots = self._state_at(tick)
+        placed = robots[:, 0] >= 0
+        grid[robots[placed, 0], robots[placed, 1]] = robots[placed, 2]
+        return grid
+
+    def robots_at(self, tick:int) -> np.ndarray:
+        """(x, y, grid code) of every robot at the start of this tick."""
+        return self._state_at(tick)[1]
+
+    def events_between(self, start:int, stop:int) -> np.ndarray:
+        """Event records of ticks from `start` up to (not including) `stop`."""
+        ticks = self.events["tick"]
+        return self.events[np.searchsorted(ticks, start):np.searchsorted(ticks, stop)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize a recorded trace.")
+    parser.add_argument("path", help="Trace directory")
+    parser.add_argument("--tick", type=int, default=None, help="Also count robots at this tick")
+    args = parser.parse_args()
+
+    replay = TraceReplay(args.path)
+    print(f"ticks: {replay.first_tick}-{replay.last_tick}")
+    print(f"robots: {len(replay.robot_names)}, grid: {replay.shape}")
+    kinds = np.bincount(replay.events["kind"], minlength=len(EVENTS))
+    for name, count in zip(EVENTS, kinds):
+        print(f"{name} events: {count}")
+    if args.tick is not None:
+        grid = replay.grid_at(args.tick)
+        print(f"at tick {args.tick}: " + ", ".join(
+            f"{name} {int((grid == code).sum())}" for name, code in grid_codes.items()
+            ))
@@ -7,25 +7,23 @@ import numpy as np
 import random
 import time
 import threading
-from typing import Tuple
-import uuid
+from typing import TYPE_CHECKING, Callable, Optional, Tuple
 
-from robowh.utils import grid_codes
+from robowh.utils import grid_codes, FreeCells
+from robowh.products import ProductRegistry
 
-class Universe:
-    """A singleton Universe object."""
-    _instance = None
+if TYPE_CHECKING:
+    from robowh.profiling import ProfileCapture
+    from robowh.trace import TraceRecorder
 
-    def __new__(cls, *args, **kwargs):
-        """CLassic singleton pattern."""
-        if cls._instance is None:
-            cls._instance = super(Universe, cls).__new__(cls)
-            cls._instance._init()
-        return cls._instance
+class Universe:
+    """The warehouse: its layout, robots, and the clock.
 
-    @classmethod
-    def get_universe(cls):
-        return cls._instance or cls()
+    Universes are ordinary objects: create as many as needed (say, to compare strategies in one
+    process), and pass them around. Everything that lives in a universe (robots, shelves,
+    the orchestrator) gets it explicitly. Settings default to the class attributes below,
+    and can be changed for one universe by keyword arguments, like `Universe(n_robots=200)`.
+    """
 
     # TODO: Move these constants to some config file
     MAX_UPDATE_TIME = 0.1  # 10 ms
@@ -33,10 +31,118 @@ class Universe:
     N_ROBOTS = 50
     RACK_SPACING = 7
     BAY_SPACING = 5
+    STRATEGY = 'astar'  # Name of the path planning strategy in the StrategyLibary
+    SEED:Optional[int] = None  # Set to an int for reproducible runs
+    ROBOTS_PER_TICK:Optional[int] = None  # Logical compute budget for headless runs
+    FLEET:bool = False  # Keep robots in numpy arrays, and move them in bulk (for large fleets)
+    PLANNING_WORKERS:Optional[int] = None  # Plan paths ahead in a pool of processes (None: don't)
+
+    capture:Optional["ProfileCapture"]  # A running profiling capture, if any
+    recorder:Optional["TraceRecorder"]  # Set while a trace is being recorded
+    publishing:bool  # Whether snapshots are published (see `publish_snapshots()`)
+
+    def __init__(self, grid_size:Optional[int]=None, n_robots:Optional[int]=None,
+                 rack_spacing:Optional[int]=None, bay_spacing:Optional[int]=None,
+                 strategy:Optional[str]=None, seed:Optional[int]=None,
+                 robots_per_tick:Optional[int]=None, fleet:Optional[bool]=None,
+                 planning_workers:Optional[int]=None, max_update_time:Optional[float]=None):
+        """Create a universe. Settings that are not given (None) keep their class defaults."""
+        settings = {
+            'GRID_SIZE': grid_size, 'N_ROBOTS': n_robots, 'RACK_SPACING': rack_spacing,
+            'BAY_SPACING': bay_spacing, 'STRATEGY': strategy, 'SEED': seed,
+            'ROBOTS_PER_TICK': robots_per_tick, 'FLEET': fleet,
+            'PLANNING_WORKERS': planning_workers, 'MAX_UPDATE_TIME': max_update_time,
+            }
+        for name, value in settings.items():
+            if value is not None:
+                setattr(self, name, value)
+        self._init()
+
+    def close(self) -> None:
+        """Release resources that outlive the universe (worker processes, open traces)."""
+        if self.planner is not None:
+            self.planner.close()
+        self.stop_recording()
+
+    def record(self, path:str, keyframe_every:int=1000):
+        """Record a trace of the run into this directory, starting from the next tick.
+
+        Returns the `TraceRecorder`. Call `stop_recording()` (or `close()`) to finish the files.
+        """
+        from robowh.trace import TraceRecorder
+        with self.lock:
+            if self.recorder is not None:
+                raise ValueError(f"Already recording to {self.recorder.path}")
+            self.recorder = TraceRecorder(self, path, keyframe_every=keyframe_every)
+        return self.recorder
+
+    def stop_recording(self) -> None:
+        with self.lock:
+            recorder, self.recorder = self.recorder, None
+        if recorder is not None:
+            recorder.close()
+
+    def publish_snapshots(self) -> None:
+        """Publish a snapshot of the grid now, and at the end of every tick from now on.
+
+        Only viewers read snapshots, and a publication copies the whole grid, so universes
+        that nobody watches (headless runs, sweeps) don't publish at all.
+        """
+        with self.lock:
+            if not self.publishing:
+                self.publishing = True
+                self.snapshots.publish(self.grid, self.n_ticks)
+
+    def profile(self, ticks:Optional[int]=None, seconds:Optional[float]=None, mode:str="sample",
+                interval:float=0.005):
+        """Profile the simulation thread for the next `ticks` ticks, or `seconds` seconds.
+
+        Returns a `ProfileCapture` right away. It starts with the next tick: `wait()` on it in
+        real-time mode, or run the ticks yourself in headless mode.
+        """
+        from robowh.profiling import CaptureBusyError, ProfileCapture
+        capture = ProfileCapture(ticks=ticks, seconds=seconds, mode=mode, interval=interval)
+        with self.lock:
+            if self.capture is not None:
+                raise CaptureBusyError("Another profiling capture is running")
+            capture.on_done = self._capture_done
+            self.capture = capture
+        return capture
+
+    def _capture_done(self, capture) -> None:
+        with self.lock:
+            if self.capture is capture:
+                self.capture = None
+
+    def save(self, path:str) -> None:
+        """Save the state of the universe into a compressed numpy archive (`.npz`).
+
+        `Universe.load(path)` then continues from this tick, exactly as this universe would.
+        Save in-between ticks: the lock only protects the state while robots act one by one.
+        """
+        from robowh.checkpoint import save
+        with self.lock:
+            save(self, path)
 
-    def _init(self):
+    @classmethod
+    def load(cls, path:str) -> "Universe":
+        """Restore a universe saved by `save()`, with the settings it was created with."""
+        from robowh.checkpoint import load
+        return load(cls, path)
+
+    def _init(self, build:bool=True):
+        """Create everything that lives in the universe.
+
+        Without `build`, racks, bays and robots are not created (a checkpoint fills them in).
+        """
         logger.info("Spawning a new universe (but not starting it yet)")
         self.lock = threading.Lock()
+        # Every random choice in the universe goes through this generator, so that seeded
+        # runs are reproducible, and don't depend on the global state of `random`.
+        self.rng = random.Random(self.SEED)
+        self.n_ticks:int = 0
+        self.capture = None
+        self.recorder = None
 
         # Ugly deferred imports to avoid circular dependencies
         from robowh.observer import Observer
@@ -45,9 +151,13 @@ class Universe:
         from robowh.scheduler import Scheduler
         from robowh.orchestrator import Orchestrator
         from robowh.shelves import Shelves
+        from robowh.pathcache import PathCache
+        from robowh.flowfield import FieldCache
+        from robowh.reservations import ReservationTable
+        from robowh.snapshots import SnapshotBuffer
 
         # Global variables
-        self.list_of_all_products = set({})
+        self.products = ProductRegistry()  # Hands out product ids
 
         # Connect global objects here
         self.observer = Observer()
@@ -55,20 +165,45 @@ class Universe:
         self.scheduler = Scheduler(self)
         self.orchestrator = Orchestrator(self)
 
-        # Create the structure of the WH
-        self.grid = np.full((self.GRID_SIZE, self.GRID_SIZE), grid_codes['empty'], dtype=int)
-        self.shelves = Shelves("racks")
-        self.setup_shelves()
-        self.bays = Shelves("bays", deep=True)
-        self.setup_loading_bays()
+        # Create the structure of the WH. It is kept in two layers: the static layout (racks and
+        # bays, with items in them), and the occupancy of the floor by robots. The `grid` is
+        # these two layers combined, as seen by the viewer, and by robots checking for collisions.
+        shape = (self.GRID_SIZE, self.GRID_SIZE)
+        self.layout = np.full(shape, grid_codes['empty'], dtype=int)
+        self.occupancy = np.full(shape, grid_codes['empty'], dtype=int)
+        self.grid = np.full(shape, grid_codes['empty'], dtype=int)
+        self.free_cells = FreeCells(self.grid)  # Kept up to date by shelves and robots
+        self.layout_version:int = 0  # Bumped every time the layout changes
+        self.path_cache = PathCache()  # Routes on the static layout
+        self.field_cache = FieldCache()  # Flow fields towards popular targets
+        self.reservations = ReservationTable()  # Paths booked by cooperative robots
+        self.snapshots = SnapshotBuffer(shape)  # What readers in other threads get to see
+        self.publishing = False
+        self.planner = None
+        if self.PLANNING_WORKERS:
+            from robowh.planning import PlannerPool
+            self.planner = PlannerPool(self.PLANNING_WORKERS)
+        self.shelves = Shelves(self, "racks")
+        self.bays = Shelves(self, "bays", deep=True)
+        if build:
+            self.setup_shelves()
+            self.setup_loading_bays()
+            self.shelves.prioritize_by_distance(self.bays.coords)  # Store close to the bays
 
         # Robots
+        self.fleet = None
+        if self.FLEET:
+            from robowh.fleet import Fleet
+            self.fleet = Fleet(self, self.N_ROBOTS)
         self.robots = []
-        for i in range(self.N_ROBOTS):
-            robot = Robot(
-                name=f"R{i+1:03d}",
-                strategy=self.strategy_library.astar
-                )
+        strategy = getattr(self.strategy_library, self.STRATEGY, None)
+        if strategy is None:
+            raise ValueError(f"Unknown strategy: {self.STRATEGY}")
+        for i in range(self.N_ROBOTS if build else 0):
+            if self.fleet is not None:
+                robot:Robot = self.fleet.spawn(f"R{i+1:03d}", strategy)
+            else:
+                robot = Robot(self, name=f"R{i+1:03d}", strategy=strategy)
             self.robots.append(robot)
 
         # Set tracking numbers (temporary? Should go to the Observer class?)
@@ -82,11 +217,12 @@ class Universe:
         # We have some magic numbers here, to make the picture prettier. Sorry!
         gap = self.RACK_SPACING // 2
         bottom_gap = max(self.RACK_SPACING + gap, self.N_ROBOTS // 5)
-        for i in range(bottom_gap, self.GRID_SIZE - gap):
-            for j in range(gap, self.GRID_SIZE, self.RACK_SPACING):
-                if j < self.GRID_SIZE-gap:
-                    self.shelves.add_shelf((i, j))
-                    self.shelves.add_shelf((i, j+1))
+        rows = np.arange(bottom_gap, self.GRID_SIZE - gap)
+        columns = np.arange(gap, self.GRID_SIZE - gap, self.RACK_SPACING)
+        columns = np.stack([columns, columns + 1], axis=1).ravel()  # Racks are two shelves wide
+        # Shelves are numbered row by row, left to right; half of them are filled
+        points = np.stack(np.meshgrid(rows, columns, indexing='ij'), axis=-1)
+        self.shelves.add_shelves(points, fill=0.5)
 
         # Remember current stock, and make the orchestrator try to maintain it
         self.orchestrator.target_inventory = self.shelves.n_items
@@ -95,9 +231,9 @@ class Universe:
     def setup_loading_bays(self):
         """Create a line of loading bays."""
         logger.info("Creating the grid of loading bays")
-        for j in range(self.BAY_SPACING, self.GRID_SIZE, self.BAY_SPACING):
-            if j < self.GRID_SIZE-self.BAY_SPACING*0.7:
-                self.bays.add_shelf((0, j), empty=True)
+        columns = np.arange(self.BAY_SPACING, self.GRID_SIZE, self.BAY_SPACING)
+        columns = columns[columns < self.GRID_SIZE - self.BAY_SPACING*0.7]
+        self.bays.add_shelves(np.stack([np.zeros_like(columns), columns], axis=1))
 
 
     def start_universe(self):
@@ -106,19 +242,7 @@ class Universe:
         def update_universe():
             while True:
                 start_time = time.time()
-
-                # Update diagnostic number
-                with self.lock:
-                    self.diagnostic_number += random.uniform(-0.01, 0.01)
-
-                # Rearrange robots randomly, to not have favorites during bottlenecking
-                sequence = random.sample(range(len(self.robots)), len(self.robots))
-                for i in sequence:
-                    if time.time() - start_time < self.MAX_UPDATE_TIME:
-                        robot = self.robots[i]
-                        with self.lock:
-                            robot.act()
-
+                self.tick(deadline=start_time + self.MAX_UPDATE_TIME)
                 elapsed_time = time.time() - start_time
                 sleep_time = max(0, self.MAX_UPDATE_TIME - elapsed_time)
                 time.sleep(sleep_time)
@@ -126,18 +250,107 @@ class Universe:
         thread = threading.Thread(target=update_universe, daemon=True)
         thread.start()
 
+    def tick(self, deadline:Optional[float]=None) -> None:
+        """Run one time tick: nudge robots one by one.
+
+        In real-time mode `deadline` is a wall-clock time after which remaining robots are
+        skipped. In headless mode there's no deadline, and the compute bottleneck is instead
+        modeled by `ROBOTS_PER_TICK`, so that results don't depend on the speed of the machine.
+        """
+        # When nobody profiles or records, these checks for None are all it costs
+        capture, recorder = self.capture, self.recorder
+        if capture is not None:
+            capture.tick_started()
+        if recorder is not None:
+            recorder.tick_started()
+        finished = False
+        try:
+            profiler = self.observer.profiler
+            profiler.start_tick(self.n_ticks)
+            # Update diagnostic number
+            with self.lock:
+                self.diagnostic_number += self.rng.uniform(-0.01, 0.01)
+                # Reservations for the previous tick are still needed, as robots that were there
+                # may not have moved yet.
+                self.reservations.expire(before_tick=self.n_ticks-1)
+
+            # Rearrange robots randomly, to not have favorites during bottlenecking
+            sequence = self.rng.sample(range(len(self.robots)), len(self.robots))
+            if self.ROBOTS_PER_TICK is not None:
+                sequence = sequence[:self.ROBOTS_PER_TICK]
+            if self.planner is not None:  # Everyone who needs a path gets it now, in one batch
+                with self.lock, profiler.timed('planning'):
+                    self.planner.plan_ahead(self, [self.robots[i] for i in sequence])
+            if self.fleet is not None:
+                acted = self.fleet.tick(sequence, deadline)  # Routine moves are made in bulk
+            else:
+                n_acted = 0
+                for i in sequence:
+                    if deadline is not None and time.time() >= deadline:
+                        break  # Remaining robots are skipped (and the profiler counts them)
+                    robot = self.robots[i]
+                    with self.lock:
+                        robot.act()
+                    n_acted += 1
+                acted = np.array(sequence[:n_acted], dtype=np.int64)  # As from the fleet
+            profiler.end_tick(acted, len(self.robots))
+            self.n_ticks += 1
+            if self.publishing:  # Only this thread writes into the grid, so it's consistent now
+                self.snapshots.publish(self.grid, self.n_ticks)
+            if recorder is not None:
+                recorder.tick_finished()
+            finished = True
+        finally:
+            # A tick that failed must not leave the profiler running
+            if capture is not None:
+                if finished:
+                    capture.tick_finished()
+                else:
+                    capture.cancel()
+
+    def step(self, n_ticks:int=1) -> None:
+        """Headless mode: run n ticks back-to-back, as fast as possible."""
+        for _ in range(n_ticks):
+            self.tick()
+
+    def run_until(self, condition:Callable[["Universe"], bool], max_ticks:int) -> int:
+        """Headless mode: run ticks until condition(universe) is true, or max_ticks is spent.
+
+        Returns the number of ticks that were run.
+        """
+        for n in range(max_ticks):
+            if condition(self):
+                return n
+            self.tick()
+        return max_ticks
+
     def random_empty_position(self):
         """Get a random empty position in the grid."""
-        empty_positions = np.argwhere(self.grid == grid_codes['empty'])
-        if empty_positions.size == 0:
+        if len(self.free_cells) > 0:
+            position = self.free_cells.choice(self.rng)
+            if self.grid_is_free(*position):
+                return position
+        # Either there's no space, or the free pixels are out of sync with the grid (writes
+        # straight into `grid` don't update them), so rescan the grid, and draw again.
+        self.free_cells.rebuild(self.grid)
+        if len(self.free_cells) == 0:
             raise ValueError("No empty positions available in the grid.")
-        position = random.choice(empty_positions)
-        position = [int(c) for c in position] # Numpy integers are annoying, cast to int
-        return tuple(position)
+        return self.free_cells.choice(self.rng)
+
+    def planning_view(self, robots:bool=True) -> np.ndarray:
+        """Read-only view of obstacles for pathfinding strategies (non-zero cells are taken).
+
+        With `robots=True` it is the combined grid, otherwise only the static layout, for
+        planners that want to deal with other robots on their own. It's a view, not a copy,
+        so it's cheap, but it is only valid while the universe lock is held.
+        """
+        view = (self.grid if robots else self.layout).view()
+        view.flags.writeable = False
+        return view
 
     def grid_is_free(self, x:int, y:int) -> bool:
         """Try to move robot to new position. Return success/failure."""
-        if (0 <= x < self.GRID_SIZE and 0 <= y < self.GRID_SIZE):
+        if (0 <= x < self.grid.shape[0] and 0 <= y < self.grid.shape[1]):
             if self.grid[x, y] == grid_codes['empty']:
                 return True
         return False
@@ -154,23 +367,10 @@ class Universe:
             x = x0 + delta[0]
             y = y0 + delta[1]
             for shelve in shelves:
-                try:
-                    index = shelve.coords.index((x,y))
-                    # .index is funny, instead of returning a None, it fails.
+                index = shelve.index_at(x, y)  # A lookup in a dense array, not a search
+                if index is not None:
                     # We can stop looking now, as we assume that every empty pixel can only
                     # border one shelf. And we can't grab diagonally.
                     return (shelve, index)
-                except Exception:
-                    pass
         return False
 
-    def new_code(self):
-        """Create a new code."""
-        # The uuid call below is guaranteed to produce unique codes, but after we truncate
-        # them, strictly speaking, they are no longer guaranteed to be unique. The probability
-        # of a repeat is very low though, so it's enough to try again, and we'll succeed.
-        while True:
-            product = uuid.uuid4().hex[:8]  # Generate hex-based ID (32 characters)
-            if product not in self.list_of_all_products:
-                self.list_of_all_products.add(product)
-                return product
\ No newline at end of file
@@ -1,6 +1,9 @@
 """Assorted technical utilities."""
 
 import logging
+import random
+from typing import Dict, Generic, Hashable, Iterator, List, Optional, Tuple, TypeVar
+import numpy as np
 
 class ColorFormatter(logging.Formatter):
     """Custom color formatter for logging messages."""
@@ -37,3 +40,154 @@ grid_codes = {
     'confused':4,
     'item':5
 }
+
+
+T = TypeVar('T', bound=Hashable)
+
+class IndexedSet(Generic[T]):
+    """A set that can also return a random element in O(1).
+
+    Elements live in a list, and a dict remembers where each of them is. To remove an element,
+    we move the last one into its place, so nothing needs to be shifted.
+    """
+
+    def __init__(self, items=()):
+        self._items:List[T] = list(dict.fromkeys(items))  # Without repeats, in the same order
+        self._positions:Dict[T,int] = {item: i for i, item in enumerate(self._items)}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, item) -> bool:
+        return item in self._positions
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(self._items)
+
+    def add(self, item:T) -> None:
+        if item not in self._positions:
+            self._positions[item] = len(self._items)
+            self._items.append(item)
+
+    def update(self, items) -> None:
+        """Add many elements (in this order)."""
+        for item in dict.fromkeys(items):
+            if item not in self._positions:
+                self._positions[item] = len(self._items)
+                self._items.append(item)
+
+    def discard(self, item:T) -> None:
+        position = self._positions.pop(item, None)
+        if position is None:
+            return
+        last = self._items.pop()
+        if position < len(self._items):  # The removed element wasn't the last one
+            self._items[position] = last
+            self._positions[last] = position
+
+    def choice(self, rng:random.Random) -> T:
+        """A random element (fails on an empty set, like random.choice)."""
+        return self._items[rng.randrange(len(self._items))]
+
+
+class FreeCells:
+    """Free pixels of a grid, with O(1) updates and O(1) random draws.
+
+    Same idea as the IndexedSet, but for pixels of a grid, stored in two flat numpy arrays
+    (pixels, and the position of every pixel among them), as grids can be large.
+    """
+
+    def __init__(self, grid:np.ndarray):
+        self.rebuild(grid)
+
+    def rebuild(self, grid:np.ndarray, order:Optional[np.ndarray]=None) -> None:
+        """Scan the grid for free pixels from scratch.
+
+        Random draws depend on the order in which free pixels are listed, so to restore a saved
+        state exactly, the order (from `to_array`) can be given as well.
+        """
+        self.width:int = grid.shape[1]
+        free = np.flatnonzero(grid.ravel() == grid_codes['empty']) if order is None else order
+        self._size:int = len(free)
+        self._cells = np.zeros(grid.size, dtype=np.int32)
+        self._cells[:self._size] = free
+        self._positions = np.full(grid.size, -1, dtype=np.int32)
+        self._positions[free] = np.arange(self._size)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, point) -> bool:
+        return self._positions[point[0]*self.width + point[1]] >= 0
+
+    def __iter__(self) -> Iterator[Tuple[int,int]]:
+        return (divmod(int(c), self.width) for c in self._cells[:self._size])
+
+    def release(self, x:int, y:int) -> None:
+        """Mark a pixel as free."""
+        cell = x*self.width + y
+        if self._positions[cell] < 0:
+            self._positions[cell] = self._size
+            self._cells[self._size] = cell
+            self._size += 1
+
+    def occupy(self, x:int, y:int) -> None:
+        """Mark a pixel as taken (by moving the last free pixel into its place)."""
+        cell = x*self.width + y
+        position = self._positions[cell]
+        if position >= 0:
+            self._size -= 1
+            last = self._cells[self._size]
+            self._cells[position] = last
+            self._positions[last] = position
+            self._positions[cell] = -1
+
+    def occupy_many(self, cells:np.ndarray) -> None:
+        """Mark many pixels (flat indices) as taken at once. The rest keep their order."""
+        positions = self._positions[cells]
+        taken = np.zeros(self._size, dtype=bool)
+        taken[positions[positions >= 0]] = True
+        remaining = self._cells[:self._size][~taken]
+        self._positions[cells] = -1
+        self._size = len(remaining)
+        self._cells[:self._size] = remaining
+        self._positions[remaining] = np.arange(self._size)
+
+    def to_array(self) -> np.ndarray:
+        """Flat indices of free pixels, in the order in which they are listed."""
+        return self._cells[:self._size].copy()
+
+    def choice(self, rng:random.Random) -> Tuple[int,int]:
+        """A random free pixel (fails if there are none)."""
+        cell = int(self._cells[rng.randrange(self._size)])
+        return divmod(cell, self.width)
+
+    def swap(self, occupied:np.ndarray, released:np.ndarray) -> None:
+        """Occupy some free pixels, and release as many taken ones, in one go.
+
+        Pixels are given as flat indices. Every released pixel simply takes the list position
+        of an occupied one. All `occupied` pixels must be free, and all `released` ones taken.
+        """
+        positions = self._positions[occupied]
+        self._cells[positions] = released
+        self._positions[released] = positions
+        self._positions[occupied] = -1
+
+
+def manhattan_distances(shape:Tuple[int,int], targets:np.ndarray) -> np.ndarray:
+    """Manhattan distance from every pixel of a grid to the nearest target (obstacles ignored).
+
+    The distance is separable, so it takes a pass along rows, and then along columns, each
+    done as running minimums from both ends. Memory stays at a few grids, however many targets.
+    """
+    far = sum(shape)  # Longer than any real distance
+    distances = np.full(shape, far, dtype=np.int64)
+    distances[targets[:, 0], targets[:, 1]] = 0
+    for axis in (1, 0):
+        steps = np.arange(shape[axis]).reshape((1, -1) if axis == 1 else (-1, 1))
+        forward = np.minimum.accumulate(distances - steps, axis=axis) + steps
+        backward = np.flip(
+            np.minimum.accumulate(np.flip(distances + steps, axis), axis=axis), axis
+            ) - steps
+        distances = np.minimum(forward, backward)
+    return distances
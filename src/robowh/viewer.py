@@ -2,8 +2,14 @@ import logging
 logger = logging.getLogger(__name__)
 
 from flask import Flask, jsonify, send_from_directory, request
+import functools
+import json
+import queue
 import threading
 
+from robowh.broadcast import Broadcaster
+from robowh.profiling import CaptureBusyError
+
 
 
 # Suppress console logging for selected Viewer interfaces
@@ -11,22 +17,54 @@ class NoGetNumber(logging.Filter):
     def filter(self, record):
         # Suppress two specific GET requests (should be enough for our purposes)
         msg = record.getMessage()
-        return not ("GET /get_kpis" in msg or "GET /get_grid" in msg)
+        return not ("GET /get_kpis" in msg or "GET /get_grid" in msg)  # Also /get_grid.bin
 
 # Add the filter to the werkzeug logger
 logging.getLogger('werkzeug').addFilter(NoGetNumber())
 
 
 class Viewer:
-    def __init__(self, universe):
+    MAX_PROFILE_SECONDS = 60  # Longest capture that /profile may ask for
+
+    def __init__(self, universe=None, replay=None):
+        """Show a live universe, or scrub through a recorded trace (a `TraceReplay`)."""
         logger.info("Starting the Viewer")
         self.app = Flask(__name__, static_folder='static')
         self.lock = threading.Lock()
+        self._grid_json = (None, None)  # (snapshot version, encoded grid), to encode only once
+        self._grid_bin = (None, None)  # Same for binary frames
 
         self._setup_routes()
         self.universe = universe
-        self.universe.start_universe()
-
+        self.replay = replay
+        self.broadcaster = None
+        if universe is not None:
+            universe.publish_snapshots()
+            # One encoder for all streaming clients
+            self.broadcaster = Broadcaster(universe.snapshots, self._kpis)
+            self.broadcaster.start()
+            self.universe.start_universe()
+
+
+    def _kpis(self) -> dict:
+        return {
+            "n_tasks": self.universe.observer.n_tasks,
+            "n_shelves": self.universe.shelves.n_items,
+            "n_bay": self.universe.bays.n_items,
+            "sh_blocked": 100 * self.universe.observer.n_blocked / self.universe.N_ROBOTS,
+            # Where the time goes, averaged over recent ticks
+            **self.universe.observer.profiler.summary()
+            }
+
+
+    def _live(self, route):
+        """Routes of a live universe answer 404 when the viewer replays a trace instead."""
+        @functools.wraps(route)
+        def wrapped(*args, **kwargs):
+            if self.universe is None:
+                return jsonify({"error": "No live universe (a trace is replayed)"}), 404
+            return route(*args, **kwargs)
+        return wrapped
 
     def _setup_routes(self):
         """External interfaces."""
@@ -36,21 +74,159 @@ class Viewer:
             return send_from_directory(self.app.static_folder, 'index.html')
 
         @self.app.route('/get_kpis')  # Toy example
+        @self._live
         def get_kpis():
-            return jsonify({
-                "n_tasks": self.universe.observer.n_tasks,
-                "n_shelves": self.universe.shelves.n_items,
-                "n_bay": self.universe.bays.n_items,
-                "sh_blocked": 100 * self.universe.observer.n_blocked / self.universe.N_ROBOTS
-                })
+            return jsonify(self._kpis())
+
+        @self.app.route('/stream')
+        @self._live
+        def stream():
+            """Server-Sent Events: a full frame first, then deltas and KPIs on every tick.
+
+            Frames have the same binary layout as in /get_grid.bin, base64-encoded.
+            """
+            client = self.broadcaster.subscribe()
+            def events():
+                try:
+                    while True:
+                        try:
+                            yield client.queue.get(timeout=15)
+                        except queue.Empty:
+                            yield ": keep-alive\n\n"  # A comment, so that proxies don't hang up
+                finally:  # The client is gone
+                    self.broadcaster.unsubscribe(client)
+            return self.app.response_class(
+                events(), mimetype='text/event-stream', headers={"Cache-Control": "no-cache"}
+                )
 
         @self.app.route('/get_grid')
+        @self._live
         def get_grid():
-            # No need to lock, as we are only reading here.
-            # We're flipping the grid, to have the Y axis go from top to bottom
-            return jsonify({"grid": self.universe.grid[::-1, :].copy().tolist()})
+            # Published snapshots are consistent and immutable, so no need to lock.
+            version, payload = self._grid_json
+            snapshot = self.universe.snapshots.latest()
+            while version != snapshot.version:
+                # We're flipping the grid, to have the Y axis go from top to bottom
+                payload = json.dumps({"grid": snapshot.grid[::-1, :].tolist()})
+                if snapshot.is_valid():  # Otherwise it was overwritten while we were encoding
+                    version = snapshot.version
+                    self._grid_json = (version, payload)
+                else:
+                    snapshot = self.universe.snapshots.latest()
+            return self.app.response_class(payload, mimetype='application/json')
+
+        @self.app.route('/get_grid.bin')
+        @self._live
+        def get_grid_bin():
+            """The grid as raw uint8 codes, row by row (not flipped), or only recent changes.
+
+            With `?since=<tick>`, if this tick is still in the history, the response only has
+            the pixels that changed after it: uint32 flat indices (little-endian), followed by
+            as many uint8 codes. Otherwise it's a full frame. Headers tell which one it is
+            (`X-Frame`: full or delta), the tick of the frame, and the shape of the grid.
+            """
+            snapshots = self.universe.snapshots
+            since = request.args.get('since', type=int)
+            changes = None if since is None else snapshots.changes_since(since)
+            if changes is not None:
+                indices, codes, tick = changes
+                body = indices.astype('<u4').tobytes() + codes.tobytes()
+                kind = "delta"
+                shape = snapshots.latest().grid.shape
+            else:
+                version, body = self._grid_bin
+                snapshot = snapshots.latest()
+                while version != snapshot.version:
+                    body = snapshot.grid.tobytes()
+                    if snapshot.is_valid():  # Otherwise it was overwritten while we were copying
+                        version = snapshot.version
+                        self._grid_bin = (version, body)
+                    else:
+                        snapshot = snapshots.latest()
+                tick = snapshot.tick
+                kind = "full"
+                shape = snapshot.grid.shape
+            return self.app.response_class(body, mimetype='application/octet-stream', headers={
+                "X-Frame": kind,
+                "X-Tick": str(tick),
+                "X-Shape": f"{shape[0]},{shape[1]}",
+                })
+
+        @self.app.route('/profile')
+        @self._live
+        def profile():
+            """Profile the simulation for `?seconds=` (default 5) or `?ticks=`, and return results.
+
+            `?mode=sample` (default) or `cprofile`. `?format=json` (default) gives time per
+            module; `collapsed` gives stacks for flame graph tools (sample mode); `pstats` gives
+            a file for `pstats` / snakeviz (cprofile mode).
+            """
+            ticks = request.args.get('ticks', type=int)
+            seconds = request.args.get('seconds', type=float)
+            if ticks is None and seconds is None:
+                seconds = 5.0
+            mode = request.args.get('mode', 'sample')
+            fmt = request.args.get('format', 'json')
+            if fmt not in ('json', 'collapsed', 'pstats') or \
+                    (fmt == 'collapsed' and mode != 'sample') or \
+                    (fmt == 'pstats' and mode != 'cprofile'):
+                return jsonify({"error": f"Format {fmt} is not available in {mode} mode"}), 400
+            if seconds is not None and seconds > self.MAX_PROFILE_SECONDS:
+                return jsonify({"error": f"At most {self.MAX_PROFILE_SECONDS} s"}), 400
+            max_ticks = int(self.MAX_PROFILE_SECONDS / self.universe.MAX_UPDATE_TIME)
+            if ticks is not None and ticks > max_ticks:
+                return jsonify({"error": f"At most {max_ticks} ticks"}), 400
+            try:
+                capture = self.universe.profile(ticks=ticks, seconds=seconds, mode=mode)
+            except CaptureBusyError as e:
+                return jsonify({"error": str(e)}), 409
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            timeout = (seconds if seconds is not None else
+                       ticks * self.universe.MAX_UPDATE_TIME) + self.MAX_PROFILE_SECONDS
+            if not capture.wait(timeout):
+                capture.cancel()  # So that it doesn't keep running, and new captures can start
+                return jsonify({"error": "The capture did not finish in time"}), 504
+            if fmt == 'collapsed':
+                return self.app.response_class(capture.collapsed(), mimetype='text/plain', headers={
+                    "Content-Disposition": "attachment; filename=robowh.collapsed"})
+            if fmt == 'pstats':
+                return self.app.response_class(
+                    capture.pstats_dump(), mimetype='application/octet-stream', headers={
+                        "Content-Disposition": "attachment; filename=robowh.prof"})
+            return jsonify(capture.summary())
+
+        @self.app.route('/replay/info')
+        def replay_info():
+            """Which ticks can be replayed (404 if the viewer shows a live universe)."""
+            if self.replay is None:
+                return jsonify({"error": "No trace is loaded"}), 404
+            return jsonify({
+                "first_tick": self.replay.first_tick,
+                "last_tick": self.replay.last_tick,
+                "shape": list(self.replay.shape),
+                })
+
+        @self.app.route('/replay/frame.bin')
+        def replay_frame():
+            """The grid at `?tick=`, rebuilt from the trace, as a full frame of /get_grid.bin."""
+            if self.replay is None:
+                return jsonify({"error": "No trace is loaded"}), 404
+            tick = request.args.get('tick', default=self.replay.first_tick, type=int)
+            try:
+                grid = self.replay.grid_at(tick)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            body = grid.tobytes()
+            return self.app.response_class(body, mimetype='application/octet-stream', headers={
+                "X-Frame": "full",
+                "X-Tick": str(tick),
+                "X-Shape": f"{grid.shape[0]},{grid.shape[1]}",
+                })
 
         @self.app.route('/set_mode', methods=['POST'])
+        @self._live
         def set_mode():
             # Parse JSON data from the request
             data = request.get_json()
@@ -1,20 +1,20 @@
+import heapq
 import pytest
 from unittest.mock import MagicMock
 import numpy as np
 
 from robowh.strategies import AStarStrategy
+from robowh import astar
 
 
 
 @pytest.fixture(autouse=True)
-def universe(monkeypatch):
+def universe():
     mock = MagicMock()
     mock.grid = np.zeros((5, 5), dtype=int)
+    mock.planning_view = lambda robots=True: mock.grid
+    mock.path_cache = None
 
-    monkeypatch.setattr(
-        "robowh.strategies.Universe.get_universe",
-        lambda: mock
-    )
     return mock
 
 
@@ -34,38 +34,101 @@ def partially_blocked():
     grid[0:3, 2] = 1  # partial
     return grid
 
-def test_clear_path():
-    path = AStarStrategy.calculate_path((0,0), (2,2), until_touch=False)
+def test_clear_path(universe):
+    path = AStarStrategy.calculate_path(universe, (0,0), (2,2), until_touch=False)
     assert len(path) == 4
     assert path == [(1,0), (1,0), (0,1), (0,1)]
 
 def test_blocked_path(blocked_grid, universe):
     universe.grid = blocked_grid
-    path = AStarStrategy.calculate_path((0,0), (4,4), until_touch=False)
+    path = AStarStrategy.calculate_path(universe, (0,0), (4,4), until_touch=False)
     assert path == []
 
 def test_complex_path(partially_blocked, universe):
     universe.grid = partially_blocked
-    path = AStarStrategy.calculate_path((0,0), (0,4), until_touch=False)
+    path = AStarStrategy.calculate_path(universe, (0,0), (0,4), until_touch=False)
     assert len(path) == 10
     # I'm too lazy to write it down completely, but here's an approximation
     assert len([m for m in path if m==(0,1)]) == 4
     assert len([m for m in path if m==(1,0)]) == 3
     assert len([m for m in path if m==(-1,0)]) == 3
 
-def test_partial_steps():
-    path = AStarStrategy.calculate_path((0,0), (4,4), n_steps=3, until_touch=False)
+def test_partial_steps(universe):
+    path = AStarStrategy.calculate_path(universe, (0,0), (4,4), n_steps=3, until_touch=False)
     assert len(path) == 3
     assert path == [(1,0), (1,0), (1,0)]
 
-def test_same_position():
-    path = AStarStrategy.calculate_path((2,2), (2,2), until_touch=False)
+def test_same_position(universe):
+    path = AStarStrategy.calculate_path(universe, (2,2), (2,2), until_touch=False)
     assert path == []
 
-def test_invalid_start():
-    path = AStarStrategy.calculate_path((-1,0), (4,4), until_touch=False)
+def test_invalid_start(universe):
+    path = AStarStrategy.calculate_path(universe, (-1,0), (4,4), until_touch=False)
     assert path == []
 
-def test_invalid_target():
-    path = AStarStrategy.calculate_path((0,0), (9,9), until_touch=False)
-    assert path == []
\ No newline at end of file
+def test_invalid_target(universe):
+    path = AStarStrategy.calculate_path(universe, (0,0), (9,9), until_touch=False)
+    assert path == []
+
+def test_core_path_along_the_edges(partially_blocked):
+    # The search runs on a padded grid, so paths hugging the borders must come out unpadded
+    path = astar.find_path(partially_blocked, (0,0), (0,4), until_touch=False)
+    assert path[0] == (0,0)
+    assert path[-1] == (0,4)
+    assert len(path) == 11
+    for (y0, x0), (y1, x1) in zip(path[:-1], path[1:]):
+        assert abs(y1-y0) + abs(x1-x0) == 1
+        assert partially_blocked[y1, x1] == 0
+
+def test_core_until_touch(blocked_grid):
+    # The goal itself is a wall, but we can stop right next to it
+    path = astar.find_path(blocked_grid, (4,0), (0,2), until_touch=True)
+    assert path[-1] == (0,1)
+    assert len(path) == 6
+
+def _reference_find_path(grid, start, goal, until_touch):
+    """The original Node-based A*, that the core must agree with, path for path."""
+    class Node:
+        def __init__(self, position, parent, g):
+            self.position, self.parent, self.g = position, parent, g
+            self.f = g + abs(position[0] - goal[0]) + abs(position[1] - goal[1])
+        def __lt__(self, other):
+            return self.f < other.f
+
+    def path_to(node):
+        path = []
+        while node:
+            path.append(node.position)
+            node = node.parent
+        return path[::-1]
+
+    open_heap, closed, g_costs = [Node(start, None, 0)], set(), {start: 0}
+    while open_heap:
+        current = heapq.heappop(open_heap)
+        if current.position == goal:
+            return path_to(current)
+        closed.add(current.position)
+        for dy, dx in [(-1,0), (1,0), (0,-1), (0,1)]:
+            y, x = current.position[0] + dy, current.position[1] + dx
+            if until_touch and (y, x) == goal:
+                return path_to(current)
+            if not (0 <= y < grid.shape[0] and 0 <= x < grid.shape[1] and grid[y, x] == 0):
+                continue
+            if (y, x) in g_costs and current.g + 1 >= g_costs[(y, x)]:
+                continue
+            g_costs[(y, x)] = current.g + 1
+            if (y, x) not in closed:
+                heapq.heappush(open_heap, Node((y, x), current, current.g + 1))
+    return []
+
+def test_core_matches_the_reference_on_random_grids():
+    rng = np.random.default_rng(0)
+    for _ in range(150):
+        shape = tuple(rng.integers(3, 25, 2))
+        grid = (rng.random(shape) < rng.uniform(0, 0.4)).astype(int)
+        for _ in range(4):
+            start = tuple(int(c) for c in rng.integers(0, shape))
+            goal = tuple(int(c) for c in rng.integers(0, shape))
+            for until_touch in (False, True):
+                assert (astar.find_path(grid, start, goal, until_touch)
+                        == _reference_find_path(grid, start, goal, until_touch))
@@ -0,0 +1,66 @@
+import base64
+import json
+import numpy as np
+
+from robowh.broadcast import Broadcaster
+from robowh.universe import Universe
+
+
+def receive(client, grid):
+    """Read all queued events, and apply frames to the client's copy of the grid."""
+    events = []
+    while not client.queue.empty():
+        event, data = client.queue.get_nowait().strip().split("\n")
+        event, data = event[len("event: "):], json.loads(data[len("data: "):])
+        if event == "frame":
+            body = base64.b64decode(data["cells"])
+            if data["kind"] == "full":
+                grid = np.frombuffer(body, dtype=np.uint8).reshape(data["shape"]).copy()
+            else:
+                n = len(body) // 5
+                indices = np.frombuffer(body[:4*n], dtype='<u4')
+                grid.ravel()[indices] = np.frombuffer(body[4*n:], dtype=np.uint8)
+        events.append((event, data.get("kind")))
+    return events, grid
+
+
+def test_clients_share_frames_and_stay_in_sync():
+    universe = Universe(seed=2)
+    universe.publish_snapshots()
+    broadcaster = Broadcaster(universe.snapshots, kpis=lambda: {"n_tasks": 0})
+    first = broadcaster.subscribe()
+    broadcaster.broadcast()
+    events, first_grid = receive(first, None)
+    assert events == [("frame", "full"), ("kpis", None)]
+
+    universe.step(1)
+    second = broadcaster.subscribe()  # Joins later, and starts with a keyframe
+    broadcaster.broadcast()
+    for _ in range(3):
+        universe.step(1)
+        broadcaster.broadcast()
+    events, first_grid = receive(first, first_grid)
+    assert [kind for event, kind in events if event == "frame"] == ["delta"] * 4
+    events, second_grid = receive(second, None)
+    assert [kind for event, kind in events if event == "frame"] == ["full"] + ["delta"] * 3
+
+    snapshot = universe.snapshots.latest().grid
+    assert np.array_equal(first_grid, snapshot) and np.array_equal(second_grid, snapshot)
+    assert broadcaster.n_encoded == 1 + 2 + 3  # Once per tick, not once per client
+
+
+def test_slow_clients_are_resynced():
+    universe = Universe()
+    universe.publish_snapshots()
+    broadcaster = Broadcaster(universe.snapshots, kpis=lambda: {}, max_queue=4)
+    client = broadcaster.subscribe()
+    for _ in range(3):  # Nobody reads the queue, so it overflows
+        universe.step(1)
+        broadcaster.broadcast()
+    assert client.needs_keyframe
+    universe.step(1)
+    broadcaster.broadcast()
+    events, grid = receive(client, None)
+    assert events[0] == ("frame", "full")
+    assert np.array_equal(grid, universe.snapshots.latest().grid)
+    broadcaster.unsubscribe(client)
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from robowh.universe import Universe
+
+
+def stored(shelves):
+    """Where every product is (as a dict, as per-product arrays may have grown differently)."""
+    products = np.flatnonzero(shelves.records >= 0)
+    return dict(zip(products.tolist(), shelves.records[products].tolist()))
+
+
+def fingerprint(universe):
+    """Everything that tells two universes apart, as far as the future is concerned."""
+    return (
+        universe.n_ticks,
+        universe.grid.tobytes(),
+        universe.layout.tobytes(),
+        universe.rng.getstate(),
+        universe.observer.n_tasks,
+        universe.observer.n_blocked,
+        [(robot.name, robot.x, robot.y, robot.state, robot.task, robot.current_action,
+          robot.pending_actions, robot.next_moves) for robot in universe.robots],
+        [list(shelves.available_products) for shelves in (universe.shelves, universe.bays)],
+        [shelves.inventory for shelves in (universe.shelves, universe.bays)],
+        universe.free_cells.to_array().tobytes(),
+        sorted(universe.reservations),
+        (universe.products.capacity, len(universe.products)),
+        )
+
+
+@pytest.mark.parametrize("settings", [
+    dict(),
+    dict(fleet=True),
+    dict(strategy='cooperative'),
+    dict(strategy='flowfield', robots_per_tick=10),
+    ])
+def test_loaded_universe_continues_exactly(tmp_path, settings):
+    universe = Universe(seed=3, **settings)
+    universe.step(40)
+    path = str(tmp_path / "checkpoint.npz")
+    universe.save(path)
+
+    restored = Universe.load(path)
+    assert fingerprint(restored) == fingerprint(universe)
+    for _ in range(4):
+        universe.step(50)
+        restored.step(50)
+        assert fingerprint(restored) == fingerprint(universe)
+    assert restored.observer.n_tasks > 40  # Robots did work after the restore
+
+
+def test_settings_and_shelves_are_restored(tmp_path):
+    universe = Universe(seed=5, n_robots=10, grid_size=40, rack_spacing=6)
+    universe.orchestrator.mode = "pick"
+    universe.step(20)
+    universe.save(str(tmp_path / "checkpoint.npz"))
+    restored = Universe.load(str(tmp_path / "checkpoint.npz"))
+
+    assert (restored.GRID_SIZE, restored.N_ROBOTS, restored.RACK_SPACING) == (40, 10, 6)
+    assert restored.orchestrator.mode == "pick"
+    for name in ("shelves", "bays"):
+        saved, loaded = getattr(universe, name), getattr(restored, name)
+        assert stored(loaded) == stored(saved)
+        assert loaded.coords == saved.coords
+        assert loaded.locked_indices == saved.locked_indices
+        assert np.array_equal(np.flatnonzero(loaded.locked_products),
+                              np.flatnonzero(saved.locked_products))
+        assert np.array_equal(loaded.index_map, saved.index_map)
+        assert loaded.request_optimal_placement() == saved.request_optimal_placement()
+    # Cached routes are restored (robots replan along them), flow fields are not
+    assert len(restored.path_cache) == len(universe.path_cache) > 0
+    assert restored.path_cache.checkpoint().keys() == universe.path_cache.checkpoint().keys()
+    for key, value in universe.path_cache.checkpoint().items():
+        assert np.array_equal(restored.path_cache.checkpoint()[key], value), key
+
+
+def test_suffix_is_optional(tmp_path):
+    universe = Universe(seed=1, n_robots=3, grid_size=30)
+    universe.save(str(tmp_path / "checkpoint"))
+    assert (tmp_path / "checkpoint.npz").exists()
+    for path in ("checkpoint", "checkpoint.npz"):
+        restored = Universe.load(str(tmp_path / path))
+        assert np.array_equal(restored.grid, universe.grid)
@@ -0,0 +1,66 @@
+import pytest
+import numpy as np
+
+from robowh.universe import Universe
+from robowh.fleet import resolve_moves, FleetRobot
+
+
+def resolve_one_by_one(free, origins, targets):
+    """Reference: robots move in turn, as in Robot.move()."""
+    free = free.copy()
+    moved = np.zeros(len(origins), dtype=bool)
+    for i, (origin, target) in enumerate(zip(origins, targets)):
+        if target >= 0 and free[target]:
+            free[origin], free[target] = True, False
+            moved[i] = True
+    return moved
+
+
+def test_resolution_matches_sequential_moves():
+    rng = np.random.default_rng(0)
+    for _ in range(300):
+        size = rng.integers(4, 40)
+        free = rng.random(size) < 0.7
+        n = rng.integers(1, max(2, (~free).sum()))
+        origins = rng.choice(np.flatnonzero(~free), size=min(n, (~free).sum()), replace=False)
+        targets = np.clip(origins + rng.choice([-1, 1, -5, 5], size=len(origins)), -1, size-1)
+        assert np.array_equal(
+            resolve_moves(free, origins, targets),
+            resolve_one_by_one(free, origins, targets)
+            )
+
+def test_queue_moves_in_one_tick():
+    # Robots in a row all step right: it only works if the front robot goes first
+    free = np.array([False, False, False, True])
+    origins, targets = np.array([2, 1, 0]), np.array([3, 2, 1])
+    assert resolve_moves(free, origins, targets).all()
+    assert not resolve_moves(free, origins[::-1], targets[::-1])[:2].any()
+
+
+@pytest.fixture
+def fleet_universe():
+    return Universe(seed=3, fleet=True)
+
+def test_fleet_universe_stays_consistent(fleet_universe):
+    universe = fleet_universe
+    assert all(isinstance(r, FleetRobot) for r in universe.robots)
+    universe.step(100)
+    assert universe.observer.n_tasks > 0
+    positions = {(r.x, r.y) for r in universe.robots}
+    assert len(positions) == len(universe.robots)  # No two robots on the same pixel
+    assert (universe.occupancy != 0).sum() == len(universe.robots)
+    assert np.array_equal(universe.grid, np.maximum(universe.layout, universe.occupancy))
+    free = {tuple(int(c) for c in p) for p in np.argwhere(universe.grid == 0)}
+    assert set(universe.free_cells) == free
+    assert universe.observer.n_blocked == sum(r.state == "blocked" for r in universe.robots)
+
+def test_fleet_robot_is_a_view(fleet_universe):
+    robot = fleet_universe.robots[0]
+    robot.next_moves = [(1, 0), (0, 1)]
+    assert robot.next_moves == [(1, 0), (0, 1)]
+    assert robot._next_move() == (1, 0)
+    assert robot.next_moves == [(0, 1)]
+    robot.current_action = ("go", (5, 6), None)
+    assert tuple(fleet_universe.fleet.action_target[0]) == (5, 6)
+    robot.state = "blocked"
+    assert robot.state == "blocked"
@@ -0,0 +1,67 @@
+import pytest
+from unittest.mock import MagicMock
+import random
+import numpy as np
+
+from robowh.flowfield import distance_field, FieldCache, UNREACHABLE
+from robowh.strategies import FlowFieldStrategy
+from robowh.utils import grid_codes
+
+
+@pytest.fixture
+def universe():
+    mock = MagicMock()
+    mock.layout = np.zeros((5, 5), dtype=int)
+    mock.layout[1:5, 2] = grid_codes['shelf']  # A rack, with a passage at the top
+    mock.occupancy = np.zeros((5, 5), dtype=int)
+    mock.planning_view = lambda robots=True: mock.layout
+    mock.layout_version = 0
+    mock.field_cache = FieldCache()
+    mock.rng = random.Random(0)
+
+    return mock
+
+
+def test_distance_field(universe):
+    field = distance_field(universe.layout, (4,3))  # A rack pixel
+    assert field[4,3] == 0
+    assert field[4,4] == 1
+    assert field[0,3] == 4
+    assert field[4,1] == 10  # All the way around the rack
+    assert field[2,2] == UNREACHABLE  # Other rack pixels
+
+
+def test_field_cache(universe):
+    cache = FieldCache(maxsize=1)
+    first = cache.get(universe.layout, (0,0), layout_version=0)
+    assert cache.get(universe.layout, (0,0), layout_version=0) is first
+    cache.get(universe.layout, (4,4), layout_version=0)  # Evicts the first one
+    assert cache.get(universe.layout, (0,0), layout_version=0) is not first
+    assert cache.get(universe.layout, (0,0), layout_version=1) is not first
+    assert cache.misses == 4
+    assert cache.hits == 1
+
+
+def test_path_until_touch(universe):
+    path = FlowFieldStrategy.calculate_path(universe, (4,0), (4,3), n_steps=0)
+    assert len(path) == 10  # Around the rack, and stop next to the target
+    y, x = 4, 0
+    for dy, dx in path:
+        y, x = y+dy, x+dx
+        assert universe.layout[y, x] == 0
+    assert abs(y-4) + abs(x-3) == 1
+
+
+def test_partial_and_shared_paths(universe):
+    first = FlowFieldStrategy.calculate_path(universe, (4,0), (4,4), n_steps=2, until_touch=False)
+    assert first == [(-1,0), (-1,0)]
+    FlowFieldStrategy.calculate_path(universe, (3,0), (4,4), until_touch=False)
+    assert universe.field_cache.misses == 1  # Both robots used the same field
+    assert universe.field_cache.hits == 1
+
+
+def test_sidestep_when_blocked(universe):
+    universe.layout[:] = 0
+    universe.occupancy[0,1] = grid_codes['robot']  # Someone is standing in the way
+    path = FlowFieldStrategy.calculate_path(universe, (0,0), (0,4), n_steps=1, until_touch=False)
+    assert path == [(1,0)]
@@ -0,0 +1,59 @@
+import pytest
+from unittest.mock import MagicMock
+import numpy as np
+
+from robowh.strategies import JPSStrategy
+from robowh import astar, jps
+
+
+@pytest.fixture(autouse=True)
+def universe():
+    mock = MagicMock()
+    mock.grid = np.zeros((5, 5), dtype=int)
+    mock.planning_view = lambda robots=True: mock.grid
+    mock.path_cache = None
+
+    return mock
+
+
+def test_same_lengths_as_astar():
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        h, w = rng.integers(2, 12, size=2)
+        grid = (rng.random((h, w)) < 0.3).astype(int)
+        start = tuple(rng.integers(0, [h, w]))
+        goal = tuple(rng.integers(0, [h, w]))
+        grid[start] = 0
+        for until_touch in (True, False):
+            path = jps.find_path(grid, start, goal, until_touch)
+            assert len(path) == len(astar.find_path(grid, start, goal, until_touch))
+            if path:
+                assert path[0] == start
+            for (y0, x0), (y1, x1) in zip(path[:-1], path[1:]):
+                assert abs(y1-y0) + abs(x1-x0) == 1
+                assert grid[y1, x1] == 0
+
+def test_blocked_start_as_in_astar():
+    """Robots plan from their own pixel, which is blocked: A* never checks the start."""
+    grid = np.zeros((5, 5), dtype=int)
+    grid[2, 2] = 1
+    for goal in ((2, 2), (1, 2), (2, 3), (3, 2), (2, 1), (0, 0)):
+        for until_touch in (True, False):
+            path = jps.find_path(grid, (2, 2), goal, until_touch)
+            assert len(path) == len(astar.find_path(grid, (2, 2), goal, until_touch))
+    assert jps.find_path(grid, (2, 2), (2, 3)) == [(2, 2)]  # Next to the goal already
+    assert jps.find_path(grid, (2, 2), (2, 2), until_touch=False) == [(2, 2)]
+
+def test_open_area_is_cheap():
+    grid = np.zeros((60, 60), dtype=int)
+    grid[10:50, 30] = 1
+    stats = {}
+    path = jps.find_path(grid, (30, 0), (30, 59), until_touch=False, stats=stats)
+    assert len(path) == 59 + 2*20 + 1  # Around the bottom end of the wall
+    assert stats['expanded'] < 20  # A* would expand hundreds of pixels here
+
+def test_strategy_deltas(universe):
+    universe.grid[0:3, 2] = 1
+    path = JPSStrategy.calculate_path(universe, (0,0), (0,4), until_touch=False)
+    assert len(path) == 10
+    assert path[:3] == [(1,0), (1,0), (1,0)]  # Vertical moves go first
@@ -0,0 +1,34 @@
+import numpy as np
+
+from robowh.observer import TickProfiler
+from robowh.universe import Universe
+
+
+def test_ring_buffer_keeps_the_last_ticks():
+    profiler = TickProfiler(capacity=4)
+    for tick in range(10):
+        profiler.start_tick(tick)
+        with profiler.timed('planning'):
+            pass
+        profiler.end_tick(acted=[0], n_robots=3)
+    assert list(profiler.history()['tick']) == [6, 7, 8, 9]
+    assert list(profiler.history(last=2)['tick']) == [8, 9]
+    assert profiler.history()['n_skipped'].tolist() == [2, 2, 2, 2]
+    assert list(profiler.starvation) == [0, 10, 10]
+    assert profiler.summary()['share_acted'] == 1/3
+
+
+def test_skipped_robots_are_counted():
+    universe = Universe(seed=5, robots_per_tick=10)
+    universe.step(20)
+    profiler = universe.observer.profiler
+
+    records = profiler.history()
+    assert len(records) == 20
+    assert (records['n_acted'] == 10).all()
+    assert (records['n_skipped'] == universe.N_ROBOTS - 10).all()
+    assert (records['wall'] >= records['planning']).all()
+    assert profiler.starvation.max() > 0
+    summary = profiler.summary()
+    assert summary['share_acted'] == 10 / universe.N_ROBOTS
+    assert summary['planning_ms'] > 0
@@ -0,0 +1,77 @@
+import pytest
+from unittest.mock import MagicMock
+import numpy as np
+
+from robowh.pathcache import PathCache
+from robowh.strategies import AStarStrategy
+from robowh.utils import grid_codes
+
+
+@pytest.fixture
+def universe():
+    mock = MagicMock()
+    mock.layout = np.zeros((5, 5), dtype=int)
+    mock.occupancy = np.zeros((5, 5), dtype=int)
+    mock.planning_view = lambda robots=True: (
+        np.maximum(mock.layout, mock.occupancy) if robots else mock.layout
+        )
+    mock.layout_version = 0
+    mock.path_cache = PathCache()
+
+    return mock
+
+
+def test_hits_and_suffixes():
+    cache = PathCache()
+    path = ((0,0), (0,1), (0,2), (1,2))
+    assert cache.get((0,0), (1,2), layout_version=0) is None
+    cache.put((0,0), (1,2), path, layout_version=0)
+
+    assert cache.get((0,0), (1,2), layout_version=0) == path
+    assert cache.get((0,2), (1,2), layout_version=0) == ((0,2), (1,2))  # Middle of the route
+    assert cache.get((0,2), (4,4), layout_version=0) is None  # Other goal
+    assert cache.hits == 2
+    assert cache.misses == 2
+
+
+def test_layout_version_invalidates():
+    cache = PathCache()
+    cache.put((0,0), (0,1), ((0,0), (0,1)), layout_version=0)
+    assert cache.get((0,0), (0,1), layout_version=1) is None
+    assert len(cache) == 0
+
+
+def test_lru_eviction():
+    cache = PathCache(maxsize=2)
+    cache.put((0,0), (0,9), ((0,0), (0,9)), layout_version=0)
+    cache.put((1,0), (1,9), ((1,0), (1,9)), layout_version=0)
+    cache.get((0,0), (0,9), layout_version=0)  # Now (1,0) is the least recently used one
+    cache.put((2,0), (2,9), ((2,0), (2,9)), layout_version=0)
+
+    assert len(cache) == 2
+    assert cache.get((1,0), (1,9), layout_version=0) is None
+    assert cache.get((0,0), (0,9), layout_version=0) is not None
+    assert cache.get((2,0), (2,9), layout_version=0) is not None
+
+
+def test_strategy_uses_cache(universe):
+    first = AStarStrategy.calculate_path(universe, (0,0), (0,4), until_touch=False)
+    second = AStarStrategy.calculate_path(universe, (0,0), (0,4), until_touch=False)
+    assert first == second == [(0,1)] * 4
+    assert universe.path_cache.misses == 1
+    assert universe.path_cache.hits == 1
+
+
+def test_cached_path_is_repaired_around_robots(universe):
+    # Cache the straight route
+    AStarStrategy.calculate_path(universe, (0,0), (0,4), until_touch=False)
+    universe.occupancy[0, 2] = grid_codes['robot']  # And then a robot steps on it
+
+    path = AStarStrategy.calculate_path(universe, (0,0), (0,4), until_touch=False)
+    assert len(path) == 6
+    y, x = 0, 0
+    for dy, dx in path:
+        y, x = y+dy, x+dx
+        assert (y, x) != (0, 2)
+    assert (y, x) == (0, 4)
+    assert universe.path_cache.repairs == 1
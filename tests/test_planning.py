@@ -0,0 +1,78 @@
+import pytest
+from unittest.mock import MagicMock
+import numpy as np
+
+from robowh.universe import Universe
+from robowh.pathcache import PathCache
+from robowh.planning import PlannerPool
+from robowh.strategies import AStarStrategy, JPSStrategy
+
+
+@pytest.fixture
+def universe():
+    rng = np.random.default_rng(1)
+    mock = MagicMock()
+    mock.layout = np.where(rng.random((30, 30)) < 0.2, 1, 0)
+    mock.occupancy = np.where(rng.random((30, 30)) < 0.05, 2, 0) * (mock.layout == 0)
+    mock.planning_view = lambda robots=True: (
+        np.maximum(mock.layout, mock.occupancy) if robots else mock.layout
+        )
+    mock.layout_version = 0
+    mock.path_cache = PathCache()
+    return mock
+
+
+def random_requests(universe, n):
+    rng = np.random.default_rng(2)
+    free = [tuple(int(c) for c in p) for p in np.argwhere(universe.planning_view() == 0)]
+    picks = rng.choice(len(free), size=(n, 2))
+    # Some requests share targets, and some start on routes of others: the cache matters
+    return [(free[a], free[b % 5], f"R{k}") for k, (a, b) in enumerate(picks)]
+
+
+@pytest.mark.parametrize("use_cache", [True, False])
+@pytest.mark.parametrize("strategy", [AStarStrategy, JPSStrategy])
+def test_batch_matches_serial(universe, monkeypatch, strategy, use_cache):
+    monkeypatch.setattr(strategy, "use_cache", use_cache)
+    requests = random_requests(universe, 40)
+    serial = [strategy.calculate_path(universe, c, t, agent=a) for c, t, a in requests]
+
+    universe.path_cache = PathCache()
+    pool = PlannerPool(3, processes=False)
+    pool.min_batch = 1
+    assert strategy.calculate_paths(universe, requests, pool=pool) == serial
+    pool.close()
+
+
+@pytest.mark.parametrize("strategy", [AStarStrategy, JPSStrategy])
+def test_batch_survives_evictions(universe, strategy):
+    # Routes that were cached when the batch started get pushed out by earlier requests
+    requests = random_requests(universe, 40)
+    def warm_up():
+        universe.path_cache = PathCache(maxsize=2)
+        for c, t, a in requests[::-7]:  # The last ones to go in are needed early on
+            strategy.calculate_path(universe, c, t, agent=a)
+    warm_up()
+    serial = [strategy.calculate_path(universe, c, t, agent=a) for c, t, a in requests]
+
+    warm_up()
+    pool = PlannerPool(3, processes=False)
+    pool.min_batch = 1
+    assert strategy.calculate_paths(universe, requests, pool=pool) == serial
+    pool.close()
+
+
+def run(workers, n_ticks=40):
+    universe = Universe(seed=5, planning_workers=workers)
+    universe.planner.min_batch = 1  # Always use the pool
+    universe.step(n_ticks)
+    universe.close()
+    return universe.grid, universe.observer.n_tasks, universe.planner
+
+def test_results_dont_depend_on_workers():
+    grid_one, tasks_one, planner = run(1)
+    grid_many, tasks_many, _ = run(3)
+    assert planner.n_planned > 0
+    assert tasks_one > 0
+    assert tasks_one == tasks_many
+    assert np.array_equal(grid_one, grid_many)
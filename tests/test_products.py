@@ -0,0 +1,39 @@
+import pytest
+
+from robowh.products import ProductRegistry, product_name
+from robowh.universe import Universe
+
+
+def test_ids_are_compact_and_reused():
+    registry = ProductRegistry()
+    assert [registry.new() for _ in range(3)] == [0, 1, 2]
+    registry.retire(1)
+    registry.retire(0)
+    assert 1 not in registry and len(registry) == 1
+    with pytest.raises(ValueError):
+        registry.retire(1)  # Already gone
+    assert registry.new_many(3) == [0, 1, 3]  # Retired ids go first, the last one first
+    assert registry.capacity == 4 and len(registry) == 4
+
+    many = registry.new_many(5000)  # Grows as needed
+    assert many == list(range(4, 5004)) and all(product in registry for product in many)
+
+
+def test_checkpoint_and_restore():
+    registry = ProductRegistry()
+    registry.new_many(10)
+    for product in (3, 7):
+        registry.retire(product)
+    restored = ProductRegistry()
+    restored.restore(registry.checkpoint())
+    assert len(restored) == 8 and 3 not in restored and 4 in restored
+    assert restored.new_many(3) == registry.new_many(3) == [7, 3, 10]
+
+
+def test_universe_products():
+    universe = Universe(seed=0, n_robots=5)
+    assert len(universe.products) == universe.shelves.n_items
+    universe.step(50)  # Products are moved around (some by robots), but none are created or lost
+    stored = universe.shelves.n_items + universe.bays.n_items
+    assert len(universe.products) - universe.N_ROBOTS <= stored <= len(universe.products)
+    assert product_name(255) == "000000ff"
@@ -0,0 +1,111 @@
+import marshal
+import pytest
+import sys
+import threading
+import time
+
+from robowh.profiling import CaptureBusyError, module_of
+from robowh.robot import Robot
+from robowh.universe import Universe
+
+
+def test_sampling_capture_runs_for_n_ticks():
+    universe = Universe(seed=0, n_robots=20)
+    universe.step(5)
+    capture = universe.profile(ticks=100, interval=0.0005)
+    with pytest.raises(CaptureBusyError):
+        universe.profile(ticks=1)
+    universe.step(110)
+    assert capture.wait(0)
+    assert capture.n_ticks == 100
+    assert universe.capture is None  # Switched off, and a new capture may start
+    assert capture.stacks  # Robots were moving, planning, and so on
+
+    lines = capture.collapsed().splitlines()
+    stacks = [line.rsplit(" ", 1)[0].split(";") for line in lines]
+    assert all(int(line.rsplit(" ", 1)[1]) >= 1 for line in lines)
+    assert all("universe:tick" in stack for stack in stacks)
+    assert "robot" in {frame.split(":")[0] for stack in stacks for frame in stack}
+    summary = capture.summary()
+    assert summary["n_ticks"] == 100 and summary["n_samples"] == sum(capture.stacks.values())
+
+
+def test_cprofile_capture_gives_pstats_by_module():
+    universe = Universe(seed=0, n_robots=20)
+    universe.step(5)
+    capture = universe.profile(ticks=50, mode="cprofile")
+    universe.step(50)
+    assert capture.done.is_set()
+
+    by_module = capture.by_module()
+    assert {"astar", "robot", "universe"} <= set(by_module)
+    assert "test_profiling" not in by_module  # Only the ticks are captured
+    stats = marshal.loads(capture.pstats_dump())
+    assert any(function == "tick" for (_, _, function) in stats)
+    assert "cumulative" in capture.pstats_text(limit=5)
+    assert capture.collapsed() == ""  # No samples in this mode
+
+
+def test_capture_arguments_are_checked():
+    universe = Universe(seed=0, n_robots=1)
+    for kwargs in (dict(), dict(ticks=1, seconds=1), dict(ticks=0), dict(ticks=1, mode="perf")):
+        with pytest.raises(ValueError):
+            universe.profile(**kwargs)
+    assert universe.capture is None
+
+
+def test_module_names():
+    assert module_of("/src/robowh/astar.py") == "astar"
+    assert module_of("/usr/lib/python3.11/json/__init__.py") == "json"
+    assert module_of("/venv/lib/python3.11/site-packages/numpy/core/numeric.py") == "numpy"
+    assert module_of("~", "<built-in method _heapq.heappop>") == "heapq"
+    assert module_of("~", "<method 'append' of 'list' objects>") == "builtins"
+
+
+def test_cancelled_captures_switch_off():
+    universe = Universe(seed=0, n_robots=5)
+    capture = universe.profile(ticks=10)
+    capture.cancel()  # Before it even started
+    assert capture.done.is_set() and universe.capture is None
+
+    capture = universe.profile(ticks=1000, mode="cprofile")
+    universe.step(3)
+    thread = threading.Thread(target=capture.cancel)  # Like the viewer does on a timeout
+    thread.start()
+    thread.join()
+    assert not capture.done.is_set()  # cProfile can only be stopped in the simulation thread
+    universe.step(1)
+    assert capture.done.is_set() and universe.capture is None
+    assert sys.getprofile() is None
+    assert capture.n_ticks == 3
+
+
+def test_failed_tick_stops_the_profiler(monkeypatch):
+    universe = Universe(seed=0, n_robots=5)
+    capture = universe.profile(ticks=100, mode="cprofile")
+    universe.step(2)
+    monkeypatch.setattr(Robot, "act", lambda robot: 1/0)
+    with pytest.raises(ZeroDivisionError):
+        universe.step(1)
+    assert capture.done.is_set() and universe.capture is None
+    assert sys.getprofile() is None
+
+
+def test_viewer_limits_and_cancels_captures():
+    pytest.importorskip("flask")
+    from robowh.viewer import Viewer
+
+    universe = Universe(seed=0, n_robots=5)
+    tick = universe.tick
+    def slow_tick(deadline=None):  # Much slower than the viewer expects (0.1 s per tick)
+        tick(deadline)
+        time.sleep(1)
+    universe.tick = slow_tick
+    viewer = Viewer(universe)  # Which starts running ticks
+    viewer.MAX_PROFILE_SECONDS = 0.2  # So, at most 2 ticks
+    client = viewer.app.test_client()
+    assert client.get('/profile?ticks=100000000&mode=cprofile').status_code == 400
+    assert universe.capture is None
+    assert client.get('/profile?ticks=2').status_code == 504
+    assert universe.capture is None  # Cancelled, so the next one may start
+    assert client.get('/profile?ticks=2').status_code == 504
@@ -0,0 +1,71 @@
+import pytest
+from unittest.mock import MagicMock
+import numpy as np
+
+from robowh.flowfield import FieldCache
+from robowh.reservations import ReservationTable
+from robowh.strategies import CooperativeAStarStrategy
+from robowh.utils import grid_codes
+
+
+@pytest.fixture
+def universe():
+    mock = MagicMock()
+    mock.layout = np.zeros((3, 6), dtype=int)
+    mock.layout[0, :] = grid_codes['shelf']  # A corridor along the middle row,
+    mock.layout[2, 1:5] = grid_codes['shelf']  # with pockets at both ends of the bottom row
+    mock.occupancy = np.zeros((3, 6), dtype=int)
+    mock.planning_view = lambda robots=True: mock.layout
+    mock.layout_version = 0
+    mock.field_cache = FieldCache()
+    mock.reservations = ReservationTable()
+    mock.n_ticks = 10
+
+    return mock
+
+
+def walk(start, path):
+    positions = [start]
+    for dy, dx in path:
+        positions.append((positions[-1][0]+dy, positions[-1][1]+dx))
+    return positions
+
+
+def test_reservation_table():
+    table = ReservationTable()
+    table.reserve("A", [((1,1), 5), ((1,2), 6)])
+    table.reserve("B", [((1,2), 6), ((1,3), 7)])  # (1,2) at 6 is taken already
+    assert table.owner((1,2), 6) == "A"
+    assert table.is_reserved((1,2), 6, agent="B")
+    assert not table.is_reserved((1,2), 6, agent="A")
+    assert len(table) == 3
+
+    table.release("A")
+    assert table.owner((1,2), 6) is None
+    table.expire(before_tick=8)
+    assert len(table) == 0
+
+
+def test_plans_are_reserved(universe):
+    path = CooperativeAStarStrategy.calculate_path(universe, (1,0), (1,5), n_steps=4,
+                                                   until_touch=False, agent="A")
+    assert path == [(0,1)] * 4
+    for k, point in enumerate(walk((1,0), path)):
+        assert universe.reservations.owner(point, 9+k) == "A"
+
+
+def test_head_on_robots_dont_collide(universe):
+    # A goes right along the corridor, B comes from the other end and has to let it pass
+    path_a = CooperativeAStarStrategy.calculate_path(universe, (1,0), (1,5), n_steps=8,
+                                                     until_touch=False, agent="A")
+    universe.occupancy[1,0] = grid_codes['robot']
+    path_b = CooperativeAStarStrategy.calculate_path(universe, (1,5), (1,0), n_steps=8,
+                                                     until_touch=False, agent="B")
+    a = walk((1,0), path_a)
+    b = walk((1,5), path_b)
+    b += [b[-1]] * (len(a) - len(b))
+    a += [a[-1]] * (len(b) - len(a))
+    for k in range(1, len(a)):
+        # Never on the same pixel, and with a one-tick margin, as robots act in random order
+        assert b[k] not in a[k-1:k+2]
+    assert (2,5) in b  # B waits in the pocket
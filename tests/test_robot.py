@@ -9,7 +9,7 @@ from robowh.strategies import RandomMovementStrategy, AStarStrategy
 @pytest.fixture
 def universe() -> Universe:
     """Create a test universe instance."""
-    universe = Universe.get_universe()
+    universe = Universe()
     universe.grid = np.zeros((10, 10), dtype=int)  # Small test grid
     return universe
 
@@ -17,6 +17,7 @@ def universe() -> Universe:
 def robot(universe: Universe) -> Robot:
     """Create a test robot with random movement strategy."""
     return Robot(
+        universe,
         name="TestBot",
         strategy=RandomMovementStrategy
     )
@@ -51,10 +52,47 @@ def test_robot_initialization(robot: Robot) -> None:
 ])
 def test_robot_different_strategies(universe: Universe, strategy_class: type) -> None:
     """Test robot creation with different movement strategies."""
-    robot = Robot(name="StrategyBot", strategy=strategy_class)
+    robot = Robot(universe, name="StrategyBot", strategy=strategy_class)
     assert robot.strategy == strategy_class
     assert callable(robot.strategy.calculate_path)
 
+def test_plan_round_trip(robot: Robot) -> None:
+    """Test that every move survives the encoding of plans into bytes."""
+    moves = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+    robot._set_plan(moves)
+    assert robot.next_moves == moves
+    robot.next_moves = moves[::-1]
+    assert robot.next_moves == moves[::-1]
+
+def test_plan_is_used_up_in_order(robot: Robot) -> None:
+    """Test that moves are taken from the plan one by one, from the start."""
+    moves = [(1, 0), (0, 1), (0, 0), (-1, 0)]
+    robot._set_plan(moves)
+    for k, move in enumerate(moves):
+        assert robot._has_plan()
+        assert robot._next_move() == move
+        assert robot.next_moves == moves[k+1:]
+    assert not robot._has_plan()
+    robot._set_plan([(0, -1)])  # A new plan starts from its beginning
+    assert robot._next_move() == (0, -1)
+
+def test_action_queue_drains_and_resets(robot: Robot) -> None:
+    """Test that actions are taken in order, and that the drained queue starts over."""
+    robot.assign_task("transfer", origin=(1, 1), destination=(5, 5), product=7)
+    assert [action[0] for action in robot.pending_actions] == ["go", "pick", "go", "drop"]
+    assert robot._next_action() == ("go", (1, 1), None)
+    assert robot._next_action() == ("pick", (1, 1), 7)
+    assert robot.pending_actions == [("go", (5, 5), None), ("drop", (5, 5), 7)]
+    robot._next_action()
+    assert robot._next_action() == ("drop", (5, 5), 7)
+    assert robot.pending_actions == [] and robot.action_queue == [] and robot._action_pos == 0
+
+    robot.assign_task("reposition", destination=(2, 2))
+    assert robot.pending_actions == [("go", (2, 2), None)]
+    robot.pending_actions = [("go", (3, 3), None)]  # Replaces the queue
+    assert robot._next_action() == ("go", (3, 3), None)
+    assert robot.pending_actions == []
+
 @pytest.mark.skip
 def test_robot_movement_bounds(robot: Robot) -> None:
     """Test that robot stays within grid bounds."""
@@ -4,25 +4,22 @@ logger = logging.getLogger(__name__)
 import pytest
 from unittest.mock import MagicMock
 import numpy as np
+import random
 
-from robowh.shelves import Shelves
+from robowh.shelves import Shelves, ShelvesFullError
 from robowh.utils import grid_codes
 
 
 @pytest.fixture(autouse=True)
-def universe(monkeypatch):
+def universe():
     mock = MagicMock()
     mock.grid = np.zeros((5, 5), dtype=int)
 
-    monkeypatch.setattr(
-        "robowh.strategies.Universe.get_universe",
-        lambda: mock
-    )
     return mock
 
 
 def test_add_shelf(universe):
-    sh = Shelves("main")
+    sh = Shelves(universe, "main")
     assert sh.name == "main"
     assert len(sh.coords) == 0
     sh.add_shelf((2,2), empty=True)
@@ -33,79 +30,136 @@ def test_add_shelf(universe):
 
 
 def test_place_stuff(universe):
-    sh = Shelves()
+    sh = Shelves(universe)
     for i in range(5):
         sh.add_shelf((2,i), empty=True)
     assert sh.n_items == 0
     assert len(sh.coords) == 5
 
-    sh.place_at(2, "product2")
-    sh.place_at(0, "product0")
+    sh.place_at(2, 2)
+    sh.place_at(0, 0)
 
     assert sh.n_items == 2
-    assert len(sh.records) == 2
-    assert sh.records["product2"] == 2
-    assert sh.inventory[2][0] == "product2"
+    assert (sh.records >= 0).sum() == 2
+    assert sh.index_of(2) == 2
+    assert sh.inventory[2][0] == 2
     assert sh.coords[2] == (2,2)
     assert universe.grid[2,2] == grid_codes['item']
 
     with pytest.raises(Exception):
-        sh.place_at(1, "product2")  # This product already exists
+        sh.place_at(1, 2)  # This product already exists
     with pytest.raises(Exception):
-        sh.place_at(2, "product_other")  # This place is already taken
+        sh.place_at(2, 99)  # This place is already taken
 
 
 def test_remove_from_shelf(universe):
-    sh = Shelves()
+    sh = Shelves(universe)
     for i in range(5):
         sh.add_shelf((2,i), empty=True)
-        sh.place_at(i, str(i))
+        sh.place_at(i, i)
     assert sh.n_items == 5
     assert len(sh.coords) == 5
 
-    sh.remove(2, "2")
+    sh.remove(2, 2)
     assert sh.n_items == 4
-    assert len(sh.records) == 4
-    assert sh.records["3"] == 3
-    assert "2" not in sh.records
+    assert (sh.records >= 0).sum() == 4
+    assert sh.index_of(3) == 3
+    assert sh.index_of(2) is None
     assert not sh.inventory[2]
     assert universe.grid[2,2] == grid_codes['shelf']
 
 
 def test_place_optimally(universe):
-    sh = Shelves()
+    sh = Shelves(universe)
     for i in range(5):
         sh.add_shelf((2,i), empty=True)
         if i in [2,3]:  # But not 0, 1 or 4!
-            sh.place_at(i, str(i))
+            sh.place_at(i, 10 + i)
     assert [int(bool(p)) for p in sh.inventory] == [0, 0, 1, 1, 0]
     i = sh.request_optimal_placement()
-    sh.place_at(i, "product0")
+    sh.place_at(i, 0)
     assert [int(bool(p)) for p in sh.inventory] == [1, 0, 1, 1, 0]
     i = sh.request_optimal_placement()
-    sh.place_at(i, "product1")
+    sh.place_at(i, 1)
     assert [int(bool(p)) for p in sh.inventory] == [1, 1, 1, 1, 0]
     i = sh.request_optimal_placement()
-    sh.place_at(i, "product2")
+    sh.place_at(i, 2)
     assert [int(bool(p)) for p in sh.inventory] == [1, 1, 1, 1, 1]
 
     with pytest.raises(Exception):
-        sh.place_optimally("product2")  # This product already exists
+        sh.place_optimally(2)  # This product already exists
 
 
 def test_deep_shelves(universe):
-    sh = Shelves(deep=True)
+    sh = Shelves(universe, deep=True)
     for i in range(5):
         sh.add_shelf((2,i), empty=True)
 
-    sh.place_at(1, "product11")
-    sh.place_at(1, "product12")
-    sh.place_at(2, "product2")
-    sh.place_at(3, "product3")
+    sh.place_at(1, 11)
+    sh.place_at(1, 12)
+    sh.place_at(2, 2)
+    sh.place_at(3, 3)
     assert sh.n_items == 4
     assert len(sh.inventory[1]) == 2
 
-    sh.remove(sh.records["product11"], "product11")
-    sh.remove(sh.records["product2"], "product2")
+    sh.remove(sh.index_of(11), 11)
+    sh.remove(sh.index_of(2), 2)
     assert sh.n_items == 2
-    assert sh.inventory[1][0] == "product12"
\ No newline at end of file
+    assert sh.inventory[1][0] == 12
+
+def test_index_at(universe):
+    sh = Shelves(universe)
+    sh.add_shelf((2,3), empty=True)
+    sh.add_shelf((4,0), empty=True)
+    assert sh.index_at(2,3) == 0
+    assert sh.index_at(4,0) == 1
+    assert sh.index_at(0,0) is None
+    assert sh.index_at(-1,3) is None  # Negative indices must not wrap around
+    assert sh.index_at(2,5) is None
+
+
+def test_placement_with_locks_and_priorities(universe):
+    sh = Shelves(universe)
+    for i in range(4):
+        sh.add_shelf((2,i), empty=True)
+    sh.prioritize_by_distance([(2,4)])  # Now the last shelf is the best one
+    assert sh.request_optimal_placement() == 3
+
+    sh.lock(3)
+    assert sh.request_optimal_placement() == 2
+    sh.place_at(2, 1)
+    assert sh.request_optimal_placement() == 1
+    sh.unlock(3)
+    assert sh.request_optimal_placement() == 3
+    sh.remove(2, 1)
+    sh.place_at(3, 2)
+    assert sh.request_optimal_placement() == 2
+
+
+def test_full_shelves(universe):
+    sh = Shelves(universe)
+    for i in range(2):
+        sh.add_shelf((2,i), empty=True)
+    sh.place_at(0, 1)
+    sh.lock(1)
+    with pytest.raises(ShelvesFullError):
+        sh.request_optimal_placement()
+    sh.unlock(1)
+    assert sh.request_optimal_placement() == 1
+
+
+def test_pick_random_product(universe):
+    universe.rng = random.Random(0)
+    sh = Shelves(universe)
+    for i in range(3):
+        sh.add_shelf((2,i), empty=True)
+    assert sh.pick_random_product_for_delivery() is None
+    sh.place_at(0, 1)
+    sh.place_at(1, 2)
+    sh.lock(0, 1)
+    assert {sh.pick_random_product_for_delivery() for _ in range(10)} == {2}
+
+    sh.remove(1, 2)
+    assert sh.pick_random_product_for_delivery() is None  # 1 is locked, 2 is gone
+    sh.unlock(0, 1)
+    assert sh.pick_random_product_for_delivery() == 1
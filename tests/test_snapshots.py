@@ -0,0 +1,63 @@
+import pytest
+import numpy as np
+
+from robowh.snapshots import SnapshotBuffer
+from robowh.universe import Universe
+
+
+def test_snapshots_are_immutable_copies():
+    grid = np.zeros((3, 4), dtype=int)
+    buffer = SnapshotBuffer(grid.shape)
+    assert buffer.latest() is None
+
+    first = buffer.publish(grid, tick=0)
+    grid[1, 1] = 2
+    assert first.grid[1, 1] == 0  # Later changes don't leak into published snapshots
+    with pytest.raises(ValueError):
+        first.grid[0, 0] = 1
+
+    second = buffer.publish(grid, tick=1)
+    assert buffer.latest() is second
+    assert second.version == first.version + 1 and second.grid[1, 1] == 2
+    assert first.is_valid()  # Still there, in the other buffer
+
+    buffer.publish(grid, tick=2)
+    assert not first.is_valid()  # Its buffer was reused
+    assert second.is_valid()
+
+
+def test_universe_publishes_every_tick():
+    universe = Universe(seed=1)
+    universe.step(2)
+    assert universe.snapshots.latest() is None  # Nobody asked for snapshots yet
+    universe.publish_snapshots()
+    assert universe.snapshots.latest().tick == 2
+    universe.step(5)
+    snapshot = universe.snapshots.latest()
+
+    assert snapshot.tick == 7 and snapshot.version == 6
+    assert np.array_equal(snapshot.grid, universe.grid)
+
+
+def test_changes_since():
+    grid = np.zeros((3, 4), dtype=int)
+    buffer = SnapshotBuffer(grid.shape, history=2)
+    buffer.publish(grid, tick=0)
+    grid[0, 1] = 2
+    buffer.publish(grid, tick=1)
+    grid[0, 1] = 0
+    grid[2, 3] = 5
+    buffer.publish(grid, tick=2)
+
+    indices, codes, tick = buffer.changes_since(1)
+    assert tick == 2 and indices.tolist() == [1, 11] and codes.tolist() == [0, 5]
+    indices, codes, tick = buffer.changes_since(0)  # Changes are merged, the last one wins
+    assert tick == 2 and indices.tolist() == [1, 11] and codes.tolist() == [0, 5]
+    grid[1, 0] = 1
+    buffer.publish(grid, tick=3)
+    indices, codes, tick = buffer.changes_since(1)
+    assert tick == 3 and indices.tolist() == [1, 4, 11] and codes.tolist() == [0, 1, 5]
+    assert len(buffer.changes_since(3)[0]) == 0  # Nothing new
+
+    assert buffer.changes_since(0) is None  # Too old, only 2 deltas are kept
+    assert buffer.changes_since(1) is not None
@@ -0,0 +1,33 @@
+import csv
+
+from robowh.sweep import configurations, sweep, format_table, write_csv
+
+
+def test_configurations():
+    configs = configurations(strategy=["astar", "jps"], seed=[1, 2, 3])
+    assert len(configs) == 6
+    assert configs[0] == {"strategy": "astar", "seed": 1}
+    assert configs[-1] == {"strategy": "jps", "seed": 3}
+
+
+def test_sweep_in_processes_matches_serial():
+    configs = configurations(strategy=["astar", "flowfield"], n_robots=[5, 10], grid_size=[20],
+                             seed=[4])
+    rows = sweep(configs, n_ticks=30, workers=2)
+    assert [(row["strategy"], row["n_robots"]) for row in rows] == [
+        ("astar", 5), ("astar", 10), ("flowfield", 5), ("flowfield", 10)
+        ]
+    serial = sweep(configs, n_ticks=30, workers=1)
+    assert [row["n_tasks"] for row in rows] == [row["n_tasks"] for row in serial]
+    assert sum(row["n_tasks"] for row in rows) > 0
+    assert len(format_table(rows).splitlines()) == 1 + len(rows)
+
+
+def test_csv(tmp_path):
+    rows = [{"strategy": "astar", "n_tasks": 3}, {"strategy": "jps", "n_tasks": 4}]
+    write_csv(rows, tmp_path / "rows.csv")
+    with open(tmp_path / "rows.csv", newline="") as f:
+        assert list(csv.DictReader(f)) == [{"strategy": "astar", "n_tasks": "3"},
+                                           {"strategy": "jps", "n_tasks": "4"}]
+    write_csv([], tmp_path / "empty.csv")  # Nothing to write, not even a header
+    assert (tmp_path / "empty.csv").read_text() == "" and format_table([]) == ""
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from robowh.trace import EVENTS, TraceReplay
+from robowh.universe import Universe
+from robowh.utils import grid_codes
+
+
+@pytest.mark.parametrize("fleet", [False, True])
+def test_replay_rebuilds_the_grid_at_every_tick(tmp_path, fleet):
+    universe = Universe(seed=1, fleet=fleet)
+    universe.step(3)  # Recording may start at any point of the run
+    universe.record(str(tmp_path), keyframe_every=40)
+    grids = {}
+    for _ in range(100):
+        grids[universe.n_ticks] = universe.grid.copy()
+        universe.step(1)
+    grids[universe.n_ticks] = universe.grid.copy()
+    universe.close()
+
+    replay = TraceReplay(str(tmp_path))
+    assert (replay.first_tick, replay.last_tick) == (3, 103)
+    assert replay.keyframes["tick"].tolist() == [3, 40, 80]
+    for tick, grid in grids.items():
+        assert np.array_equal(replay.grid_at(tick), grid), tick
+    positions = [(robot.x, robot.y) for robot in universe.robots]
+    assert replay.robots_at(103)[:, :2].tolist() == [list(p) for p in positions]
+    with pytest.raises(ValueError):
+        replay.grid_at(2)  # Before the recording
+
+
+def test_events_of_picks_and_drops(tmp_path):
+    universe = Universe(seed=1)
+    recorder = universe.record(str(tmp_path))
+    universe.step(100)
+    recorder.flush()  # The run may go on, and still the trace can be read
+
+    replay = TraceReplay(str(tmp_path))
+    events = replay.events_between(0, 100)
+    assert len(events) == len(replay.events) == recorder.n_events
+    assert np.all(np.diff(events["tick"].astype(int)) >= 0)
+    picks = events[events["kind"] == EVENTS.index("pick")]
+    drops = events[events["kind"] == EVENTS.index("drop")]
+    assert len(picks) and len(drops)
+    # Products that were dropped onto the racks (and not picked since) are still there
+    last_event = {}
+    for event in events[events["kind"] != EVENTS.index("move")]:
+        last_event[int(event["product"])] = event
+    on_racks = set(np.flatnonzero(universe.shelves.records >= 0).tolist())
+    for product, event in last_event.items():
+        dropped = event["kind"] == EVENTS.index("drop")
+        at_racks = universe.shelves.index_at(event["x"], event["y"]) is not None
+        assert (product in on_racks) == (dropped and at_racks)
+    # A robot that stays in place, with the same state, leaves no records
+    moves = events[events["kind"] == EVENTS.index("move")]
+    for robot in range(len(universe.robots)):
+        mine = moves[moves["robot"] == robot][["x", "y", "code"]]
+        assert all(a != b for a, b in zip(mine[:-1].tolist(), mine[1:].tolist()))
+    assert set(moves["code"]) <= {grid_codes['robot'], grid_codes['confused']}
+    universe.close()
+
+
+def test_recording_needs_a_tick(tmp_path):
+    universe = Universe(seed=1, n_robots=2)
+    universe.record(str(tmp_path))
+    with pytest.raises(ValueError):
+        universe.record(str(tmp_path))  # One trace at a time
+    universe.close()
+    with pytest.raises(ValueError):
+        TraceReplay(str(tmp_path))  # Nothing was recorded
+
+
+def test_viewer_scrubs_through_a_trace(tmp_path):
+    pytest.importorskip("flask")
+    from robowh.viewer import Viewer
+
+    universe = Universe(seed=1, n_robots=5)
+    universe.record(str(tmp_path))
+    universe.step(20)
+    universe.close()
+    client = Viewer(replay=TraceReplay(str(tmp_path))).app.test_client()
+
+    info = client.get('/replay/info').get_json()
+    assert (info["first_tick"], info["last_tick"]) == (0, 20)
+    response = client.get('/replay/frame.bin?tick=20')
+    assert response.headers["X-Shape"] == "50,50"
+    grid = np.frombuffer(response.data, dtype=np.uint8).reshape(50, 50)
+    assert np.array_equal(grid, universe.grid)
+    assert client.get('/replay/frame.bin?tick=21').status_code == 400
+    for route in ('/get_grid', '/get_grid.bin', '/get_kpis', '/stream', '/profile'):
+        assert client.get(route).status_code == 404, route  # Nothing live to show
+    assert client.post('/set_mode', json={"mode": "pick"}).status_code == 404
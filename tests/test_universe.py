@@ -5,6 +5,7 @@ import pytest
 import numpy as np
 
 from robowh.universe import Universe
+from robowh.utils import grid_codes
 
 
 def test_random_empty_position():
@@ -27,4 +28,91 @@ def test_grid_is_free():
     universe.grid[10, 10] = 0  # Create a surely free position
 
     assert universe.grid_is_free(10, 10) is True
-    assert universe.grid_is_free(11, 11) is False
\ No newline at end of file
+    assert universe.grid_is_free(11, 11) is False
+
+def test_seeded_step_is_reproducible():
+    first = Universe(seed=42)
+    second = Universe(seed=42)
+    first.step(30)  # Two universes in one process don't interfere
+    second.step(30)
+
+    assert first is not second
+    assert first.n_ticks == second.n_ticks == 30
+    assert np.array_equal(first.grid, second.grid)
+    assert first.observer.n_tasks == second.observer.n_tasks
+    assert [(r.x, r.y) for r in first.robots] == [(r.x, r.y) for r in second.robots]
+
+
+def test_grid_layers():
+    universe = Universe()
+    robot = universe.robots[0]
+    x, y = universe.shelves.coords[0]
+
+    # Racks live on the layout layer, robots on the occupancy layer, the grid shows both
+    assert universe.layout[x, y] != 0 and universe.occupancy[x, y] == 0
+    assert universe.occupancy[robot.x, robot.y] != 0 and universe.layout[robot.x, robot.y] == 0
+    assert np.array_equal(universe.grid, np.maximum(universe.layout, universe.occupancy))
+
+    # Strategies get views that they can't accidentally write into
+    view = universe.planning_view(robots=False)
+    assert view[robot.x, robot.y] == 0
+    with pytest.raises(ValueError):
+        view[0, 0] = 1
+
+
+def test_scan():
+    universe = Universe()
+    x, y = universe.shelves.coords[4]  # Left side of a double rack
+    assert universe.scan(x, y-1) == (universe.shelves, 4)
+    bx, by = universe.bays.coords[1]
+    assert universe.scan(bx+1, by) == (universe.bays, 1)
+    assert universe.scan(universe.GRID_SIZE-1, 0) is False  # A corner far from any shelf
+
+
+def test_free_cells_follow_the_grid():
+    universe = Universe(seed=7)
+    universe.step(20)
+    free = {tuple(int(c) for c in p) for p in np.argwhere(universe.grid == 0)}
+    assert set(universe.free_cells) == free
+    assert len(universe.free_cells) == len(free)
+
+
+def test_settings_are_per_universe():
+    small = Universe(grid_size=30, n_robots=10, strategy='jps', seed=1)
+    default = Universe(seed=1)
+    assert small.grid.shape == (30, 30) and len(small.robots) == 10
+    assert all(robot.strategy is small.strategy_library.jps for robot in small.robots)
+    assert default.grid.shape == (Universe.GRID_SIZE, Universe.GRID_SIZE)
+    assert len(default.robots) == Universe.N_ROBOTS
+    assert all(robot.universe is small for robot in small.robots)
+    assert small.shelves.universe is small and default.shelves.universe is default
+    with pytest.raises(ValueError):
+        Universe(strategy='teleport')
+
+
+def test_shelves_in_bulk_are_the_same_as_one_by_one():
+    one, bulk = Universe(seed=2, n_robots=0), Universe(seed=2, n_robots=0)
+    points = [(5, 10), (5, 11), (6, 10), (5, 10), (6, 11)]  # One repeat, which is skipped
+    for point in points:
+        one.shelves.add_shelf(point, empty=True)
+    bulk.shelves.add_shelves(np.array(points))
+    assert bulk.shelves.coords == one.shelves.coords
+    assert np.array_equal(bulk.shelves.index_map, one.shelves.index_map)
+    assert np.array_equal(bulk.grid, one.grid)
+    assert set(bulk.free_cells) == set(one.free_cells)
+    for universe in (one, bulk):
+        universe.shelves.lock(universe.shelves.request_optimal_placement())
+    assert bulk.shelves.request_optimal_placement() == one.shelves.request_optimal_placement()
+
+
+def test_initial_inventory():
+    universe = Universe(seed=3)
+    shelves = universe.shelves
+    assert 0.4 < shelves.n_items / len(shelves.coords) < 0.6
+    assert len(universe.products) == len(shelves.available_products) == shelves.n_items
+    for product in shelves.available_products:
+        index = shelves.index_of(product)
+        assert shelves.inventory[index] == [product]
+        assert universe.grid[shelves.coords[index]] == grid_codes['item']
+    assert universe.orchestrator.target_inventory == shelves.n_items
+    assert np.array_equal(Universe(seed=3).shelves.records, shelves.records)  # Seeded
@@ -0,0 +1,30 @@
+import numpy as np
+import random
+
+from robowh.utils import IndexedSet, manhattan_distances
+
+
+def test_indexed_set():
+    items = IndexedSet(["a", "b", "c"])
+    items.add("a")  # Already there
+    assert len(items) == 3
+    items.discard("a")  # "c" is moved into its place
+    items.discard("z")  # Not there, no problem
+    assert len(items) == 2
+    assert "a" not in items
+    assert set(items) == {"b", "c"}
+
+    rng = random.Random(0)
+    assert {items.choice(rng) for _ in range(20)} == {"b", "c"}
+    items.discard("c")
+    items.discard("b")
+    assert len(items) == 0
+
+
+def test_manhattan_distances():
+    rng = np.random.default_rng(0)
+    for shape in [(1, 1), (7, 3), (20, 31)]:
+        targets = np.stack([rng.integers(0, shape[0], 4), rng.integers(0, shape[1], 4)], axis=1)
+        pixels = np.indices(shape).reshape(2, -1).T
+        expected = np.abs(pixels[:, None] - targets[None]).sum(axis=2).min(axis=1)
+        assert np.array_equal(manhattan_distances(shape, targets), expected.reshape(shape))